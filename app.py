@@ -2,6 +2,7 @@ import streamlit as st
 import os
 from video_editor import VideoEditor
 import tempfile
+import shutil
 
 st.set_page_config(
     page_title="25秒自动剪辑工具",
@@ -42,8 +43,10 @@ uploaded_file = st.file_uploader("选择要剪辑的视频文件", type=['mp4',
 
 if uploaded_file is not None:
     # 创建临时文件来保存上传的视频
+    # 分块复制到磁盘，避免 getvalue() 再复制一份完整的文件内容
+    uploaded_file.seek(0)
     with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
-        tmp_file.write(uploaded_file.getvalue())
+        shutil.copyfileobj(uploaded_file, tmp_file, 1024 * 1024)
         input_path = tmp_file.name
 
     # 创建输出文件路径
@@ -0,0 +1,153 @@
+import sys
+import time
+import subprocess
+
+import numpy as np
+
+from metrics import wait_measured, kill_on_cancel, StderrTail
+
+# 分析用的采样率：只关心响度包络，8 kHz 单声道足够，解码和管道开销很小
+SAMPLE_RATE = 8000
+WINDOW_SECONDS = 0.1
+# 每次从管道读取的窗口数（约 10 秒音频），内存占用与视频时长无关
+CHUNK_WINDOWS = 100
+# 响度下限（dBFS），静音窗口按此值计算
+SILENCE_DB = -90.0
+
+
+def _read_samples(stream, buffer):
+    """把管道中的 PCM 读入预分配缓冲区，返回读到的完整采样数"""
+    view = memoryview(buffer).cast('B')
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled // buffer.itemsize
+
+
+class AudioEnvelope:
+    """按固定窗口计算的音频响度包络（dBFS）"""
+
+    def __init__(self, loudness, window_seconds=WINDOW_SECONDS):
+        self.loudness = np.asarray(loudness, dtype=np.float32)
+        self.window_seconds = window_seconds
+
+    def to_dict(self):
+        """可写入 JSON 的表示（响度保留一位小数），用于场景缓存"""
+        return {
+            'window_seconds': self.window_seconds,
+            'loudness': [round(float(value), 1) for value in self.loudness],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['loudness'], float(data['window_seconds']))
+
+    @property
+    def duration(self):
+        return len(self.loudness) * self.window_seconds
+
+    def _window_range(self, start, end):
+        first = int(start / self.window_seconds)
+        last = max(first + 1, int(np.ceil(end / self.window_seconds)))
+        return first, min(last, len(self.loudness))
+
+    def scene_loudness(self, start, end):
+        """场景的平均响度（dBFS）；场景超出包络范围时返回静音"""
+        first, last = self._window_range(start, end)
+        if first >= last:
+            return SILENCE_DB
+        return float(self.loudness[first:last].mean())
+
+    def scene_energy(self, scenes):
+        """每个场景相对于整段音频的响度，0 为安静段（第 10 百分位），1 为最响段（第 99 百分位）"""
+        if len(self.loudness) == 0:
+            return np.zeros(len(scenes))
+        floor, peak = np.percentile(self.loudness, [10, 99])
+        if peak - floor < 1.0:
+            # 整段音频响度几乎不变（静音或持续噪声），不区分场景
+            return np.zeros(len(scenes))
+        loudness = np.array([self.scene_loudness(start, end) for start, end in scenes])
+        return np.clip((loudness - floor) / (peak - floor), 0.0, 1.0)
+
+
+def audio_envelope(path, window_seconds=WINDOW_SECONDS, sample_rate=SAMPLE_RATE,
+                   chunk_windows=CHUNK_WINDOWS, metrics=None, cancel_token=None):
+    """通过 ffmpeg PCM 管道流式计算第一条音轨的响度包络，返回 AudioEnvelope
+
+    每次读取 chunk_windows 个窗口的采样，在预分配的缓冲区中按窗口求均方根，
+    内存占用只与块大小有关。
+    """
+    window = max(1, int(round(window_seconds * sample_rate)))
+    command = [
+        'ffmpeg',
+        '-v', 'error',
+        '-i', path,
+        '-map', '0:a:0',
+        '-vn', '-sn', '-dn',
+        '-ac', '1',
+        '-ar', str(sample_rate),
+        '-f', 's16le',
+        'pipe:1'
+    ]
+
+    pcm = np.empty(chunk_windows * window, dtype=np.int16)
+    samples = np.empty(chunk_windows * window, dtype=np.float32)
+    windows = samples.reshape(chunk_windows, window)
+    power = np.empty(chunk_windows, dtype=np.float32)
+    loudness_chunks = []
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               bufsize=pcm.nbytes)
+    stderr_tail = StderrTail(process.stderr)
+    try:
+        # 任务取消时立即杀掉 ffmpeg，管道读到结尾后循环自然结束
+        with kill_on_cancel(process, cancel_token):
+            while True:
+                n = _read_samples(process.stdout, pcm)
+                if n == 0:
+                    break
+                # 最后一块不足一个窗口的部分用静音补齐
+                count = -(-n // window)
+                np.multiply(pcm, 1.0 / 32768.0, out=samples, casting='unsafe')
+                samples[n:count * window] = 0.0
+                np.square(samples[:count * window], out=samples[:count * window])
+                np.mean(windows[:count], axis=1, out=power[:count])
+                np.maximum(power[:count], 1e-9, out=power[:count])
+                loudness_chunks.append(10.0 * np.log10(power[:count]))
+                if n < len(pcm):
+                    break
+            process.stdout.close()
+            stderr = stderr_tail.text()
+            usage = wait_measured(process)
+        if metrics is not None:
+            metrics.record_command(command, time.perf_counter() - started, process.returncode,
+                                   *usage)
+        if cancel_token is not None:
+            cancel_token.check()
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg 音频解码失败: {stderr.strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    loudness = np.concatenate(loudness_chunks) if loudness_chunks else np.zeros(0)
+    return AudioEnvelope(np.maximum(loudness, SILENCE_DB), window * 1.0 / sample_rate)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("用法: python audio_energy.py <视频文件>")
+        sys.exit(1)
+    started = time.perf_counter()
+    envelope = audio_envelope(sys.argv[1])
+    elapsed = time.perf_counter() - started
+    print(f"音频时长 {envelope.duration:.1f}s，{len(envelope.loudness)} 个窗口，耗时 {elapsed:.2f}s")
+    if len(envelope.loudness):
+        seconds = envelope.loudness[:len(envelope.loudness) // 10 * 10].reshape(-1, 10).mean(axis=1)
+        for i, value in enumerate(seconds):
+            print(f"{i:5d}s {value:7.1f} dBFS {'#' * int(max(0.0, value - SILENCE_DB) / 3)}")
@@ -0,0 +1,181 @@
+import os
+import glob
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+VALID_EXTENSIONS = {'.mp4', '.mov', '.avi'}
+MANIFEST_VERSION = 1
+
+
+def expand_inputs(patterns):
+    """把目录、通配符和文件路径展开为去重后的视频文件列表（保持顺序）"""
+    files = []
+    seen = set()
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern.strip())
+        if os.path.isdir(pattern):
+            matches = []
+            for root, _, names in os.walk(pattern):
+                matches.extend(os.path.join(root, name) for name in names)
+            matches.sort()
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if path not in seen and os.path.splitext(path)[1].lower() in VALID_EXTENSIONS:
+                seen.add(path)
+                files.append(path)
+    return files
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+class BatchManifest:
+    """批处理清单：记录每个输入的完成/失败/跳过状态，用于崩溃后续跑"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.entries = data.get('entries', {})
+
+    def is_done(self, input_path, targets=None):
+        """输入未变化、目标时长相同且全部输出仍然存在时视为已完成"""
+        entry = self.entries.get(input_path)
+        if not entry or entry.get('status') != 'done':
+            return False
+        try:
+            signature = _file_signature(input_path)
+        except OSError:
+            return False
+        # 多个时长版本时记录每个版本的输出；旧清单只有 output 一项
+        outputs = entry.get('outputs') or [entry.get('output', '')]
+        return (entry.get('size') == signature['size']
+                and entry.get('mtime') == signature['mtime']
+                and entry.get('targets') == targets
+                and all(os.path.exists(path) for path in outputs))
+
+    def record(self, input_path, status, **fields):
+        entry = {'status': status, 'updated_at': time.time()}
+        try:
+            entry.update(_file_signature(input_path))
+        except OSError:
+            pass
+        entry.update(fields)
+        self.entries[input_path] = entry
+        self.save()
+
+    def save(self):
+        """先写临时文件再替换，崩溃时不会留下半个清单"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f,
+                      ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def _output_paths(inputs, output_dir, manifest, targets=None):
+    """为每个输入生成输出路径，同名文件追加序号避免互相覆盖
+
+    已完成的输入沿用清单中记录的输出路径；其余输入只避开这些仍在磁盘上的输出
+    和本次已分配的文件名，重跑时不会覆盖已完成的输出。多个时长版本的文件名
+    由这里的路径加上时长后缀得到，同样不会互相覆盖。
+    """
+    outputs = {}
+    used = set()
+    for input_path in inputs:
+        if manifest.is_done(input_path, targets):
+            outputs[input_path] = manifest.entries[input_path]['output']
+            used.add(os.path.abspath(outputs[input_path]))
+    for input_path in inputs:
+        if input_path in outputs:
+            continue
+        name, ext = os.path.splitext(os.path.basename(input_path))
+        candidate = os.path.join(output_dir, f"edited_{name}{ext}")
+        counter = 1
+        while os.path.abspath(candidate) in used:
+            counter += 1
+            candidate = os.path.join(output_dir, f"edited_{name}_{counter}{ext}")
+        used.add(os.path.abspath(candidate))
+        outputs[input_path] = candidate
+    return outputs
+
+
+def process_one(input_path, output_path, target_duration=25, extract_workers=1, targets=None):
+    """在子进程中处理单个文件，返回结果字典；targets 为多个目标时长时一次分析、输出多个版本"""
+    from video_editor import VideoEditor
+
+    started = time.time()
+    editor = VideoEditor(input_path, output_path, target_duration=target_duration,
+                         extract_workers=extract_workers)
+    ok = editor.process_video(variants=targets)
+    return {
+        'ok': bool(ok),
+        'output': editor.output_path,
+        'outputs': [variant['output_path'] for variant in editor.variant_outputs if variant['ok']],
+        'source_duration': editor.source_duration or 0.0,
+        'elapsed': time.time() - started,
+    }
+
+
+def run_batch(patterns, output_dir, workers=None, manifest_path=None,
+              target_duration=25, targets=None, log=print):
+    """用进程池批量处理视频，返回汇总统计；targets 为多个目标时长时每个文件输出多个版本"""
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = BatchManifest(manifest_path or os.path.join(output_dir, 'batch_manifest.json'))
+
+    inputs = expand_inputs(patterns)
+    outputs = _output_paths(inputs, output_dir, manifest, targets)
+    pending = []
+    summary = {'total': len(inputs), 'done': 0, 'failed': 0, 'skipped': 0, 'source_seconds': 0.0}
+    for input_path in inputs:
+        if manifest.is_done(input_path, targets):
+            summary['skipped'] += 1
+            log(f"跳过（已完成）: {input_path}")
+        elif not os.path.isfile(input_path):
+            summary['skipped'] += 1
+            manifest.record(input_path, 'skipped', error='文件不存在')
+        else:
+            pending.append(input_path)
+
+    # 每个文件内部的片段提取也会并发，按进程数分摊 CPU，避免过度订阅
+    extract_workers = max(1, (os.cpu_count() or 1) // workers)
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_one, path, outputs[path], target_duration, extract_workers,
+                        targets): path
+            for path in pending
+        }
+        for future in as_completed(futures):
+            input_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'ok': False, 'error': str(e)}
+            if result['ok']:
+                summary['done'] += 1
+                summary['source_seconds'] += result['source_duration']
+                manifest.record(input_path, 'done', output=result['output'],
+                                outputs=result['outputs'], targets=targets,
+                                source_duration=result['source_duration'],
+                                elapsed=result['elapsed'])
+                log(f"完成: {input_path} -> {', '.join(result['outputs']) or result['output']}")
+            else:
+                summary['failed'] += 1
+                manifest.record(input_path, 'failed', error=result.get('error', '处理失败'))
+                log(f"失败: {input_path}")
+
+    elapsed = time.time() - started
+    summary['elapsed'] = elapsed
+    summary['files_per_minute'] = summary['done'] * 60 / elapsed if elapsed > 0 else 0.0
+    summary['source_seconds_per_second'] = summary['source_seconds'] / elapsed if elapsed > 0 else 0.0
+    summary['manifest'] = manifest.path
+    return summary
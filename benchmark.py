@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""流水线基准测试
+
+用 ffmpeg 的 lavfi 信号源在本地生成确定性的测试视频（不同分辨率、时长、场景密度和编码），
+分别计时完整流水线和各个阶段，结果保存为 JSON；compare 子命令与保存的基准结果对比，
+找出变慢的阶段。
+
+    python benchmark.py run --output bench.json
+    python benchmark.py compare baseline.json bench.json
+    python benchmark.py run --output bench.json --baseline baseline.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+
+from video_editor import VideoEditor
+from hierarchical_detect import hierarchical_scan
+
+RESULT_VERSION = 1
+DEFAULT_INPUT_DIR = os.path.join(
+    os.getenv('VIDEO_EDITOR_CACHE_DIR', os.path.expanduser('~/.cache/video_editor')),
+    'benchmark_inputs'
+)
+# 比基准慢超过该比例、且绝对差超过 MIN_DELTA 秒时判定为性能回退
+DEFAULT_THRESHOLD = 0.15
+MIN_DELTA = 0.002
+
+# 相邻场景使用不同的信号源，保证每个场景边界都是一个明显的切点
+SCENE_SOURCES = [
+    'testsrc2', 'smptebars', 'rgbtestsrc', 'color=c=red', 'testsrc',
+    'color=c=blue', 'smptehdbars', 'color=c=yellow', 'yuvtestsrc', 'color=c=green',
+]
+
+# 默认测试用例：覆盖分辨率、时长、场景密度（每个场景的秒数）和编码
+CASES = [
+    {'name': 'h264_720p_60s_dense', 'size': '1280x720', 'duration': 60, 'scene_len': 2,
+     'codec': 'libx264'},
+    {'name': 'h264_720p_60s_sparse', 'size': '1280x720', 'duration': 60, 'scene_len': 8,
+     'codec': 'libx264'},
+    {'name': 'h264_360p_120s', 'size': '640x360', 'duration': 120, 'scene_len': 4,
+     'codec': 'libx264'},
+    {'name': 'h264_1080p_40s', 'size': '1920x1080', 'duration': 40, 'scene_len': 3,
+     'codec': 'libx264'},
+    {'name': 'hevc_720p_60s', 'size': '1280x720', 'duration': 60, 'scene_len': 4,
+     'codec': 'libx265'},
+    {'name': 'mpeg4_720p_60s', 'size': '1280x720', 'duration': 60, 'scene_len': 4,
+     'codec': 'mpeg4'},
+]
+
+STAGES = ['pipeline', 'detect', 'hierarchical', 'select', 'extract', 'concat', 'render']
+
+CODEC_OPTIONS = {
+    'libx264': ['-preset', 'veryfast', '-crf', '23', '-g', '48'],
+    'libx265': ['-preset', 'veryfast', '-crf', '28', '-tag:v', 'hvc1',
+                '-x265-params', 'keyint=48:log-level=error'],
+    'mpeg4': ['-q:v', '5', '-g', '48'],
+}
+
+
+def available_encoders():
+    """本机 ffmpeg 支持的编码器名称"""
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                            capture_output=True, text=True)
+    encoders = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6:
+            encoders.add(parts[1])
+    return encoders
+
+
+def input_path_for(case, input_dir):
+    return os.path.join(
+        input_dir,
+        f"{case['codec']}_{case['size']}_{case['duration']}s_{case['scene_len']}s.mp4"
+    )
+
+
+def generate_input(case, input_dir=DEFAULT_INPUT_DIR, fps=30):
+    """生成（或复用已生成的）测试视频，返回文件路径
+
+    每个场景是一个 lavfi 信号源，用 concat 滤镜拼接；音轨为固定频率的正弦波。
+    使用 bitexact 并去掉元数据，同样的参数在同一版本的 ffmpeg 上总是生成同样的文件。
+    """
+    path = input_path_for(case, input_dir)
+    if os.path.exists(path):
+        return path
+    os.makedirs(input_dir, exist_ok=True)
+
+    scene_count = -(-case['duration'] // case['scene_len'])  # 向上取整
+    command = ['ffmpeg', '-y', '-v', 'error']
+    labels = []
+    for i in range(scene_count):
+        duration = min(case['scene_len'], case['duration'] - i * case['scene_len'])
+        source = SCENE_SOURCES[i % len(SCENE_SOURCES)]
+        separator = ':' if '=' in source else '='
+        command += ['-f', 'lavfi', '-i',
+                    f"{source}{separator}size={case['size']}:rate={fps}:duration={duration}"]
+        labels.append(f'[{i}:v]')
+    command += ['-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={case['duration']}"]
+    command += [
+        '-filter_complex', f"{''.join(labels)}concat=n={scene_count}:v=1:a=0,format=yuv420p[v]",
+        '-map', '[v]', '-map', f'{scene_count}:a',
+        '-c:v', case['codec'], *CODEC_OPTIONS.get(case['codec'], []),
+        '-c:a', 'aac', '-b:a', '128k',
+        '-fflags', '+bitexact', '-flags:v', '+bitexact', '-flags:a', '+bitexact',
+        '-map_metadata', '-1',
+        path + '.tmp.mp4'
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"生成测试视频失败: {result.stderr.strip()}")
+    os.replace(path + '.tmp.mp4', path)
+    return path
+
+
+def probe_duration(path):
+    """视频时长（秒）"""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path],
+        capture_output=True, text=True
+    )
+    return float(json.loads(result.stdout)['format']['duration'])
+
+
+def _timed(func, repeat):
+    """重复运行 func，返回 (每次耗时列表, 最后一次的返回值)；VideoEditor 的输出不打印"""
+    times = []
+    value = None
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            value = func()
+            times.append(time.perf_counter() - started)
+    return times, value
+
+
+def _summarize(times, **extra):
+    summary = {
+        'median_seconds': statistics.median(times),
+        'min_seconds': min(times),
+        'runs': times,
+    }
+    summary.update(extra)
+    return summary
+
+
+def _new_editor(path, work_dir, **options):
+    return VideoEditor(path, os.path.join(work_dir, 'output.mp4'),
+                       use_scene_cache=False, **options)
+
+
+def benchmark_case(path, repeat=3, stages=STAGES, **options):
+    """对一个输入分别计时完整流水线和各个阶段"""
+    results = {}
+    work_dir = os.path.join(os.path.dirname(path), 'work')
+    os.makedirs(work_dir, exist_ok=True)
+    editors = []
+
+    def editor():
+        instance = _new_editor(path, work_dir, **options)
+        editors.append(instance)
+        return instance
+
+    try:
+        if 'pipeline' in stages:
+            last = {}
+
+            def run_pipeline():
+                instance = editor()
+                last['editor'] = instance
+                return instance.process_video()
+
+            times, ok = _timed(run_pipeline, repeat)
+            results['pipeline'] = _summarize(times, ok=bool(ok), stages={
+                stage['stage']: stage['wall_seconds']
+                for stage in last['editor'].metrics.to_dict()['stages']
+            })
+
+        # 后续阶段共用同一份检测结果和选择结果，各自单独计时
+        probe = editor()
+        duration = probe_duration(path)
+
+        if 'detect' in stages:
+            times, scenes = _timed(lambda: editor()._detect_scenes(), repeat)
+            results['detect'] = _summarize(times, scenes=len(scenes or []))
+        else:
+            with redirect_stdout(io.StringIO()):
+                scenes = editor()._detect_scenes()
+        if not scenes:
+            raise RuntimeError('场景检测没有结果')
+
+        if 'hierarchical' in stages:
+            # 分层检测与上面的全片检测结果对比：切点位置一致才算召回
+            media = probe._probe_media()
+            times, result = _timed(
+                lambda: hierarchical_scan(path, probe.detect_threshold, probe.min_scene_len,
+                                          proxy_height=probe.proxy_height, media=media),
+                repeat
+            )
+            reference = [start for start, _ in scenes[1:]]
+            tolerance = 0.5 / media.fps + 0.001
+            matched = sum(
+                1 for start, _ in result['scenes'][1:]
+                if any(abs(start - ref) <= tolerance for ref in reference)
+            )
+            results['hierarchical'] = _summarize(
+                times, scenes=len(result['scenes']),
+                recall=matched / len(reference) if reference else 1.0,
+                scanned_fraction=result['scanned_seconds'] / result['duration']
+            )
+        planned = probe._plan_copy_cuts(scenes)
+
+        if 'select' in stages:
+            # 单次选择太快，每轮重复 100 次取平均
+            rounds = 100
+            times, selected = _timed(
+                lambda: [probe._select_scenes(planned, duration) for _ in range(rounds)][-1],
+                repeat
+            )
+            results['select'] = _summarize([t / rounds for t in times], scenes=len(selected))
+        else:
+            selected = probe._select_scenes(planned, duration)
+
+        segment_files = None
+        if 'extract' in stages or 'concat' in stages:
+            extractors = []
+
+            def run_extract():
+                # 每轮使用新的编辑器，不复用上一轮已经提取的片段
+                instance = editor()
+                instance._keyframe_index = probe._keyframe_index
+                extractors.append(instance)
+                return instance._extract_segments(selected)
+
+            times, segment_files = _timed(run_extract, repeat)
+            extractor = extractors[-1]
+            if 'extract' in stages:
+                results['extract'] = _summarize(times, segments=len(selected))
+
+        if 'concat' in stages and segment_files:
+            output_path = os.path.join(work_dir, 'concat.mp4')
+            times, _ = _timed(lambda: extractor._concat_videos(segment_files, output_path), repeat)
+            results['concat'] = _summarize(times)
+
+        if 'render' in stages:
+            output_path = os.path.join(work_dir, 'render.mp4')
+            renderer = editor()
+            times, _ = _timed(lambda: renderer._render_single_pass(selected, output_path), repeat)
+            results['render'] = _summarize(times)
+    finally:
+        for instance in editors:
+            shutil.rmtree(instance.temp_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def environment_info():
+    """记录运行环境，对比不同机器上的结果时作参考"""
+    result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': result.stdout.splitlines()[0] if result.stdout else None,
+    }
+
+
+def run_benchmarks(case_names=None, repeat=3, input_dir=DEFAULT_INPUT_DIR, stages=STAGES,
+                   editor_options=None, log=print):
+    """运行基准测试，返回结果字典"""
+    encoders = available_encoders()
+    cases = [case for case in CASES if not case_names or case['name'] in case_names]
+    report = {
+        'version': RESULT_VERSION,
+        'created_at': time.time(),
+        'environment': environment_info(),
+        'repeat': repeat,
+        'editor_options': editor_options or {},
+        'cases': {},
+    }
+    for case in cases:
+        if case['codec'] not in encoders:
+            log(f"跳过 {case['name']}：ffmpeg 不支持编码器 {case['codec']}")
+            continue
+        log(f"生成测试视频 {case['name']}...")
+        path = generate_input(case, input_dir)
+        log(f"运行 {case['name']}...")
+        stage_results = benchmark_case(path, repeat=repeat, stages=stages,
+                                       **(editor_options or {}))
+        report['cases'][case['name']] = {'case': case, 'stages': stage_results}
+        for stage, result in stage_results.items():
+            log(f"  {stage:<9} 中位数 {result['median_seconds']:.4f}s  "
+                f"最小 {result['min_seconds']:.4f}s"
+                + (f"  召回率 {result['recall']:.1%}  逐帧扫描 {result['scanned_fraction']:.1%}"
+                   if 'recall' in result else ''))
+    return report
+
+
+def compare_reports(baseline, current, threshold=DEFAULT_THRESHOLD, min_delta=MIN_DELTA):
+    """逐个用例、逐个阶段对比中位数耗时，返回对比行列表"""
+    rows = []
+    for name, case in current['cases'].items():
+        base_case = baseline['cases'].get(name)
+        if base_case is None:
+            continue
+        for stage, result in case['stages'].items():
+            base = base_case['stages'].get(stage)
+            if base is None:
+                continue
+            before = base['median_seconds']
+            after = result['median_seconds']
+            ratio = after / before if before > 0 else float('inf')
+            delta = after - before
+            if ratio > 1 + threshold and delta > min_delta:
+                status = 'regression'
+            elif ratio < 1 - threshold and -delta > min_delta:
+                status = 'improvement'
+            else:
+                status = 'unchanged'
+            rows.append({
+                'case': name, 'stage': stage, 'baseline': before, 'current': after,
+                'ratio': ratio, 'status': status,
+            })
+    return rows
+
+
+def print_comparison(rows, log=print):
+    marks = {'regression': '变慢', 'improvement': '变快', 'unchanged': ''}
+    for row in rows:
+        log(f"{row['case']:<22} {row['stage']:<9} {row['baseline']:9.4f}s -> "
+            f"{row['current']:9.4f}s  x{row['ratio']:.2f}  {marks[row['status']]}")
+    regressions = [row for row in rows if row['status'] == 'regression']
+    if regressions:
+        log(f"发现 {len(regressions)} 处性能回退")
+    else:
+        log("没有发现性能回退")
+    return regressions
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='视频剪辑流水线基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='运行基准测试')
+    run_parser.add_argument('--output', default='benchmark.json', help='结果 JSON 文件')
+    run_parser.add_argument('--cases', nargs='*', help='只运行指定用例（默认全部）')
+    run_parser.add_argument('--stages', nargs='*', choices=STAGES, default=STAGES,
+                            help='只计时指定阶段')
+    run_parser.add_argument('--repeat', type=int, default=3, help='每个阶段重复次数')
+    run_parser.add_argument('--input-dir', default=DEFAULT_INPUT_DIR, help='测试视频目录')
+    run_parser.add_argument('--engine', default='scenedetect', choices=['scenedetect', 'numpy', 'hierarchical'],
+                            help='场景检测引擎')
+    run_parser.add_argument('--baseline', help='运行后与该基准结果对比')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='判定回退的变慢比例')
+
+    compare_parser = subparsers.add_parser('compare', help='与基准结果对比')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='判定回退的变慢比例')
+
+    subparsers.add_parser('list', help='列出测试用例')
+
+    args = parser.parse_args()
+    if args.command == 'list':
+        for case in CASES:
+            print(f"{case['name']:<22} {case['size']:>9} {case['duration']:>4}s "
+                  f"场景 {case['scene_len']}s {case['codec']}")
+        return 0
+
+    if args.command == 'compare':
+        rows = compare_reports(load_report(args.baseline), load_report(args.current),
+                               threshold=args.threshold)
+        return 1 if print_comparison(rows) else 0
+
+    report = run_benchmarks(args.cases, repeat=max(1, args.repeat), input_dir=args.input_dir,
+                            stages=args.stages,
+                            editor_options={'detector_engine': args.engine})
+    with open(args.output, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {args.output}")
+    if args.baseline:
+        rows = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        return 1 if print_comparison(rows) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+
+
+class JobCancelled(BaseException):
+    """任务被取消或超过截止时间
+
+    与 KeyboardInterrupt 一样继承 BaseException，不会被各阶段“打印并返回 False”
+    的 except Exception 吞掉，可以直接穿过检测、提取等阶段回到 process_video。
+    """
+
+
+class CancelToken:
+    """协作式取消标记
+
+    各阶段之间调用 check()；正在运行的 ffmpeg 子进程、检测循环等通过 on_cancel()
+    登记回调，取消时立即被终止，而不是等到下一次检查。可以从任意线程调用 cancel()。
+    """
+
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason='任务已取消'):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"取消回调执行失败: {str(e)}")
+
+    def check(self):
+        """已取消时抛出 JobCancelled"""
+        if self._event.is_set():
+            raise JobCancelled(self.reason)
+
+    def wait(self, timeout=None):
+        """等待取消，返回是否已取消"""
+        return self._event.wait(timeout)
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """with 块执行期间一旦取消就调用 callback；进入时已取消则立即调用"""
+        key = object()
+        with self._lock:
+            registered = not self._event.is_set()
+            if registered:
+                self._callbacks[key] = callback
+        if not registered:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.pop(key, None)
+
+    @contextmanager
+    def deadline(self, seconds):
+        """with 块执行超过 seconds 秒时自动取消；seconds 为空时不限时"""
+        if not seconds:
+            yield
+            return
+        timer = threading.Timer(seconds, self.cancel, args=(f"超过截止时间（{seconds} 秒）",))
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        finally:
+            timer.cancel()
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，退化为无锁
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024  # 每次从请求流读取/写入磁盘的字节数
+
+
+class UploadError(Exception):
+    """分块上传协议错误"""
+
+
+class OffsetMismatchError(UploadError):
+    """客户端提交的偏移量与服务器已确认的不一致"""
+
+    def __init__(self, expected):
+        super().__init__(f"偏移量不匹配，服务器已接收 {expected} 字节")
+        self.expected = expected
+
+
+class ChunkedUploadStore:
+    """可断点续传的分块上传
+
+    每个上传对应磁盘上的一个 .part 数据文件和一个 .json 元数据文件。
+    数据按块从请求流直接追加到文件，内存占用只有一个块；
+    SHA-256 随数据到达增量计算，服务进程重启后从已落盘的数据重建。
+    同一上传的追加和完成通过 .lock 文件上的 flock 串行化，
+    因此多个 gunicorn 线程/进程可以安全共享同一个目录。
+    """
+
+    def __init__(self, upload_dir, max_size=None, expire_after=24 * 3600):
+        self.upload_dir = upload_dir
+        self.max_size = max_size
+        self.expire_after = expire_after
+        os.makedirs(upload_dir, exist_ok=True)
+        self._hashers = {}  # upload_id -> (已计算到的偏移量, hashlib 对象)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.json")
+
+    def data_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.part")
+
+    def _lock_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.lock")
+
+    @contextmanager
+    def _locked(self, upload_id):
+        """单个上传的跨线程/进程排他锁，上传不存在时抛出 UploadError"""
+        if not upload_id.isalnum() or not os.path.exists(self._meta_path(upload_id)):
+            raise UploadError('上传不存在')
+        with open(self._lock_path(upload_id), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _write_meta(self, upload_id, meta):
+        tmp_path = self._meta_path(upload_id) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(upload_id))
+
+    def create(self, filename, total_size):
+        """登记一个新的上传，返回上传 ID"""
+        total_size = int(total_size)
+        if total_size <= 0:
+            raise UploadError('文件大小无效')
+        if self.max_size and total_size > self.max_size:
+            raise UploadError('文件过大')
+        upload_id = uuid.uuid4().hex
+        open(self.data_path(upload_id), 'wb').close()
+        self._write_meta(upload_id, {
+            'filename': filename,
+            'total_size': total_size,
+            'created_at': time.time(),
+            'sha256': None,
+        })
+        self._hashers[upload_id] = (0, hashlib.sha256())
+        return upload_id
+
+    def get(self, upload_id):
+        """返回上传状态（含已确认的偏移量），不存在时返回 None"""
+        if not upload_id.isalnum():
+            return None
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        meta['upload_id'] = upload_id
+        try:
+            meta['offset'] = os.path.getsize(self.data_path(upload_id))
+        except OSError:
+            # 与 finish() 或过期清理同时发生：数据文件已被移走
+            return None
+        meta['complete'] = meta['offset'] >= meta['total_size']
+        return meta
+
+    def _hasher_at(self, upload_id, offset):
+        """取得已覆盖 [0, offset) 的增量哈希对象；进程重启后从磁盘重建"""
+        hashed, hasher = self._hashers.get(upload_id, (None, None))
+        if hashed != offset:
+            hasher = hashlib.sha256()
+            remaining = offset
+            with open(self.data_path(upload_id), 'rb') as f:
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    remaining -= len(chunk)
+        return hasher
+
+    def append(self, upload_id, offset, stream, length=None):
+        """把请求流中的数据追加到上传文件，返回新的偏移量
+
+        offset 必须等于服务器已确认的字节数，否则抛出 OffsetMismatchError，
+        客户端据此从正确的位置续传。
+        """
+        with self._locked(upload_id):
+            meta = self.get(upload_id)
+            if meta is None:
+                raise UploadError('上传不存在')
+            current = meta['offset']
+            if int(offset) != current:
+                raise OffsetMismatchError(current)
+
+            hasher = self._hasher_at(upload_id, current)
+            limit = meta['total_size'] - current
+            if length is not None:
+                limit = min(limit, int(length))
+            written = 0
+            try:
+                with open(self.data_path(upload_id), 'ab') as f:
+                    while written < limit:
+                        chunk = stream.read(min(CHUNK_SIZE, limit - written))
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        written += len(chunk)
+            finally:
+                # 连接中断时已写入的数据仍然有效，下次从这里续传
+                self._hashers[upload_id] = (current + written, hasher)
+
+            offset = current + written
+            if offset >= meta['total_size']:
+                meta_on_disk = {k: meta[k] for k in ('filename', 'total_size', 'created_at')}
+                meta_on_disk['sha256'] = hasher.hexdigest()
+                self._write_meta(upload_id, meta_on_disk)
+            return offset
+
+    def finish(self, upload_id, target_path):
+        """上传完成后把数据文件移动到 target_path，返回内容 SHA-256"""
+        with self._locked(upload_id):
+            meta = self.get(upload_id)
+            if meta is None:
+                raise UploadError('上传不存在')
+            if not meta['complete']:
+                raise UploadError(f"上传未完成，已接收 {meta['offset']} / {meta['total_size']} 字节")
+            os.replace(self.data_path(upload_id), target_path)
+            os.remove(self._meta_path(upload_id))
+            os.remove(self._lock_path(upload_id))
+            self._hashers.pop(upload_id, None)
+            return meta['sha256']
+
+    def cleanup_expired(self):
+        """删除长时间未完成的上传"""
+        cutoff = time.time() - self.expire_after
+        for name in os.listdir(self.upload_dir):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            data_path = self.data_path(upload_id)
+            try:
+                last_active = os.path.getmtime(data_path)
+            except OSError:
+                last_active = os.path.getmtime(os.path.join(self.upload_dir, name))
+            if last_active < cutoff:
+                for path in (data_path, self._meta_path(upload_id), self._lock_path(upload_id)):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._hashers.pop(upload_id, None)
@@ -1,13 +1,22 @@
 #!/usr/bin/env python3
 import sys
 import os
-from video_editor import VideoEditor
+import argparse
+from batch import run_batch
+from warm_worker import submit_job
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
 from rich.console import Console
 from rich import print as rprint
 
-def process_video(input_path):
-    """处理视频文件"""
+def default_output_path(input_path):
+    """默认输出到下载文件夹"""
+    return os.path.join(os.path.expanduser("~/Downloads"), f"edited_{os.path.basename(input_path)}")
+
+def process_video(input_path, target_duration=25, targets=None, use_worker=True):
+    """处理视频文件；targets 为多个目标时长时一次分析、输出多个版本
+
+    有常驻进程（warm_worker.py）在运行时交给它处理，否则在本进程内处理。
+    """
     if not os.path.exists(input_path):
         rprint(f"[red]错误：文件不存在: {input_path}[/red]")
         return False
@@ -19,8 +28,7 @@ def process_video(input_path):
         return False
 
     # 设置输出路径（下载文件夹）
-    output_filename = f"edited_{os.path.basename(input_path)}"
-    output_path = os.path.join(os.path.expanduser("~/Downloads"), output_filename)
+    output_path = default_output_path(input_path)
 
     console = Console()
     try:
@@ -32,23 +40,157 @@ def process_video(input_path):
             console=console
         ) as progress:
             task = progress.add_task("[cyan]处理视频中...", total=None)
-            
-            # 创建编辑器实例并处理视频
-            editor = VideoEditor(input_path, output_path)
-            editor.create_final_video()
-            
+
+            result = None
+            if use_worker:
+                result = submit_job(
+                    input_path, output_path, target_duration=target_duration, targets=targets,
+                    progress_callback=lambda value: progress.update(task, total=100,
+                                                                    completed=value)
+                )
+            if result is None:
+                # 没有常驻进程：在本进程内导入依赖并处理
+                from video_editor import VideoEditor
+                editor = VideoEditor(input_path, output_path, target_duration=target_duration)
+                ok = editor.process_video(variants=targets)
+                result = {'ok': ok, 'output_path': editor.output_path,
+                          'variants': editor.variant_outputs}
+
             progress.update(task, completed=True)
-        
+
+        ok = result['ok']
+        if targets:
+            for variant in result.get('variants') or []:
+                if variant['ok']:
+                    rprint(f"[blue]{variant['name']}：{variant['output_path']}[/blue]")
+                else:
+                    rprint(f"[red]{variant['name']}：{variant.get('error', '处理失败')}[/red]")
+        else:
+            rprint(f"[blue]输出文件：{result['output_path']}[/blue]")
+        if not ok:
+            rprint(f"[red]处理失败{'：' + result['error'] if result.get('error') else ''}[/red]")
+            return False
         rprint(f"[green]✓ 处理完成！[/green]")
-        rprint(f"[blue]输出文件：{output_path}[/blue]")
         return True
 
     except Exception as e:
         rprint(f"[red]处理失败：{str(e)}[/red]")
         return False
 
+def run_batch_mode(args):
+    """批量处理目录或通配符匹配的视频"""
+    output_dir = args.output_dir or os.path.expanduser("~/Downloads")
+    rprint(f"[cyan]批量处理，输出目录：{output_dir}[/cyan]")
+    summary = run_batch(
+        args.paths,
+        output_dir,
+        workers=args.workers,
+        manifest_path=args.manifest,
+        target_duration=args.duration,
+        targets=args.targets,
+        log=rprint
+    )
+    rprint(f"[green]完成 {summary['done']} 个[/green]，"
+           f"[red]失败 {summary['failed']} 个[/red]，"
+           f"[yellow]跳过 {summary['skipped']} 个[/yellow]（共 {summary['total']} 个）")
+    rprint(f"[blue]用时 {summary['elapsed']:.1f} 秒，"
+           f"吞吐量 {summary['files_per_minute']:.2f} 个/分钟，"
+           f"{summary['source_seconds_per_second']:.1f} 源视频秒/秒[/blue]")
+    rprint(f"[blue]清单文件：{summary['manifest']}[/blue]")
+    return summary['failed'] == 0
+
+def run_plan_command(argv):
+    """python cli.py plan <视频> [-o 方案.json]：只分析，把剪辑方案写入 JSON 文件"""
+    parser = argparse.ArgumentParser(prog="cli.py plan", description="分析视频并保存剪辑方案")
+    parser.add_argument('input', help="视频文件")
+    parser.add_argument('-o', '--output', default=None,
+                        help="方案文件路径（默认与视频同名的 .plan.json）")
+    parser.add_argument('--duration', type=float, default=25, help="目标时长（秒）")
+    parser.add_argument('--targets', type=float, nargs='+', default=None,
+                        help="多个时长版本，例如 --targets 15 25 60")
+    parser.add_argument('--render-mode', choices=['single', 'segments', 'smart'], default='single',
+                        help="计划使用的渲染方式（smart 保留精确切点，其余对齐到关键帧）")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.input):
+        rprint(f"[red]错误：文件不存在: {args.input}[/red]")
+        return False
+    plan_path = args.output or f"{os.path.splitext(args.input)[0]}.plan.json"
+
+    from video_editor import VideoEditor
+    editor = VideoEditor(args.input, default_output_path(args.input),
+                         target_duration=args.duration, render_mode=args.render_mode)
+    with Console().status("[cyan]分析视频中..."):
+        plan = editor.plan(variants=args.targets)
+    if plan is None:
+        rprint("[red]分析失败[/red]")
+        return False
+    plan.save(plan_path)
+    for variant in plan.variants:
+        rprint(f"[blue]{variant['name']}：{len(variant['scenes'])} 个场景[/blue]")
+    rprint(f"[green]✓ 剪辑方案已保存：{plan_path}[/green]")
+    return True
+
+def run_render_command(argv):
+    """python cli.py render <方案.json> [--input 视频] [-o 输出]：按方案渲染，不再分析"""
+    parser = argparse.ArgumentParser(prog="cli.py render", description="按剪辑方案渲染")
+    parser.add_argument('plan', help="方案文件（cli.py plan 生成）")
+    parser.add_argument('--input', default=None,
+                        help="视频文件（默认为方案文件所在目录中与方案记录同名的文件）")
+    parser.add_argument('-o', '--output', default=None, help="输出文件（默认在下载文件夹）")
+    parser.add_argument('--render-mode', choices=['single', 'segments', 'smart'], default=None,
+                        help="覆盖方案中的渲染方式")
+    parser.add_argument('--preview', action='store_true', help="输出低分辨率预览草稿")
+    parser.add_argument('--no-verify', action='store_true',
+                        help="只比较文件大小，不计算内容哈希")
+    args = parser.parse_args(argv)
+
+    from edit_plan import EditPlan, EditPlanError
+    try:
+        plan = EditPlan.load(args.plan)
+    except EditPlanError as e:
+        rprint(f"[red]错误：{str(e)}[/red]")
+        return False
+    input_path = args.input or os.path.join(os.path.dirname(os.path.abspath(args.plan)),
+                                            plan.source['filename'])
+    if not os.path.exists(input_path):
+        rprint(f"[red]错误：文件不存在: {input_path}（用 --input 指定视频文件）[/red]")
+        return False
+    settings = {}
+    if args.render_mode:
+        settings['render_mode'] = args.render_mode
+    if args.preview:
+        settings['preview'] = True
+
+    from video_editor import VideoEditor
+    editor = VideoEditor(input_path, args.output or default_output_path(input_path))
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TimeElapsedColumn(),
+        console=Console()
+    ) as progress:
+        task = progress.add_task("[cyan]渲染中...", total=100)
+        ok = editor.render(plan, progress_callback=lambda value: progress.update(task, completed=value),
+                           verify_source=not args.no_verify, **settings)
+    for variant in editor.variant_outputs:
+        if variant['ok']:
+            rprint(f"[blue]{variant['name']}：{variant['output_path']}[/blue]")
+        else:
+            rprint(f"[red]{variant['name']}：{variant.get('error', '处理失败')}[/red]")
+    if not ok:
+        rprint("[red]渲染失败[/red]")
+        return False
+    rprint("[green]✓ 渲染完成！[/green]")
+    return True
+
 def main():
     """主函数"""
+    # 分析和渲染分开执行：plan 只生成剪辑方案，render 按方案输出
+    if len(sys.argv) > 1 and sys.argv[1] in ('plan', 'render'):
+        command = run_plan_command if sys.argv[1] == 'plan' else run_render_command
+        sys.exit(0 if command(sys.argv[2:]) else 1)
+
     # 显示欢迎信息
     rprint("[yellow]25秒自动剪辑工具 - 命令行版本[/yellow]")
     rprint("[yellow]支持直接拖拽视频文件到终端窗口[/yellow]")
@@ -58,14 +200,36 @@ def main():
         rprint("使用方法：")
         rprint("  python cli.py <视频文件路径>")
         rprint("  或直接拖拽视频文件到终端窗口")
+        rprint("  python cli.py --batch <目录或通配符>... [--workers N] [--output-dir 目录]")
+        rprint("  python cli.py plan <视频文件路径> [-o 方案.json]")
+        rprint("  python cli.py render <方案.json> [--input 视频] [-o 输出] [--render-mode smart]")
         return
 
-    input_path = sys.argv[1].strip()
+    parser = argparse.ArgumentParser(description="25秒自动剪辑工具")
+    parser.add_argument('paths', nargs='+', help="视频文件；批量模式下也可以是目录或通配符")
+    parser.add_argument('--batch', action='store_true', help="批量模式")
+    parser.add_argument('--workers', type=int, default=None, help="并行处理的进程数（默认 CPU 核数）")
+    parser.add_argument('--output-dir', default=None, help="输出目录（默认 ~/Downloads）")
+    parser.add_argument('--manifest', default=None, help="清单文件路径（默认在输出目录中）")
+    parser.add_argument('--duration', type=float, default=25, help="目标时长（秒）")
+    parser.add_argument('--targets', type=float, nargs='+', default=None,
+                        help="一次输出多个时长版本，例如 --targets 15 25 60（只分析一次）")
+    parser.add_argument('--no-worker', action='store_true',
+                        help="不使用常驻进程（warm_worker.py），在本进程内处理")
+    args = parser.parse_args()
+
     # 处理 macOS 中拖拽文件时可能带有的引号
-    if input_path.startswith('"') and input_path.endswith('"'):
-        input_path = input_path[1:-1]
-    
-    process_video(input_path)
+    args.paths = [
+        path[1:-1] if path.startswith('"') and path.endswith('"') else path
+        for path in (path.strip() for path in args.paths)
+    ]
+
+    if args.batch or len(args.paths) > 1 or os.path.isdir(args.paths[0]):
+        run_batch_mode(args)
+        return
+
+    process_video(args.paths[0], target_duration=args.duration, targets=args.targets,
+                  use_worker=not args.no_worker)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+
+from media_info import MediaInfo
+
+# 剪辑方案格式版本：字段含义变化时增大，旧版本的方案文件不再加载
+PLAN_VERSION = 1
+# 随方案保存、渲染时可以覆盖的渲染参数
+RENDER_SETTINGS = ('render_mode', 'preview', 'preview_height', 'preview_audio')
+
+
+class EditPlanError(Exception):
+    """剪辑方案无法加载，或与要渲染的输入文件不一致"""
+
+
+class EditPlan:
+    """可序列化的剪辑方案：分析阶段（探测、检测、选择）的全部结果
+
+    包含输入文件的身份（文件名、大小、SHA-256）、ffprobe 读取的容器和流信息、
+    每个版本选中的 (开始秒, 结束秒) 列表和渲染参数。渲染阶段只需要方案和输入文件，
+    不再检测和选择，可以在另一台机器上执行，也可以换渲染参数重新输出。
+    """
+
+    def __init__(self, source, media, variants, render, created_at=None):
+        self.source = source
+        self.media = media
+        self.variants = variants
+        self.render = render
+        self.created_at = created_at or time.time()
+
+    @classmethod
+    def from_editor(cls, editor, selected):
+        """由完成分析的 VideoEditor 和 [(版本, 选中的场景), ...] 生成方案"""
+        media = editor.media
+        return cls(
+            source={
+                'filename': os.path.basename(editor.input_path),
+                'size': os.path.getsize(editor.input_path),
+                'sha256': editor._get_input_hash(),
+            },
+            # 保存 ffprobe 的原始输出，渲染时原样重建 MediaInfo，不必再探测
+            media={'format': media.format, 'streams': media.streams},
+            variants=[
+                {
+                    'name': variant['name'],
+                    'target_duration': variant['target_duration'],
+                    'scenes': [[start, end] for start, end in scenes],
+                }
+                for variant, scenes in selected
+            ],
+            render={name: getattr(editor, name) for name in RENDER_SETTINGS},
+        )
+
+    def media_info(self, path):
+        """按方案中保存的流信息重建输入文件 path 的 MediaInfo"""
+        return MediaInfo(path, self.media['format'], self.media['streams']).validate()
+
+    def check_source(self, path, input_hash=None):
+        """检查 path 是否就是分析时的输入文件，不一致时抛出 EditPlanError
+
+        先比较文件大小；input_hash 为 None 时不比较内容哈希。
+        """
+        size = os.path.getsize(path)
+        if size != self.source['size']:
+            raise EditPlanError(
+                f"输入文件与方案不一致：大小 {size} 字节，方案中为 {self.source['size']} 字节"
+            )
+        if input_hash is not None and input_hash != self.source['sha256']:
+            raise EditPlanError('输入文件与方案不一致：内容哈希不同')
+
+    def to_dict(self):
+        return {
+            'version': PLAN_VERSION,
+            'created_at': self.created_at,
+            'source': self.source,
+            'media': self.media,
+            'variants': self.variants,
+            'render': self.render,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict) or data.get('version') != PLAN_VERSION:
+            raise EditPlanError(f"不支持的方案版本: {data.get('version') if isinstance(data, dict) else None}")
+        try:
+            return cls(
+                source=data['source'],
+                media=data['media'],
+                variants=[
+                    {
+                        'name': variant['name'],
+                        'target_duration': float(variant['target_duration']),
+                        'scenes': [[float(start), float(end)] for start, end in variant['scenes']],
+                    }
+                    for variant in data['variants']
+                ],
+                render=data.get('render') or {},
+                created_at=data.get('created_at'),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise EditPlanError(f"方案内容不完整: {str(e)}")
+
+    def save(self, path):
+        """写入 JSON 文件（先写临时文件再改名，不会留下写了一半的方案）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """读取 JSON 文件，无法解析时抛出 EditPlanError"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise EditPlanError(f"无法读取方案文件: {str(e)}")
+        return cls.from_dict(data)
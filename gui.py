@@ -1,26 +1,45 @@
 import sys
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                           QLabel, QPushButton, QProgressBar, QFileDialog, QMessageBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QDragEnterEvent, QDropEvent
+                           QLabel, QPushButton, QProgressBar, QFileDialog, QMessageBox,
+                           QCheckBox)
+from PyQt6.QtCore import Qt, QThread, QUrl, pyqtSignal
+from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QDesktopServices
 import os
+import tempfile
 from video_editor import VideoEditor
+from cancellation import CancelToken
 
 class VideoProcessThread(QThread):
     progress_updated = pyqtSignal(float)
     finished = pyqtSignal()
     error = pyqtSignal(str)
+    cancelled = pyqtSignal()
 
-    def __init__(self, input_path, output_path):
+    def __init__(self, input_path, output_path, preview=False, scene_plan=None):
         super().__init__()
         self.input_path = input_path
         self.output_path = output_path
+        self.preview = preview
+        self.scene_plan = scene_plan
+        self.cancel_token = CancelToken()
+        self.editor = None
+
+    def cancel(self):
+        """请求取消：正在运行的 ffmpeg 和场景检测会立即终止"""
+        self.cancel_token.cancel()
 
     def run(self):
         try:
-            editor = VideoEditor(self.input_path, self.output_path)
-            editor.process_video(progress_callback=self.progress_updated.emit)
-            self.finished.emit()
+            self.editor = VideoEditor(self.input_path, self.output_path,
+                                      cancel_token=self.cancel_token, preview=self.preview,
+                                      scene_plan=self.scene_plan)
+            ok = self.editor.process_video(progress_callback=self.progress_updated.emit)
+            if self.cancel_token.cancelled:
+                self.cancelled.emit()
+            elif not ok:
+                self.error.emit('处理失败，详细信息见控制台输出')
+            else:
+                self.finished.emit()
         except Exception as e:
             self.error.emit(str(e))
 
@@ -97,6 +116,11 @@ class VideoEditorApp(QMainWindow):
         """)
         layout.addWidget(self.select_button)
 
+        # 预览开关：先快速输出低分辨率草稿，确认后再按同一组场景输出完整版本
+        self.preview_checkbox = QCheckBox("先生成预览（低分辨率草稿，确认后再输出完整版本）")
+        self.preview_checkbox.setStyleSheet("color: white;")
+        layout.addWidget(self.preview_checkbox)
+
         # 状态标签
         self.status_label = QLabel("")
         self.status_label.setStyleSheet("color: white;")
@@ -119,6 +143,24 @@ class VideoEditorApp(QMainWindow):
         self.progress_bar.hide()
         layout.addWidget(self.progress_bar)
 
+        # 取消按钮（处理中显示）
+        self.cancel_button = QPushButton("取消处理")
+        self.cancel_button.clicked.connect(self.cancel_processing)
+        self.cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #8d1f1f;
+                color: white;
+                border: none;
+                padding: 10px;
+                border-radius: 5px;
+            }
+            QPushButton:hover {
+                background-color: #a72929;
+            }
+        """)
+        self.cancel_button.hide()
+        layout.addWidget(self.cancel_button)
+
         # 设置窗口样式
         self.setStyleSheet("background-color: #242424;")
 
@@ -132,7 +174,7 @@ class VideoEditorApp(QMainWindow):
         if file_path:
             self.process_video(file_path)
 
-    def process_video(self, input_path):
+    def process_video(self, input_path, scene_plan=None):
         try:
             # 检查文件类型
             if not input_path.lower().endswith(('.mp4', '.mov', '.avi', '.mkv')):
@@ -144,18 +186,27 @@ class VideoEditorApp(QMainWindow):
             input_filename = os.path.basename(input_path)
             output_filename = f"edited_{input_filename}"
             output_path = os.path.join(downloads_path, output_filename)
+            # 已确认场景方案时直接输出完整版本；否则按开关决定是否先输出预览
+            preview = scene_plan is None and self.preview_checkbox.isChecked()
+            if preview:
+                stem = os.path.splitext(input_filename)[0]
+                output_path = os.path.join(tempfile.gettempdir(), f"preview_{stem}.mp4")
 
             # 更新界面
             self.select_button.setEnabled(False)
-            self.status_label.setText(f"正在处理: {input_filename}")
+            self.status_label.setText(f"正在{'生成预览' if preview else '处理'}: {input_filename}")
             self.progress_bar.setValue(0)
             self.progress_bar.show()
+            self.cancel_button.setEnabled(True)
+            self.cancel_button.show()
 
             # 创建并启动处理线程
-            self.process_thread = VideoProcessThread(input_path, output_path)
+            self.process_thread = VideoProcessThread(input_path, output_path, preview=preview,
+                                                     scene_plan=scene_plan)
             self.process_thread.progress_updated.connect(self.update_progress)
             self.process_thread.finished.connect(self.process_finished)
             self.process_thread.error.connect(self.process_error)
+            self.process_thread.cancelled.connect(self.process_cancelled)
             self.process_thread.start()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"处理视频时出错：{str(e)}")
@@ -166,7 +217,36 @@ class VideoEditorApp(QMainWindow):
 
     def process_finished(self):
         self.reset_ui()
-        QMessageBox.information(self, "完成", "视频处理完成！\n已保存到下载文件夹")
+        thread = self.process_thread
+        if not thread.preview:
+            QMessageBox.information(self, "完成", "视频处理完成！\n已保存到下载文件夹")
+            return
+        # 打开预览草稿，确认后复用同一组场景输出完整版本（不再检测场景）
+        editor = thread.editor
+        QDesktopServices.openUrl(QUrl.fromLocalFile(editor.output_path))
+        answer = QMessageBox.question(
+            self, "预览已生成",
+            f"预览：{editor.output_path}\n\n使用这组场景输出完整画质的版本吗？"
+        )
+        if answer == QMessageBox.StandardButton.Yes:
+            self.process_video(thread.input_path, scene_plan=editor.variant_outputs[0]['scenes'])
+
+    def cancel_processing(self):
+        if getattr(self, 'process_thread', None) and self.process_thread.isRunning():
+            self.cancel_button.setEnabled(False)
+            self.status_label.setText("正在取消...")
+            self.process_thread.cancel()
+
+    def process_cancelled(self):
+        self.reset_ui()
+        self.status_label.setText("已取消")
+
+    def closeEvent(self, event):
+        # 关闭窗口时终止后台处理，不留下孤立的 ffmpeg 进程
+        if getattr(self, 'process_thread', None) and self.process_thread.isRunning():
+            self.process_thread.cancel()
+            self.process_thread.wait(5000)
+        event.accept()
 
     def process_error(self, error_msg):
         self.reset_ui()
@@ -176,6 +256,7 @@ class VideoEditorApp(QMainWindow):
         self.select_button.setEnabled(True)
         self.status_label.setText("")
         self.progress_bar.hide()
+        self.cancel_button.hide()
 
 def run():
     app = QApplication(sys.argv)
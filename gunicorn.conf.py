@@ -0,0 +1,20 @@
+import os
+
+# 主进程导入应用和全部重量级依赖（NumPy / OpenCV / PySceneDetect）一次，
+# worker 进程由主进程 fork 而来，启动和异常重启时不再重复导入
+preload_app = True
+
+# 任务队列的工作线程不能在主进程中启动（fork 后不会复制到 worker），改由 post_fork 启动
+os.environ['VIDEO_JOB_START_AFTER_FORK'] = '1'
+
+
+def when_ready(server):
+    from video_editor import preload
+    server.log.info(f"依赖预加载完成，耗时 {preload():.2f}s")
+
+
+def post_fork(server, worker):
+    from web_app import job_queue, JOB_WORKERS
+    job_queue.reset_after_fork()
+    if JOB_WORKERS > 0:
+        job_queue.start(workers=JOB_WORKERS)
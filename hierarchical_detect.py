@@ -0,0 +1,150 @@
+import sys
+import time
+
+import numpy as np
+
+from media_info import probe_media
+from numpy_detector import frame_scores, detect_scenes_numpy
+from scene_cuts import merge_cut_candidates
+
+# 粗筛阈值与检测阈值之比：相隔一个 GOP 的两帧即使在同一场景内差异也较大，
+# 阈值放低只会多扫描一些区间，不会漏掉切点
+COARSE_RATIO = 0.5
+
+
+def candidate_regions(media, threshold, proxy_height=None, coarse_threshold=None,
+                      metrics=None, cancel_token=None):
+    """粗筛：只解码关键帧，返回可能包含切点的区间 [(开始秒, 结束秒), ...]
+
+    相邻两个关键帧差异超过 coarse_threshold 时，两者之间（含后一个关键帧）可能有切点；
+    最后一个关键帧之后没有可比较的采样，总是作为候选区间。时间相对于容器起点。
+    """
+    if coarse_threshold is None:
+        coarse_threshold = threshold * COARSE_RATIO
+    keyframes = [
+        t - media.start_time
+        for t in media.keyframe_index(metrics=metrics, cancel_token=cancel_token).times
+    ]
+    scores, _ = frame_scores(
+        media.path, proxy_height=proxy_height, metrics=metrics, cancel_token=cancel_token,
+        stream_info=(media.width, media.height, media.fps), keyframes_only=True
+    )
+    if not keyframes or len(scores) != len(keyframes):
+        raise RuntimeError(
+            f"关键帧解码结果与索引不一致（解码 {len(scores)} 帧，索引 {len(keyframes)} 个）"
+        )
+
+    regions = []
+    flagged = [
+        (keyframes[i - 1], keyframes[i])
+        for i in np.flatnonzero(scores >= coarse_threshold) if i > 0
+    ]
+    flagged.append((keyframes[-1], media.duration))
+    for start, end in flagged:
+        if regions and start <= regions[-1][1]:
+            # 相邻的候选区间合并，只启动一次解码
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def hierarchical_scan(path, threshold=27, min_scene_len=15, proxy_height=None,
+                      coarse_threshold=None, media=None, metrics=None, cancel_token=None):
+    """由粗到细的两遍检测，返回包含场景、切点帧号、候选区间和扫描时长的字典
+
+    第二遍只在候选区间内逐帧计算分数，切点规则（阈值、最短场景长度）与全片扫描相同，
+    耗时与切点数量成正比，而不是与视频时长成正比。
+    """
+    media = media or probe_media(path, metrics=metrics, cancel_token=cancel_token)
+    fps = media.fps
+    regions = candidate_regions(media, threshold, proxy_height, coarse_threshold,
+                                metrics=metrics, cancel_token=cancel_token)
+
+    candidates = []
+    for start, end in regions:
+        # 从关键帧前半帧开始定位，保证关键帧本身是输出的第一帧；
+        # 结束位置多留半帧，包含区间末尾的关键帧
+        seek = max(0.0, start - 0.5 / fps)
+        scores, _ = frame_scores(
+            path, proxy_height=proxy_height, metrics=metrics, cancel_token=cancel_token,
+            stream_info=(media.width, media.height, fps),
+            start=seek, duration=end - seek + 0.5 / fps
+        )
+        # 区间时间相对容器起点，帧号从视频流第一帧算起
+        offset = int(round((start + media.start_time - media.video_start_time) * fps))
+        # 第一帧没有前一帧可比较，它是否为切点由上一个区间（或视频开头）决定
+        candidates.extend(offset + int(i) for i in np.flatnonzero(scores >= threshold) if i > 0)
+
+    cuts = merge_cut_candidates(candidates, min_scene_len)
+    total_frames = int(round(media.duration * fps))
+    scenes = []
+    if cuts:
+        boundaries = [0] + cuts + [total_frames]
+        scenes = [
+            (start / fps, end / fps) for start, end in zip(boundaries[:-1], boundaries[1:])
+        ]
+    return {
+        'scenes': scenes,
+        'cuts': cuts,
+        'regions': regions,
+        'scanned_seconds': sum(end - start for start, end in regions),
+        'duration': media.duration,
+    }
+
+
+def detect_scenes_hierarchical(path, threshold=27, min_scene_len=15, proxy_height=None,
+                               coarse_threshold=None, media=None, metrics=None,
+                               cancel_token=None):
+    """由粗到细的场景检测，返回 [(开始秒, 结束秒), ...]；没有切点时返回空列表"""
+    result = hierarchical_scan(path, threshold, min_scene_len, proxy_height, coarse_threshold,
+                               media=media, metrics=metrics, cancel_token=cancel_token)
+    print(f"分层检测：{len(result['regions'])} 个候选区间，逐帧扫描 "
+          f"{result['scanned_seconds']:.1f}s / {result['duration']:.1f}s")
+    return result['scenes']
+
+
+def compare_with_full_scan(path, threshold=27, min_scene_len=15, proxy_height=None,
+                           coarse_threshold=None):
+    """对比分层检测与全片逐帧扫描（NumPy 引擎）的切点和耗时"""
+    media = probe_media(path)
+
+    started = time.perf_counter()
+    reference = detect_scenes_numpy(path, threshold, min_scene_len, proxy_height=proxy_height,
+                                    stream_info=(media.width, media.height, media.fps))
+    full_time = time.perf_counter() - started
+    reference_cuts = [start for start, _ in reference[1:]]
+
+    started = time.perf_counter()
+    result = hierarchical_scan(path, threshold, min_scene_len, proxy_height, coarse_threshold,
+                               media=media)
+    hierarchical_time = time.perf_counter() - started
+    cuts = [start for start, _ in result['scenes'][1:]]
+
+    tolerance = 0.5 / media.fps  # 帧级精确：只允许浮点误差
+    matched = sum(1 for cut in cuts if any(abs(cut - ref) <= tolerance for ref in reference_cuts))
+    return {
+        'full_scan_cuts': len(reference_cuts),
+        'hierarchical_cuts': len(cuts),
+        'matched': matched,
+        'recall': matched / len(reference_cuts) if reference_cuts else 1.0,
+        'precision': matched / len(cuts) if cuts else 1.0,
+        'full_scan_seconds': full_time,
+        'hierarchical_seconds': hierarchical_time,
+        'regions': len(result['regions']),
+        'scanned_seconds': result['scanned_seconds'],
+        'duration': result['duration'],
+    }
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("用法: python hierarchical_detect.py <视频文件>")
+        sys.exit(1)
+    report = compare_with_full_scan(sys.argv[1])
+    print(f"全片扫描: {report['full_scan_cuts']} 个切点，耗时 {report['full_scan_seconds']:.2f}s")
+    print(f"分层检测: {report['hierarchical_cuts']} 个切点，耗时 {report['hierarchical_seconds']:.2f}s，"
+          f"{report['regions']} 个候选区间，逐帧扫描 "
+          f"{report['scanned_seconds']:.1f}s / {report['duration']:.1f}s")
+    print(f"一致切点 {report['matched']} 个，召回率 {report['recall']:.1%}，"
+          f"准确率 {report['precision']:.1%}")
@@ -0,0 +1,380 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from cancellation import CancelToken, JobCancelled
+
+
+class QueueFullError(Exception):
+    """排队中的任务数已达上限"""
+
+
+class JobQueue:
+    """基于 SQLite 的本地持久化任务队列
+
+    任务写入 SQLite 后立即返回任务 ID，由本进程内的工作线程
+    （或同一台机器上运行 worker.py 的其他进程）取出执行。
+    不依赖外部消息代理；重启后，心跳超时的“运行中”任务会重新排队。
+    取消运行中的任务时先标记为 cancelling，执行该任务的进程在一秒内发现并终止它。
+    """
+
+    STALE_AFTER = 60  # 运行中任务超过该秒数没有心跳，视为进程已退出
+    HEARTBEAT_INTERVAL = 10
+    CANCEL_POLL_INTERVAL = 0.5  # 检查其他进程发来的取消请求的间隔
+
+    def __init__(self, db_path, handler, max_pending=20):
+        self.db_path = db_path
+        self.handler = handler
+        self.max_pending = max_pending
+        self.worker_id = uuid.uuid4().hex
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._local = threading.local()
+        self._tokens = {}  # 本进程正在执行的任务 -> CancelToken
+        self._cancel_requested = set()
+        self._tokens_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connect(self):
+        """每个线程使用独立的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._connect().execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                worker_id TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL,
+                dedupe_key TEXT,
+                subscribers INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+        # 旧版本创建的数据库没有去重相关的列
+        columns = {row['name'] for row in self._connect().execute('PRAGMA table_info(jobs)')}
+        if 'dedupe_key' not in columns:
+            self._connect().execute('ALTER TABLE jobs ADD COLUMN dedupe_key TEXT')
+        if 'subscribers' not in columns:
+            self._connect().execute(
+                'ALTER TABLE jobs ADD COLUMN subscribers INTEGER NOT NULL DEFAULT 1'
+            )
+        self._connect().execute(
+            'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)'
+        )
+        self._connect().execute(
+            'CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (dedupe_key, created_at)'
+        )
+
+    def _insert(self, conn, params, dedupe_key=None):
+        """在调用方的事务中插入一个排队任务，返回任务 ID"""
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running', 'cancelling')"
+        ).fetchone()[0]
+        if pending >= self.max_pending:
+            raise QueueFullError(f"排队任务已达上限 ({self.max_pending})")
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO jobs (id, status, params, created_at, dedupe_key) "
+            "VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, json.dumps(params), time.time(), dedupe_key)
+        )
+        return job_id
+
+    def submit(self, params):
+        """提交任务，返回任务 ID；排队任务过多时抛出 QueueFullError"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            job_id = self._insert(conn, params)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._wakeup.set()
+        return job_id
+
+    def submit_unique(self, params, dedupe_key, reusable=None):
+        """按去重键提交任务，返回 (任务 ID, 是否新建)
+
+        同一个键的任务正在排队或运行时加入该任务（订阅数加一），不再重复执行；
+        已经完成且 reusable(job) 为真（例如输出文件仍然存在）时直接返回它。
+        查找和插入在同一个写事务中完成，并发的相同请求只会创建一个任务。
+        """
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running', 'done') "
+                "ORDER BY created_at DESC",
+                (dedupe_key,)
+            ).fetchall()
+            for row in rows:
+                if row['status'] == 'done':
+                    job = dict(row, params=json.loads(row['params']),
+                               result=json.loads(row['result']) if row['result'] else None)
+                    if reusable is not None and not reusable(job):
+                        continue
+                else:
+                    conn.execute(
+                        'UPDATE jobs SET subscribers = subscribers + 1 WHERE id = ?', (row['id'],)
+                    )
+                conn.execute('COMMIT')
+                return row['id'], False
+            job_id = self._insert(conn, params, dedupe_key)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._wakeup.set()
+        return job_id, True
+
+    def get(self, job_id):
+        """查询任务状态，不存在时返回 None"""
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def queue_position(self, job_id):
+        """任务前面还有多少个排队任务"""
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < "
+            "(SELECT created_at FROM jobs WHERE id = ?)", (job_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def status_counts(self):
+        """各状态的任务数"""
+        rows = self._connect().execute(
+            'SELECT status, COUNT(*) FROM jobs GROUP BY status'
+        ).fetchall()
+        return {status: count for status, count in rows}
+
+    def update_progress(self, job_id, progress):
+        self._connect().execute(
+            'UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ?',
+            (float(progress), time.time(), job_id)
+        )
+
+    def _claim(self):
+        """原子地取出最早的排队任务"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT id, params FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, started_at = ?, heartbeat_at = ? "
+                "WHERE id = ?",
+                (self.worker_id, now, now, row['id'])
+            )
+            conn.execute('COMMIT')
+            return row['id'], json.loads(row['params'])
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def cancel(self, job_id):
+        """取消任务，返回是否有任务被取消
+
+        排队中的任务直接标记为已取消；运行中的任务标记为 cancelling，
+        由执行它的进程终止 ffmpeg 并清理临时文件后标记为已取消。
+        多个请求合并到同一个任务时，只有最后一个订阅者取消才真正终止任务。
+        """
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE jobs SET subscribers = subscribers - 1 "
+            "WHERE id = ? AND status IN ('queued', 'running') AND subscribers > 1",
+            (job_id,)
+        )
+        if cursor.rowcount:
+            return True
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'cancelled', error = ?, finished_at = ? "
+            "WHERE id = ? AND status = 'queued'",
+            ('任务已取消', time.time(), job_id)
+        )
+        if cursor.rowcount:
+            return True
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'cancelling' WHERE id = ? AND status = 'running'", (job_id,)
+        )
+        if cursor.rowcount:
+            # 任务在本进程执行时立即取消，否则由执行进程轮询发现
+            self._cancel_local(job_id)
+            return True
+        return False
+
+    def _cancel_local(self, job_id):
+        with self._tokens_lock:
+            token = self._tokens.get(job_id)
+            if token is not None:
+                self._cancel_requested.add(job_id)
+        if token is not None:
+            token.cancel('任务已取消')
+
+    def _cancel_watch_loop(self):
+        """发现其他进程写入的取消请求"""
+        while not self._stopped.wait(self.CANCEL_POLL_INTERVAL):
+            with self._tokens_lock:
+                if not self._tokens:
+                    continue
+            try:
+                rows = self._connect().execute(
+                    "SELECT id FROM jobs WHERE status = 'cancelling' AND worker_id = ?",
+                    (self.worker_id,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"读取取消请求失败: {str(e)}")
+                continue
+            for row in rows:
+                self._cancel_local(row['id'])
+
+    def _finish(self, job_id, status, result=None, error=None):
+        self._connect().execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, progress = COALESCE(?, progress), '
+            'finished_at = ? '
+            'WHERE id = ?',
+            (status, json.dumps(result) if result is not None else None, error,
+             100 if status == 'done' else None, time.time(), job_id)
+        )
+
+    def requeue_stale(self):
+        """把心跳超时（执行进程已退出）的运行中任务重新排队，正在取消的直接标记为已取消"""
+        cutoff = time.time() - self.STALE_AFTER
+        self._connect().execute(
+            "UPDATE jobs SET status = 'cancelled', error = '任务已取消', finished_at = ? "
+            "WHERE status = 'cancelling' AND heartbeat_at < ?",
+            (time.time(), cutoff)
+        )
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'queued', worker_id = NULL, progress = 0 "
+            "WHERE status = 'running' AND heartbeat_at < ?",
+            (cutoff,)
+        )
+        if cursor.rowcount:
+            self._wakeup.set()
+        return cursor.rowcount
+
+    def prune(self, older_than=7 * 24 * 3600):
+        """删除早已结束的任务记录"""
+        self._connect().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+            (time.time() - older_than,)
+        )
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.HEARTBEAT_INTERVAL):
+            try:
+                self._connect().execute(
+                    "UPDATE jobs SET heartbeat_at = ? "
+                    "WHERE status IN ('running', 'cancelling') AND worker_id = ?",
+                    (time.time(), self.worker_id)
+                )
+                self.requeue_stale()
+            except sqlite3.Error as e:
+                print(f"任务心跳更新失败: {str(e)}")
+
+    def _worker_loop(self):
+        while not self._stopped.is_set():
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                print(f"读取任务队列失败: {str(e)}")
+                claimed = None
+            if claimed is None:
+                # 同进程提交时立即唤醒，其他进程提交的任务靠轮询发现
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+
+            job_id, params = claimed
+            token = CancelToken()
+            with self._tokens_lock:
+                self._tokens[job_id] = token
+            try:
+                result = self.handler(
+                    job_id, params, lambda progress: self.update_progress(job_id, progress), token
+                )
+                self._finish(job_id, 'done', result=result)
+            except (Exception, JobCancelled) as e:
+                with self._tokens_lock:
+                    requested = job_id in self._cancel_requested
+                if requested:
+                    print(f"任务 {job_id} 已取消")
+                    self._finish(job_id, 'cancelled', error='任务已取消')
+                else:
+                    # 超过截止时间等其他原因中止的任务按失败处理
+                    print(f"任务 {job_id} 失败: {str(e)}")
+                    self._finish(job_id, 'failed', error=str(e))
+            finally:
+                with self._tokens_lock:
+                    self._tokens.pop(job_id, None)
+                    self._cancel_requested.discard(job_id)
+
+    def start(self, workers=2):
+        """启动工作线程"""
+        if self._threads:
+            return
+        self.requeue_stale()
+        self.prune()
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        watcher = threading.Thread(target=self._cancel_watch_loop, name='job-cancel-watch',
+                                   daemon=True)
+        watcher.start()
+        self._threads.append(watcher)
+
+    def reset_after_fork(self):
+        """在 fork 出的子进程中调用：父进程的线程和 SQLite 连接不能在子进程中使用
+
+        gunicorn --preload 时队列在主进程中创建，每个 worker 进程 fork 后重新连接、
+        使用新的 worker_id，再调用 start() 启动自己的工作线程。
+        """
+        self.worker_id = uuid.uuid4().hex
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._tokens = {}
+        self._cancel_requested = set()
+        self._tokens_lock = threading.Lock()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
@@ -0,0 +1,132 @@
+import bisect
+from metrics import run_command
+
+
+class KeyframeIndex:
+    """视频流关键帧时间索引（秒，升序）"""
+
+    def __init__(self, times):
+        self.times = sorted(times)
+
+    def __len__(self):
+        return len(self.times)
+
+    def at_or_before(self, t):
+        """不晚于 t 的最后一个关键帧，没有则返回 None"""
+        i = bisect.bisect_right(self.times, t)
+        return self.times[i - 1] if i else None
+
+    def at_or_after(self, t):
+        """不早于 t 的第一个关键帧，没有则返回 None"""
+        i = bisect.bisect_left(self.times, t)
+        return self.times[i] if i < len(self.times) else None
+
+    def snap_start(self, start, end, tolerance=0.1):
+        """把片段起点对齐到可以直接复制（-c copy）的关键帧
+
+        前一个关键帧足够近时向前对齐；否则向后对齐到片段内的第一个关键帧，
+        避免把上一个场景的画面带进来；片段内没有关键帧时只能退回前一个关键帧。
+        """
+        before = self.at_or_before(start)
+        if before is not None and start - before <= tolerance:
+            return before
+        after = self.at_or_after(start)
+        if after is not None and after < end:
+            return after
+        return before if before is not None else start
+
+
+def probe_keyframes(path, metrics=None, cancel_token=None):
+    """一次 ffprobe 读取视频流全部数据包（不解码），返回关键帧索引"""
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,dts_time,flags',
+        '-of', 'csv=print_section=0',
+        path
+    ]
+    result = run_command(command, metrics, cancel_token=cancel_token)
+    if result.returncode != 0:
+        raise RuntimeError(f"读取关键帧失败: {result.stderr.strip()}")
+    return KeyframeIndex(parse_keyframe_packets(result.stdout.splitlines()))
+
+
+def parse_keyframe_packets(lines):
+    """解析 ffprobe 的 packet=pts_time,dts_time,flags CSV 输出"""
+    times = []
+    for line in lines:
+        fields = line.strip().split(',')
+        if len(fields) < 3 or 'K' not in fields[2]:
+            continue
+        for value in fields[:2]:
+            try:
+                times.append(float(value))
+                break
+            except ValueError:
+                continue  # pts 为 N/A 时退回 dts
+    return times
+
+
+def probe_packets(path, start, end, metrics=None, cancel_token=None):
+    """读取 [start, end] 秒范围内的视频数据包（不解码），按解码顺序返回 [(显示时间, 是否关键帧), ...]
+
+    ffprobe 从 start 之前最近的关键帧开始读取，时间为数据包的原始时间戳。
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-read_intervals', f"{start:.6f}%{end:.6f}",
+        '-show_entries', 'packet=pts_time,dts_time,flags',
+        '-of', 'csv=print_section=0',
+        path
+    ]
+    result = run_command(command, metrics, cancel_token=cancel_token)
+    if result.returncode != 0:
+        raise RuntimeError(f"读取数据包失败: {result.stderr.strip()}")
+    packets = []
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(',')
+        if len(fields) < 3:
+            continue
+        for value in fields[:2]:
+            try:
+                packets.append((float(value), 'K' in fields[2]))
+                break
+            except ValueError:
+                continue  # pts 为 N/A 时退回 dts
+    return packets
+
+
+def closed_prefix(packets, start, fps, max_frames, skip_leading=False):
+    """从 start 处的关键帧起按解码顺序可以直接复制的最长前缀，返回其帧数
+
+    有 B 帧时，解码顺序的前 n 个数据包显示的不一定是连续的前 n 帧；只有当它们正好
+    构成 [start, start + n 帧) 时，截取这 n 个数据包才不会带出多余的帧，也不会缺少参考帧。
+    前缀不超过 max_frames 帧；start 处不是关键帧时返回 0。
+
+    skip_leading：开放 GOP 中显示在关键帧之前的前导帧（HEVC 的 RASL）不计入前缀，
+    由调用方在复制时丢弃；否则遇到前导帧就停止。
+    """
+    half_frame = 0.5 / fps
+    started = False
+    count = 0
+    highest = -1
+    best = 0
+    for pts, key in packets:
+        if not started:
+            if not (key and abs(pts - start) < half_frame):
+                continue
+            started = True
+        frame = int(round((pts - start) * fps))
+        if frame < 0 and skip_leading:
+            continue
+        # 开放 GOP 中显示在关键帧之前的帧，或者超出范围的帧：之后的前缀都不能用
+        if frame < 0 or frame >= max_frames:
+            break
+        count += 1
+        highest = max(highest, frame)
+        if highest == count - 1:
+            best = count
+    return best
@@ -0,0 +1,170 @@
+import json
+
+from metrics import run_command
+from keyframe_index import probe_keyframes
+
+
+class UnsupportedMediaError(Exception):
+    """输入文件无法处理：不是媒体文件、没有视频流或无法确定时长"""
+
+
+def _parse_rate(value):
+    """把 ffprobe 的 "30000/1001" 形式帧率转换为浮点数，无效时返回 None"""
+    if not value:
+        return None
+    num, _, den = str(value).partition('/')
+    try:
+        rate = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+
+def _parse_float(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def _parse_clock(value):
+    """解析 Matroska 标签中的 "HH:MM:SS.nnnnnnnnn" 时长"""
+    try:
+        hours, minutes, seconds = str(value).split(':')
+        return _parse_float(int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+    except (TypeError, ValueError):
+        return None
+
+
+class MediaInfo:
+    """一次 ffprobe 读取的容器和流信息，在探测、检测、选择和渲染阶段之间共用
+
+    只读取文件头，不解码也不扫描数据包；关键帧位置需要读取全部数据包，
+    在第一次用到时探测一次并缓存。
+    """
+
+    def __init__(self, path, format_info, streams):
+        self.path = path
+        self.format = format_info
+        self.streams = streams
+        self.format_name = format_info.get('format_name')
+        self.size = int(format_info.get('size') or 0)
+        self.bit_rate = int(format_info.get('bit_rate') or 0)
+        # 容器起始时间：ffmpeg 的 -ss 和逐帧计数都从这里开始算
+        self.start_time = float(format_info.get('start_time') or 0)
+
+        # 封面图（attached_pic）也是视频流，不能作为分析对象
+        videos = [
+            s for s in streams
+            if s.get('codec_type') == 'video' and not s.get('disposition', {}).get('attached_pic')
+        ]
+        self.video = videos[0] if videos else None
+        self.audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+        video = self.video or {}
+        self.video_index = video.get('index')
+        self.video_codec = video.get('codec_name')
+        self.width = int(video.get('width') or 0)
+        self.height = int(video.get('height') or 0)
+        self.fps = _parse_rate(video.get('r_frame_rate')) or _parse_rate(video.get('avg_frame_rate'))
+        self.time_base = video.get('time_base')
+        self.pix_fmt = video.get('pix_fmt')
+        # 编码档次和级别：智能剪切重新编码 GOP 片段时沿用，使片段与复制部分兼容
+        self.profile = video.get('profile')
+        self.level = video.get('level')
+        # 视频流第一帧的时间戳，逐帧计数的第 0 帧在这里（可能晚于容器起点）
+        self.video_start_time = float(video.get('start_time') or self.start_time)
+        self.audio_codec = (self.audio or {}).get('codec_name')
+        self.duration = self._duration()
+        self._keyframe_index = None
+
+    def _duration(self):
+        """视频时长：视频流时长 → MKV 流时长标签 → 容器时长 → 帧数 / 帧率
+
+        MKV 和部分 MOV 不写每个流的 duration，这时依次退回到流标签和容器时长。
+        """
+        video = self.video or {}
+        duration = (
+            _parse_float(video.get('duration'))
+            or _parse_clock(video.get('tags', {}).get('DURATION'))
+            or _parse_float(self.format.get('duration'))
+        )
+        if duration:
+            return duration
+        frames = _parse_float(video.get('nb_frames'))
+        if frames and self.fps:
+            return frames / self.fps
+        return None
+
+    @property
+    def has_audio(self):
+        return self.audio is not None
+
+    @property
+    def video_size(self):
+        return self.width, self.height
+
+    def validate(self):
+        """在任何解码之前检查输入能否处理，不能处理时抛出 UnsupportedMediaError"""
+        if self.video is None:
+            raise UnsupportedMediaError('文件中没有视频流')
+        if not self.video_codec or self.video_codec == 'none':
+            raise UnsupportedMediaError('无法识别的视频编码')
+        if not self.width or not self.height:
+            raise UnsupportedMediaError('无法读取视频分辨率')
+        if not self.fps:
+            raise UnsupportedMediaError('无法读取视频帧率')
+        if not self.duration:
+            raise UnsupportedMediaError('无法读取视频时长')
+        return self
+
+    def keyframe_index(self, metrics=None, cancel_token=None):
+        """关键帧索引（只探测一次）"""
+        if self._keyframe_index is None:
+            self._keyframe_index = probe_keyframes(
+                self.path, metrics=metrics, cancel_token=cancel_token
+            )
+        return self._keyframe_index
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'format_name': self.format_name,
+            'duration': self.duration,
+            'start_time': self.start_time,
+            'size': self.size,
+            'bit_rate': self.bit_rate,
+            'video_codec': self.video_codec,
+            'width': self.width,
+            'height': self.height,
+            'fps': self.fps,
+            'time_base': self.time_base,
+            'pix_fmt': self.pix_fmt,
+            'profile': self.profile,
+            'level': self.level,
+            'audio_codec': self.audio_codec,
+        }
+
+
+def probe_media(path, metrics=None, cancel_token=None):
+    """用一次 ffprobe 读取容器和全部流的信息，返回通过检查的 MediaInfo
+
+    文件无法读取或不能处理时抛出 UnsupportedMediaError。
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_format',
+        '-show_streams',
+        '-of', 'json',
+        path
+    ]
+    result = run_command(command, metrics, cancel_token=cancel_token)
+    if result.returncode != 0:
+        raise UnsupportedMediaError(f"无法读取文件: {result.stderr.strip() or '未知格式'}")
+    try:
+        info = json.loads(result.stdout)
+    except ValueError:
+        raise UnsupportedMediaError('无法解析文件信息')
+    return MediaInfo(path, info.get('format', {}), info.get('streams', [])).validate()
@@ -0,0 +1,371 @@
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计内存峰值
+    resource = None
+
+# 直方图分桶
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RSS_BUCKETS = tuple(mb * 1024 * 1024 for mb in (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192))
+
+
+def _maxrss_bytes(maxrss):
+    """ru_maxrss 在 macOS 上以字节为单位，在 Linux 上以 KB 为单位"""
+    return int(maxrss) if sys.platform == 'darwin' else int(maxrss) * 1024
+
+
+def _read_proc_io(path):
+    """读取 /proc 中的 I/O 计数（rchar/wchar，包含页缓存命中），不支持时返回 (0, 0)"""
+    try:
+        with open(path) as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _process_peak_rss():
+    if resource is None:
+        return 0
+    return _maxrss_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def wait_measured(process):
+    """等待子进程结束并回收，返回 (CPU 秒数, 读取字节, 写入字节, 内存峰值字节)
+
+    进程退出后先不回收（WNOWAIT），从 /proc/<pid>/io 读出 I/O 计数，
+    再用 wait4 回收并取得该进程自己的 rusage；不支持的平台退化为普通 wait。
+    """
+    if not hasattr(os, 'wait4'):
+        process.wait()
+        return 0.0, 0, 0, 0
+    read_bytes = write_bytes = 0
+    try:
+        if hasattr(os, 'waitid'):
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+            read_bytes, write_bytes = _read_proc_io(f'/proc/{process.pid}/io')
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # 已被其他地方回收
+        process.wait()
+        return 0.0, read_bytes, write_bytes, 0
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return (usage.ru_utime + usage.ru_stime, read_bytes, write_bytes,
+            _maxrss_bytes(usage.ru_maxrss))
+
+
+@contextmanager
+def kill_on_cancel(process, cancel_token):
+    """with 块执行期间任务被取消时立即杀掉子进程"""
+    if cancel_token is None:
+        yield
+        return
+    with cancel_token.on_cancel(process.kill):
+        yield
+
+
+class StderrTail:
+    """在后台线程中持续读取子进程的 stderr，只保留最后 limit 字节
+
+    主线程逐块读取 stdout 时，stderr 管道写满会让子进程阻塞、两边互相等待；
+    边读边丢弃旧内容，损坏的输入输出大量解码错误时内存占用也有上限。
+    """
+
+    def __init__(self, stream, limit=64 * 1024):
+        self._stream = stream
+        self._limit = limit
+        self._data = bytearray()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        for chunk in iter(lambda: self._stream.read(8192), b''):
+            self._data += chunk
+            if len(self._data) > self._limit:
+                del self._data[:-self._limit]
+
+    def text(self):
+        """等待子进程关闭 stderr，返回保留的末尾内容"""
+        self._thread.join()
+        self._stream.close()
+        return self._data.decode('utf-8', 'replace')
+
+
+def run_command(command, metrics=None, text=True, cancel_token=None):
+    """运行外部命令（ffmpeg/ffprobe），返回 CompletedProcess，并把资源占用记入 metrics
+
+    传入 cancel_token 时，任务取消会立即杀掉子进程并抛出 JobCancelled。
+    """
+    if cancel_token is not None:
+        cancel_token.check()
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # stderr 在后台线程读取，避免任一管道写满导致死锁
+    stderr_chunks = []
+    reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()),
+                              daemon=True)
+    reader.start()
+    try:
+        with kill_on_cancel(process, cancel_token):
+            stdout = process.stdout.read()
+            process.stdout.close()
+            reader.join()
+            process.stderr.close()
+            usage = wait_measured(process)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    stderr = stderr_chunks[0] if stderr_chunks else b''
+    if metrics is not None:
+        metrics.record_command(command, time.perf_counter() - started, process.returncode, *usage)
+    if cancel_token is not None:
+        cancel_token.check()
+    if text:
+        stdout = stdout.decode('utf-8', 'replace')
+        stderr = stderr.decode('utf-8', 'replace')
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+class _ProcessSnapshot:
+    """本进程（含 OpenCV 等库的解码线程）的 CPU 时间和 I/O 计数"""
+
+    def __init__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.read_bytes, self.write_bytes = _read_proc_io('/proc/self/io')
+
+
+class JobMetrics:
+    """一次剪辑任务的分阶段资源记录
+
+    每个阶段记录墙钟时间、CPU 时间、读写字节数和外部命令的内存峰值。本进程的部分取整个
+    进程的增量（同一进程并发执行多个任务时会互相计入）；阶段内启动的每个外部
+    命令通过 wait4 单独统计后计入所有尚未结束的阶段（阶段可以嵌套）。
+    进程池中的检测子进程不计入 CPU 时间。本进程的 ru_maxrss 是整个进程生命周期的峰值，
+    不能按阶段区分，只作为任务记录的 process_peak_rss_bytes 记录一次。
+    """
+
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.started_at = time.time()
+        self.finished_at = None
+        self.ok = None
+        self.stages = []
+        self.commands = []
+        self._open = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """统计 with 块内的资源占用"""
+        before = _ProcessSnapshot()
+        record = {
+            'stage': name,
+            'children_cpu': 0.0,
+            'children_peak_rss': 0,
+            'commands': 0,
+        }
+        with self._lock:
+            self._open.append(record)
+        try:
+            yield record
+        finally:
+            after = _ProcessSnapshot()
+            with self._lock:
+                self._open.remove(record)
+                self.stages.append({
+                    'stage': name,
+                    'wall_seconds': after.wall - before.wall,
+                    'cpu_seconds': after.cpu - before.cpu + record['children_cpu'],
+                    # 回收子进程时内核把它的 I/O 计数并入父进程，这里的增量已包含外部命令
+                    'read_bytes': after.read_bytes - before.read_bytes,
+                    'write_bytes': after.write_bytes - before.write_bytes,
+                    'child_peak_rss_bytes': record['children_peak_rss'],
+                    'commands': record['commands'],
+                })
+
+    def record_command(self, command, wall, returncode, cpu, read_bytes, write_bytes, peak_rss):
+        """记录一个外部命令的资源占用（可从任意线程调用）"""
+        with self._lock:
+            for record in self._open:
+                record['children_cpu'] += cpu
+                record['children_peak_rss'] = max(record['children_peak_rss'], peak_rss)
+                record['commands'] += 1
+            self.commands.append({
+                'program': os.path.basename(command[0]),
+                'stage': self._open[-1]['stage'] if self._open else None,
+                'wall_seconds': wall,
+                'cpu_seconds': cpu,
+                'read_bytes': read_bytes,
+                'write_bytes': write_bytes,
+                'peak_rss_bytes': peak_rss,
+                'returncode': returncode,
+            })
+
+    def finish(self, ok):
+        self.ok = bool(ok)
+        self.finished_at = time.time()
+
+    def to_dict(self):
+        """结构化的任务记录"""
+        with self._lock:
+            return {
+                'job_id': self.job_id,
+                'ok': self.ok,
+                'started_at': self.started_at,
+                'wall_seconds': (self.finished_at or time.time()) - self.started_at,
+                # 常驻的 Web / worker 进程中只增不减，不代表本任务的内存占用
+                'process_peak_rss_bytes': _process_peak_rss(),
+                'stages': list(self.stages),
+                'commands': list(self.commands),
+            }
+
+    def summary(self):
+        """便于打印的一行一阶段摘要"""
+        lines = []
+        for stage in self.to_dict()['stages']:
+            lines.append(
+                f"{stage['stage']:<10} 耗时 {stage['wall_seconds']:7.2f}s  "
+                f"CPU {stage['cpu_seconds']:7.2f}s  "
+                f"读 {stage['read_bytes'] / 1048576:8.1f}MB  "
+                f"写 {stage['write_bytes'] / 1048576:8.1f}MB  "
+                f"子进程峰值内存 {stage['child_peak_rss_bytes'] / 1048576:6.0f}MB"
+            )
+        return '\n'.join(lines)
+
+
+def append_record(record, path=None):
+    """把任务记录以 JSON Lines 追加到 VIDEO_EDITOR_METRICS_LOG 指定的文件"""
+    path = path or os.getenv('VIDEO_EDITOR_METRICS_LOG')
+    if not path:
+        return
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    # 单次 write 追加一整行，多进程同时写入时不会交错
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """进程内的计数器、仪表和直方图，按 Prometheus 文本格式输出"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _declare(self, name, kind, help_text, buckets=None):
+        self._metrics[name] = {'type': kind, 'help': help_text, 'buckets': buckets, 'series': {}}
+
+    def counter(self, name, help_text):
+        self._declare(name, 'counter', help_text)
+
+    def gauge(self, name, help_text):
+        self._declare(name, 'gauge', help_text)
+
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS):
+        self._declare(name, 'histogram', help_text, tuple(buckets))
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._metrics[name]['series']
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._metrics[name]['series'][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            metric = self._metrics[name]
+            series = metric['series'].get(key)
+            if series is None:
+                series = metric['series'][key] = {
+                    'buckets': [0] * len(metric['buckets']), 'sum': 0.0, 'count': 0
+                }
+            for i, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines = []
+        with self._lock:
+            for name, metric in self._metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for labels, value in sorted(metric['series'].items()):
+                    if metric['type'] != 'histogram':
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                        continue
+                    bounds = list(metric['buckets']) + [float('inf')]
+                    counts = value['buckets'] + [value['count']]
+                    for bound, count in zip(bounds, counts):
+                        bucket_labels = labels + (('le', _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def create_job_registry():
+    """剪辑任务使用的指标定义"""
+    registry = MetricsRegistry()
+    registry.counter('video_editor_jobs_total', '结束的剪辑任务数')
+    registry.histogram('video_editor_job_duration_seconds', '剪辑任务总耗时')
+    registry.histogram('video_editor_stage_duration_seconds', '各阶段墙钟耗时')
+    registry.counter('video_editor_stage_cpu_seconds_total', '各阶段 CPU 时间（含子进程）')
+    registry.counter('video_editor_stage_read_bytes_total', '各阶段读取字节数（含子进程）')
+    registry.counter('video_editor_stage_write_bytes_total', '各阶段写入字节数（含子进程）')
+    registry.histogram('video_editor_stage_peak_rss_bytes', '各阶段外部命令的内存峰值',
+                       buckets=RSS_BUCKETS)
+    registry.counter('video_editor_commands_total', '外部命令调用次数')
+    registry.histogram('video_editor_command_duration_seconds', '外部命令耗时')
+    registry.gauge('video_editor_jobs', '当前各状态的任务数')
+    return registry
+
+
+def observe_job(registry, record):
+    """把一条任务记录计入指标"""
+    status = 'done' if record.get('ok') else 'failed'
+    registry.inc('video_editor_jobs_total', status=status)
+    registry.observe('video_editor_job_duration_seconds', record['wall_seconds'])
+    for stage in record['stages']:
+        name = stage['stage']
+        registry.observe('video_editor_stage_duration_seconds', stage['wall_seconds'], stage=name)
+        registry.inc('video_editor_stage_cpu_seconds_total', stage['cpu_seconds'], stage=name)
+        registry.inc('video_editor_stage_read_bytes_total', stage['read_bytes'], stage=name)
+        registry.inc('video_editor_stage_write_bytes_total', stage['write_bytes'], stage=name)
+        if stage['commands']:
+            registry.observe('video_editor_stage_peak_rss_bytes',
+                             stage['child_peak_rss_bytes'], stage=name)
+    for command in record['commands']:
+        labels = {'program': command['program'], 'stage': command['stage'] or ''}
+        registry.inc('video_editor_commands_total', **labels)
+        registry.observe('video_editor_command_duration_seconds', command['wall_seconds'], **labels)
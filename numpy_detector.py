@@ -0,0 +1,273 @@
+import sys
+import json
+import time
+import subprocess
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:  # 没有 OpenCV 时使用纯 NumPy 的颜色转换
+    cv2 = None
+
+from scene_cuts import merge_cut_candidates
+from metrics import run_command, wait_measured, kill_on_cancel, StderrTail
+
+# 与 PySceneDetect 自动缩放一致：缩放到宽度不小于 256 像素
+ANALYSIS_MIN_WIDTH = 256
+BATCH_FRAMES = 64
+
+
+def probe_video_stream(path, metrics=None, cancel_token=None):
+    """读取视频流的宽、高和帧率"""
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,r_frame_rate,avg_frame_rate',
+        '-of', 'json',
+        path
+    ]
+    result = run_command(command, metrics, cancel_token=cancel_token)
+    stream = json.loads(result.stdout)['streams'][0]
+    rate = stream.get('r_frame_rate') or stream.get('avg_frame_rate')
+    num, _, den = rate.partition('/')
+    fps = float(num) / float(den or 1)
+    return int(stream['width']), int(stream['height']), fps
+
+
+def analysis_size(width, height, proxy_height=None):
+    """分析用的帧尺寸"""
+    if proxy_height:
+        scaled_height = int(proxy_height)
+        return max(1, round(width * scaled_height / height)), scaled_height
+    factor = 1 if width < ANALYSIS_MIN_WIDTH else width // ANALYSIS_MIN_WIDTH
+    return round(width / factor), round(height / factor)
+
+
+def rgb_to_hsv(rgb, out, scratch):
+    """批量把 RGB 帧转换为 OpenCV 约定的 8 位 HSV（H: 0-179，S/V: 0-255）
+
+    rgb: (n, h, w, 3) uint8；out: (n, h, w, 3) float32 输出；
+    scratch: 与 out 同形状的 float32 临时缓冲区。结果已取整，可以直接相减。
+    """
+    n = rgb.shape[0]
+    out = out[:n]
+    scratch = scratch[:n]
+    np.copyto(scratch, rgb, casting='unsafe')
+    r, g, b = scratch[..., 0], scratch[..., 1], scratch[..., 2]
+    h, s, v = out[..., 0], out[..., 1], out[..., 2]
+
+    np.maximum(np.maximum(r, g), b, out=v)
+    np.minimum(np.minimum(r, g), b, out=s)  # 先暂存最小值
+    delta = v - s
+    safe_delta = np.where(delta > 0, delta, 1)
+
+    # H：按 OpenCV 的判断顺序 V==R、V==G、否则 V==B
+    np.copyto(h, 240 + 60 * (r - g) / safe_delta)
+    np.copyto(h, 120 + 60 * (b - r) / safe_delta, where=(v == g))
+    np.copyto(h, 60 * (g - b) / safe_delta, where=(v == r))
+    h[delta == 0] = 0
+    h[h < 0] += 360
+    h *= 0.5
+
+    # S = 255 * (V - min) / V
+    np.divide(255 * delta, np.where(v > 0, v, 1), out=s)
+    np.rint(out, out=out)
+    h[h >= 180] -= 180
+    return out
+
+
+def batch_to_hsv(rgb, out, scratch):
+    """把一批 RGB 帧转换为 8 位 HSV，写入 out[:n]
+
+    有 OpenCV 时把整批帧当作一张 (n*h, w) 的图像，一次 cvtColor 完成，
+    转换结果与 ContentDetector 完全相同；否则使用 NumPy 实现。
+    """
+    n, h, w, _ = rgb.shape
+    if cv2 is not None:
+        cv2.cvtColor(rgb.reshape(n * h, w, 3), cv2.COLOR_RGB2HSV,
+                     dst=out[:n].reshape(n * h, w, 3))
+    else:
+        np.copyto(out[:n], rgb_to_hsv(rgb, scratch[0], scratch[1]), casting='unsafe')
+    return out[:n]
+
+
+def batch_abs_diff(current, previous, out):
+    """逐像素计算两批 8 位帧的绝对差，写入 out"""
+    n = current.shape[0]
+    if cv2 is not None:
+        rows = n * current.shape[1]
+        cv2.absdiff(current.reshape(rows, -1), previous.reshape(rows, -1),
+                    dst=out.reshape(rows, -1))
+    else:
+        # 8 位无符号数的绝对差：max - min 不会溢出
+        np.subtract(np.maximum(current, previous), np.minimum(current, previous), out=out)
+    return out
+
+
+def _read_frames(stream, buffer):
+    """把管道中的完整帧读入预分配缓冲区，返回读到的帧数"""
+    view = memoryview(buffer).cast('B')
+    frame_bytes = buffer[0].nbytes
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled // frame_bytes
+
+
+def frame_scores(path, frame_stride=1, proxy_height=None, batch_frames=BATCH_FRAMES,
+                 metrics=None, cancel_token=None, stream_info=None,
+                 start=None, duration=None, keyframes_only=False):
+    """通过 ffmpeg rawvideo 管道计算每一帧与前一帧的内容差异分数
+
+    返回 (scores, 分析帧率)，scores[i] 为第 i 帧的 HSV 平均差异（第 0 帧为 0），
+    与 ContentDetector 的 content_val 定义相同（H、S、V 三个分量等权平均）。
+    stream_info 为已探测到的 (宽, 高, 帧率)，提供时不再单独运行 ffprobe。
+    start/duration（秒）只分析其中一段；keyframes_only 时解码器跳过全部非关键帧，
+    scores[i] 为第 i 个关键帧与前一个关键帧的差异。
+    """
+    width, height, fps = stream_info or probe_video_stream(path, metrics, cancel_token)
+    out_w, out_h = analysis_size(width, height, proxy_height)
+    filters = []
+    if frame_stride > 1:
+        filters.append(f'framestep={frame_stride}')
+    filters.append(f'scale={out_w}:{out_h}:flags=bilinear')
+    input_options = []
+    if keyframes_only:
+        input_options += ['-skip_frame', 'nokey']
+    if start:
+        input_options += ['-ss', f"{start:.6f}"]
+    if duration is not None:
+        input_options += ['-t', f"{duration:.6f}"]
+    command = [
+        'ffmpeg',
+        '-v', 'error',
+        *input_options,
+        '-i', path,
+        '-map', '0:v:0',
+        '-an', '-sn', '-dn',
+        '-vf', ','.join(filters),
+        # 按解码顺序逐帧输出，不补帧也不丢帧，帧号与 OpenCV 逐帧读取一致
+        '-vsync', 'passthrough',
+        '-pix_fmt', 'rgb24',
+        '-f', 'rawvideo',
+        'pipe:1'
+    ]
+
+    # 所有缓冲区预先分配，循环内只按批处理，不为单帧创建 Python 对象
+    raw = np.empty((batch_frames, out_h, out_w, 3), dtype=np.uint8)
+    hsv = np.empty((batch_frames + 1, out_h, out_w, 3), dtype=np.uint8)
+    diff = np.empty((batch_frames, out_h, out_w, 3), dtype=np.uint8)
+    scratch = None
+    if cv2 is None:
+        scratch = np.empty((2, batch_frames, out_h, out_w, 3), dtype=np.float32)
+    pixels = float(out_h * out_w)
+    score_batches = []
+    first = True
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               bufsize=raw.nbytes)
+    stderr_tail = StderrTail(process.stderr)
+    try:
+        # 任务取消时立即杀掉 ffmpeg，管道读到结尾后循环自然结束
+        with kill_on_cancel(process, cancel_token):
+            while True:
+                n = _read_frames(process.stdout, raw)
+                if n == 0:
+                    break
+                # hsv[0] 保存上一批的最后一帧，hsv[1:n+1] 为本批
+                batch_to_hsv(raw[:n], hsv[1:], scratch)
+                batch_abs_diff(hsv[1:n + 1], hsv[:n], diff[:n])
+                batch = diff[:n].reshape(n, -1).sum(axis=1, dtype=np.uint64) / (3 * pixels)
+                if first:
+                    batch[0] = 0.0  # 第一帧没有可比较的前一帧
+                    first = False
+                score_batches.append(batch)
+                hsv[0] = hsv[n]
+                if n < batch_frames:
+                    break
+            process.stdout.close()
+            stderr = stderr_tail.text()
+            usage = wait_measured(process)
+        if metrics is not None:
+            metrics.record_command(command, time.perf_counter() - started, process.returncode,
+                                   *usage)
+        if cancel_token is not None:
+            cancel_token.check()
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg 解码失败: {stderr.strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    scores = np.concatenate(score_batches) if score_batches else np.zeros(0)
+    return scores, fps / frame_stride
+
+
+def cuts_from_scores(scores, threshold, min_scene_len):
+    """按 ContentDetector 的阈值/最短场景长度规则从分数中得到切点帧号"""
+    candidates = np.flatnonzero(scores >= threshold).tolist()
+    return merge_cut_candidates(candidates, min_scene_len)
+
+
+def detect_scenes_numpy(path, threshold=27, min_scene_len=15, frame_stride=1, proxy_height=None,
+                        metrics=None, cancel_token=None, stream_info=None):
+    """NumPy 场景检测，返回 [(开始秒, 结束秒), ...]；没有切点时返回空列表"""
+    scores, fps = frame_scores(path, frame_stride=frame_stride, proxy_height=proxy_height,
+                               metrics=metrics, cancel_token=cancel_token,
+                               stream_info=stream_info)
+    min_len = max(1, min_scene_len // frame_stride) if frame_stride > 1 else min_scene_len
+    cuts = cuts_from_scores(scores, threshold, min_len)
+    if not cuts:
+        return []
+    boundaries = [0] + cuts + [len(scores)]
+    return [
+        (start / fps, end / fps) for start, end in zip(boundaries[:-1], boundaries[1:])
+    ]
+
+
+def compare_engines(path, threshold=27, min_scene_len=15):
+    """对比 NumPy 引擎与 PySceneDetect 的切点和耗时"""
+    from scenedetect import detect, ContentDetector
+
+    started = time.perf_counter()
+    reference = detect(path, ContentDetector(threshold=threshold, min_scene_len=min_scene_len))
+    scenedetect_time = time.perf_counter() - started
+    reference_cuts = [scene[0].get_seconds() for scene in reference[1:]]
+
+    started = time.perf_counter()
+    scenes = detect_scenes_numpy(path, threshold, min_scene_len)
+    numpy_time = time.perf_counter() - started
+    numpy_cuts = [start for start, _ in scenes[1:]]
+
+    _, _, fps = probe_video_stream(path)
+    tolerance = 1.5 / fps  # 允许一帧误差
+    matched = sum(
+        1 for cut in numpy_cuts if any(abs(cut - ref) <= tolerance for ref in reference_cuts)
+    )
+    return {
+        'scenedetect': {'cuts': reference_cuts, 'seconds': scenedetect_time},
+        'numpy': {'cuts': numpy_cuts, 'seconds': numpy_time},
+        'matched': matched,
+        'speedup': scenedetect_time / numpy_time if numpy_time > 0 else None,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("使用方法：python numpy_detector.py <视频文件路径>")
+        sys.exit(1)
+    report = compare_engines(sys.argv[1])
+    print(f"PySceneDetect: {len(report['scenedetect']['cuts'])} 个切点，"
+          f"{report['scenedetect']['seconds']:.2f} 秒")
+    print(f"NumPy:         {len(report['numpy']['cuts'])} 个切点，"
+          f"{report['numpy']['seconds']:.2f} 秒")
+    print(f"一致的切点: {report['matched']}，加速比: {report['speedup']:.1f}x")
+    print("PySceneDetect 切点:", ', '.join(f"{t:.2f}" for t in report['scenedetect']['cuts']))
+    print("NumPy 切点:        ", ', '.join(f"{t:.2f}" for t in report['numpy']['cuts']))
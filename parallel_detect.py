@@ -0,0 +1,85 @@
+import os
+import multiprocessing
+
+from scenedetect import open_video, SceneManager, ContentDetector, FrameTimecode
+
+from scene_cuts import merge_cut_candidates
+
+# 每个分块向前多解码的帧数：分块的第一帧只用作比较基准，不产生分数
+DEFAULT_OVERLAP = 2
+
+
+def _detect_chunk(video_path, threshold, start_frame, end_frame, overlap):
+    """在子进程中分析 [start_frame, end_frame) 区间，返回该区间内所有超过阈值的帧
+
+    子进程内 min_scene_len 设为 0，只负责计算“候选切点”；最短场景长度依赖
+    上一个切点的位置，必须在合并阶段按时间顺序统一应用，才能与串行检测一致。
+    end_frame 为 None 时一直分析到视频结尾，并返回实际解码到的最后一帧。
+    """
+    video = open_video(video_path)
+    seek_frame = max(0, start_frame - overlap)
+    if seek_frame > 0:
+        video.seek(seek_frame)
+    scene_manager = SceneManager()
+    scene_manager.add_detector(ContentDetector(threshold=threshold, min_scene_len=0))
+    if end_frame is None:
+        scene_manager.detect_scenes(video=video)
+    else:
+        scene_manager.detect_scenes(video=video, end_time=end_frame)
+    # 除第一个场景外，每个场景的起点就是一个切点
+    cuts = [
+        scene[0].get_frames() for scene in scene_manager.get_scene_list()[1:]
+        if start_frame <= scene[0].get_frames()
+        and (end_frame is None or scene[0].get_frames() < end_frame)
+    ]
+    return cuts, video.position.get_frames()
+
+
+def detect_content_parallel(video_path, threshold, min_scene_len, workers=None,
+                            overlap=DEFAULT_OVERLAP, cancel_token=None):
+    """把时间轴切成 N 段，在多个进程中并行检测，返回 PySceneDetect 格式的场景列表
+
+    任务取消时立即终止所有检测子进程并抛出 JobCancelled。
+    """
+    workers = workers or os.cpu_count() or 1
+    video = open_video(video_path)
+    frame_rate = video.frame_rate
+    total_frames = video.duration.get_frames()
+    del video
+
+    chunk_len = -(-total_frames // workers)  # 向上取整
+    bounds = []
+    for i in range(workers):
+        start = i * chunk_len
+        if start >= total_frames:
+            break
+        # 最后一段不设终点，一直解码到文件结尾，保证结尾帧数与串行检测一致
+        end = None if i == workers - 1 or start + chunk_len >= total_frames else start + chunk_len
+        bounds.append((start, end))
+
+    # 使用 multiprocessing.Pool：取消时可以用 terminate() 直接结束正在运行的子进程
+    with multiprocessing.Pool(processes=len(bounds)) as pool:
+        pending = [
+            pool.apply_async(_detect_chunk, (video_path, threshold, start, end, overlap))
+            for start, end in bounds
+        ]
+        if cancel_token is not None:
+            with cancel_token.on_cancel(pool.terminate):
+                for result in pending:
+                    while not result.ready() and not cancel_token.cancelled:
+                        result.wait(0.2)
+            cancel_token.check()
+        results = [result.get() for result in pending]
+
+    candidates = [frame for cuts, _ in results for frame in cuts]
+    cuts = merge_cut_candidates(candidates, min_scene_len)
+    if not cuts:
+        # 与 SceneManager.get_scene_list() 保持一致：没有切点时返回空列表
+        return []
+
+    last_frame = results[-1][1]
+    boundaries = [0] + cuts + [last_frame + 1]
+    return [
+        (FrameTimecode(start, frame_rate), FrameTimecode(end, frame_rate))
+        for start, end in zip(boundaries[:-1], boundaries[1:])
+    ]
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import sys
 import os
-from video_editor import VideoEditor
+from warm_worker import submit_job
 from rich.console import Console
 from rich import print as rprint
 
@@ -22,7 +22,17 @@ def process_video(input_path):
     output_path = os.path.join(os.path.expanduser("~/Downloads"), output_filename)
 
     try:
+        # 有常驻进程（warm_worker.py）时交给它处理，省去每次导入检测依赖的时间
+        result = submit_job(input_path, output_path)
+        if result is not None:
+            if not result['ok']:
+                print(f"处理失败：{result.get('error') or '未知错误'}")
+                return False
+            print(f"✓ 处理完成！输出文件：{result['output_path']}")
+            return True
+
         # 创建编辑器实例并处理视频
+        from video_editor import VideoEditor
         editor = VideoEditor(input_path, output_path)
         editor.create_final_video()
         print(f"✓ 处理完成！输出文件：{output_path}")
@@ -32,7 +42,18 @@ def process_video(input_path):
         print(f"处理失败：{str(e)}")
         return False
 
+def process_batch(paths):
+    """一次选中多个文件或文件夹时并行批量处理"""
+    from batch import run_batch
+
+    summary = run_batch(paths, os.path.expanduser("~/Downloads"))
+    print(f"✓ 批量处理完成：成功 {summary['done']} 个，失败 {summary['failed']} 个，"
+          f"跳过 {summary['skipped']} 个；{summary['files_per_minute']:.2f} 个/分钟")
+    return summary['failed'] == 0
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and os.path.isdir(sys.argv[1])):
+        process_batch(sys.argv[1:])
+    elif len(sys.argv) > 1:
         input_path = sys.argv[1]
         process_video(input_path)
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，退化为进程内无锁
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.getenv(
+    'VIDEO_EDITOR_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'video_editor')
+)
+DEFAULT_MAX_BYTES = int(os.getenv('VIDEO_EDITOR_SCENE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """分块计算文件内容的 SHA-256（内存占用与文件大小无关）"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class SceneCache:
+    """场景检测结果的磁盘缓存
+
+    以 输入内容哈希 + 检测参数 为键，每个条目是一个 JSON 文件。
+    按文件修改时间做近似 LRU 淘汰，总大小超过 max_bytes 时删除最久未用的条目。
+    写入先落临时文件再 os.replace，读操作无需加锁；写入和淘汰通过
+    flock 串行化，因此多个 gunicorn 线程/进程可以安全共享同一个目录。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'scenes')
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock_path = os.path.join(self.cache_dir, '.lock')
+
+    @staticmethod
+    def make_key(content_hash, params):
+        """由内容哈希和检测参数生成缓存键"""
+        payload = json.dumps({'hash': content_hash, 'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    @contextmanager
+    def _locked(self):
+        """跨线程/进程的排他锁"""
+        with open(self._lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def get(self, key):
+        """读取缓存的场景列表，未命中返回 None"""
+        entry = self.get_entry(key)
+        return entry['scenes'] if entry else None
+
+    def get_entry(self, key):
+        """读取缓存条目 {'scenes': [...], 'audio': 响度包络或 None}，未命中返回 None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            # 更新修改时间，作为 LRU 的“最近使用”标记
+            os.utime(path, None)
+        except OSError:
+            pass
+        scenes = [tuple(scene) for scene in entry.get('scenes', [])]
+        if not scenes:
+            return None
+        return {'scenes': scenes, 'audio': entry.get('audio')}
+
+    def put(self, key, scenes, audio=None):
+        """写入场景列表（和可选的音频响度包络），并在超出容量时淘汰旧条目"""
+        entry = {'created': time.time(), 'scenes': [list(scene) for scene in scenes]}
+        if audio is not None:
+            entry['audio'] = audio
+        with self._locked():
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, self._entry_path(key))
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._evict()
+
+    def _evict(self):
+        """按最近使用时间淘汰条目，直到总大小不超过上限（调用方需持有锁）"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
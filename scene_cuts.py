@@ -0,0 +1,13 @@
+def merge_cut_candidates(candidates, min_scene_len, start_frame=0):
+    """按时间顺序应用最短场景长度，得到与串行 ContentDetector 相同的切点
+
+    串行检测器唯一的跨帧状态是“上一个切点”，第一个切点相对起始帧计算。
+    各检测引擎（PySceneDetect 分块并行、NumPy、分层检测）共用，本模块不依赖它们的第三方库。
+    """
+    cuts = []
+    last_cut = start_frame
+    for frame in sorted(set(candidates)):
+        if frame - last_cut >= min_scene_len:
+            cuts.append(frame)
+            last_cut = frame
+    return cuts
@@ -0,0 +1,134 @@
+import numpy as np
+
+DEFAULT_QUANTUM = 0.1  # 时长量化粒度（秒）
+# 回溯用的选中标记（每个候选、每个容量一位）的内存上限；超过时分块保存 dp 检查点，回溯时逐块重算
+TAKE_BUDGET_BYTES = 16 * 1024 * 1024
+
+
+def _prune_candidates(quantized, values, durations, capacity):
+    """每种量化时长最多只可能选 capacity // q 个，只保留其中价值最高的
+
+    候选数量因此不超过 capacity * ln(capacity)，与场景总数无关。
+    """
+    fits = np.flatnonzero((quantized > 0) & (quantized <= capacity))
+    if len(fits) == 0:
+        return fits
+    # 按 (量化时长, 价值降序, 实际时长降序) 排序后，每组取前 k 个
+    order = fits[np.lexsort((-durations[fits], -values[fits], quantized[fits]))]
+    keep = []
+    group_start = 0
+    q_sorted = quantized[order]
+    while group_start < len(order):
+        q = q_sorted[group_start]
+        group_end = np.searchsorted(q_sorted, q, side='right')
+        keep.append(order[group_start:group_start + min(group_end - group_start, capacity // q)])
+        group_start = group_end
+    return np.concatenate(keep)
+
+
+def _knapsack_rows(dp, rows, quantized, values, take=None):
+    """依次放入 rows 中的候选，原地更新 dp；传入 take 时按位记录每个候选在各容量上是否被选中"""
+    shifted = np.empty_like(dp)
+    for k, index in enumerate(rows):
+        q = quantized[index]
+        shifted[:q] = -np.inf
+        np.add(dp[:-q], values[index], out=shifted[q:])
+        better = shifted > dp
+        if take is not None:
+            take[k] = np.packbits(better)
+        np.copyto(dp, shifted, where=better)
+
+
+def select_subset(durations, target, values=None, tolerance=0.5, quantum=DEFAULT_QUANTUM):
+    """在总时长不超过 target 且不少于 target - tolerance 的前提下，选出价值最高的场景组合
+
+    基于量化时长的 0/1 背包动态规划。values 为每个场景的价值（默认 -1，即场景越少、
+    单个场景越长越好）。返回 (选中下标列表, 是否落在容差范围内)；
+    找不到这样的组合时返回不超过 target 的最长组合。
+    """
+    durations = np.asarray(durations, dtype=np.float64)
+    if values is None:
+        values = np.full(len(durations), -1.0)
+    values = np.asarray(values, dtype=np.float64)
+    capacity = int(np.floor(target / quantum + 1e-9))
+    if capacity <= 0 or len(durations) == 0:
+        return [], False
+
+    quantized = np.rint(durations / quantum).astype(np.int64)
+    candidates = _prune_candidates(quantized, values, durations, capacity)
+
+    # dp[c]：量化总时长恰好为 c 时的最大价值；take[k] 的第 c 位：第 k 个候选是否被选中。
+    # 候选按块处理：只有一块时直接记录 take；多块时只保存每块开始时的 dp，回溯时逐块重算，
+    # 内存不超过 TAKE_BUDGET_BYTES 加上每块一份 dp
+    row_bytes = (capacity + 8) // 8
+    block = max(1, TAKE_BUDGET_BYTES // row_bytes)
+    blocks = [candidates[i:i + block] for i in range(0, len(candidates), block)]
+    dp = np.full(capacity + 1, -np.inf)
+    dp[0] = 0.0
+    checkpoints = []
+    take = None
+    for rows in blocks:
+        if len(blocks) > 1:
+            checkpoints.append(dp.copy())
+        else:
+            take = np.zeros((len(rows), row_bytes), dtype=np.uint8)
+        _knapsack_rows(dp, rows, quantized, values, take)
+
+    reachable = np.flatnonzero(np.isfinite(dp))
+    window_start = max(0, capacity - int(np.floor(tolerance / quantum + 1e-9)))
+    in_window = reachable[reachable >= window_start]
+    if len(in_window):
+        # 容差范围内取价值最高的，价值相同时取更接近目标的
+        best = in_window[np.lexsort((in_window, dp[in_window]))[-1]]
+        hit = True
+    else:
+        best = reachable[-1]
+        hit = False
+
+    chosen = []
+    c = best
+    for b in range(len(blocks) - 1, -1, -1):
+        rows = blocks[b]
+        if len(blocks) > 1:
+            take = np.zeros((len(rows), row_bytes), dtype=np.uint8)
+            _knapsack_rows(checkpoints.pop(), rows, quantized, values, take)
+        for k in range(len(rows) - 1, -1, -1):
+            if c > 0 and (take[k, c >> 3] >> (7 - (c & 7))) & 1:
+                index = rows[k]
+                chosen.append(int(index))
+                c -= quantized[index]
+    return sorted(chosen), hit
+
+
+def select_scenes_optimal(middle_scenes, target, values=None, tolerance=0.5,
+                          quantum=DEFAULT_QUANTUM):
+    """从中间场景中选出总时长尽量接近 target 的完整场景，按时间顺序返回 [(start, end), ...]
+
+    只有在完整场景无法凑到容差范围内时，才截取一个未选中的场景补足剩余时长。
+    """
+    if not middle_scenes or target <= 0:
+        return []
+    durations = np.array([end - start for start, end in middle_scenes], dtype=np.float64)
+    chosen, hit = select_subset(durations, target, values, tolerance, quantum)
+    selected = {i: middle_scenes[i] for i in chosen}
+
+    total = float(durations[chosen].sum()) if chosen else 0.0
+    if total > target and chosen:
+        # 量化误差可能使实际总时长略超目标，从最长的选中场景末尾减去
+        longest = max(chosen, key=lambda i: durations[i])
+        start, end = selected[longest]
+        selected[longest] = (start, end - (total - target))
+    elif not hit:
+        # 完整场景凑不够：截取一个足够长的未选场景补足（优先价值高、时长长的）
+        remaining = target - total
+        unused = [i for i in range(len(middle_scenes)) if i not in selected
+                  and durations[i] >= remaining]
+        if unused:
+            if values is None:
+                filler = max(unused, key=lambda i: durations[i])
+            else:
+                filler = max(unused, key=lambda i: (values[i], durations[i]))
+            start, _ = middle_scenes[filler]
+            selected[filler] = (start, start + remaining)
+
+    return [selected[i] for i in sorted(selected)]
@@ -0,0 +1,35 @@
+import os
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def make_input(tmp_path_factory):
+    """用 benchmark.generate_input 生成确定性的测试视频（同一会话内复用）"""
+    if shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None:
+        pytest.skip('需要 ffmpeg 和 ffprobe')
+    from benchmark import generate_input, available_encoders
+    input_dir = str(tmp_path_factory.mktemp('inputs'))
+
+    def make(codec='libx264', size='320x240', duration=30, scene_len=3, container='mp4'):
+        if codec not in available_encoders():
+            pytest.skip(f'ffmpeg 不支持编码器 {codec}')
+        case = {'size': size, 'duration': duration, 'scene_len': scene_len, 'codec': codec}
+        path = generate_input(case, input_dir)
+        if container == 'mp4':
+            return path
+        # 直接转封装：MKV 中视频流的 start_time 不为 0（AAC 编码延迟），用来覆盖时间轴偏移
+        remuxed = f"{os.path.splitext(path)[0]}.{container}"
+        if not os.path.exists(remuxed):
+            subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', path, '-c', 'copy', remuxed],
+                           check=True)
+        return remuxed
+
+    return make
@@ -0,0 +1,57 @@
+import os
+
+from batch import BatchManifest, _output_paths
+
+
+def make_file(path, content=b'video'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def test_rerun_keeps_recorded_outputs(tmp_path):
+    output_dir = str(tmp_path / 'out')
+    first = make_file(str(tmp_path / 'a' / 'clip.mp4'))
+    second = make_file(str(tmp_path / 'b' / 'clip.mp4'))
+    manifest = BatchManifest(str(tmp_path / 'manifest.json'))
+
+    # 上一次只有第二个输入完成，占用了不带序号的文件名
+    recorded = make_file(os.path.join(output_dir, 'edited_clip.mp4'))
+    manifest.record(second, 'done', output=recorded)
+
+    outputs = _output_paths([first, second], output_dir, manifest)
+    assert outputs[second] == recorded
+    assert outputs[first] == os.path.join(output_dir, 'edited_clip_2.mp4')
+
+
+def test_missing_recorded_output_is_not_reserved(tmp_path):
+    output_dir = str(tmp_path / 'out')
+    first = make_file(str(tmp_path / 'a' / 'clip.mp4'))
+    second = make_file(str(tmp_path / 'b' / 'clip.mp4'))
+    manifest = BatchManifest(str(tmp_path / 'manifest.json'))
+    manifest.record(second, 'done', output=os.path.join(output_dir, 'edited_clip_7.mp4'))
+
+    outputs = _output_paths([first, second], output_dir, manifest)
+    assert outputs == {
+        first: os.path.join(output_dir, 'edited_clip.mp4'),
+        second: os.path.join(output_dir, 'edited_clip_2.mp4'),
+    }
+
+
+def test_batch_outputs_every_target(make_input, tmp_path):
+    from batch import run_batch
+
+    path = make_input(duration=30, scene_len=3)
+    output_dir = str(tmp_path / 'out')
+    summary = run_batch([path], output_dir, workers=1, targets=[5, 8], log=lambda *args: None)
+    assert summary['done'] == 1
+    name = os.path.splitext(os.path.basename(path))[0]
+    for suffix in ('5s', '8s'):
+        assert os.path.exists(os.path.join(output_dir, f'edited_{name}_{suffix}.mp4'))
+
+    # 相同的目标时长重跑时跳过，换了目标时长时重新处理
+    rerun = run_batch([path], output_dir, workers=1, targets=[5, 8], log=lambda *args: None)
+    assert rerun['skipped'] == 1
+    manifest = BatchManifest(summary['manifest'])
+    assert not manifest.is_done(path, [5, 12])
@@ -0,0 +1,52 @@
+import io
+import os
+import time
+import hashlib
+import threading
+
+from chunked_upload import ChunkedUploadStore, OffsetMismatchError
+
+
+class SlowStream(io.BytesIO):
+    """每次读取前停顿，让并发的追加请求在持锁期间到达"""
+
+    def read(self, size=-1):
+        time.sleep(0.05)
+        return super().read(min(size, 4))
+
+
+def test_concurrent_appends_are_serialized(tmp_path):
+    data = b'0123456789abcdef'
+    store = ChunkedUploadStore(str(tmp_path / 'uploads'))
+    # 两个独立的实例模拟两个服务进程，只能通过磁盘上的锁文件互斥
+    other = ChunkedUploadStore(str(tmp_path / 'uploads'))
+    upload_id = store.create('a.mp4', len(data))
+
+    results = []
+
+    def append(target):
+        try:
+            results.append(target.append(upload_id, 0, SlowStream(data)))
+        except OffsetMismatchError as e:
+            results.append(('mismatch', e.expected))
+
+    threads = [threading.Thread(target=append, args=(target,)) for target in (store, other)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results, key=str) == [('mismatch', len(data)), len(data)]
+    target = str(tmp_path / 'a.mp4')
+    assert store.finish(upload_id, target) == hashlib.sha256(data).hexdigest()
+    with open(target, 'rb') as f:
+        assert f.read() == data
+    assert os.listdir(tmp_path / 'uploads') == []
+
+
+def test_get_after_data_file_is_gone(tmp_path):
+    store = ChunkedUploadStore(str(tmp_path / 'uploads'))
+    upload_id = store.create('a.mp4', 4)
+    # finish() 已移走数据文件、还未删除元数据时查询状态
+    os.remove(store.data_path(upload_id))
+    assert store.get(upload_id) is None
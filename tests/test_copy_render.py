@@ -0,0 +1,48 @@
+import subprocess
+
+import pytest
+
+from video_editor import VideoEditor
+
+SCENES = [(1.3, 6.1), (13.45, 19.7), (30.2, 33.0)]
+
+
+def probe(path, *args):
+    command = ['ffprobe', '-v', 'error', *args, '-of', 'csv=p=0', path]
+    return subprocess.run(command, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.mark.parametrize('container', ['mp4', 'mkv'])
+@pytest.mark.parametrize('render_mode', ['segments', 'single'])
+def test_copy_render_matches_planned_cuts(render_mode, container, make_input, tmp_path):
+    path = make_input(codec='libx264', duration=40, scene_len=4, container=container)
+    output = str(tmp_path / f'{render_mode}.mp4')
+    editor = VideoEditor(path, output, render_mode=render_mode, use_scene_cache=False)
+    if container == 'mkv':
+        assert editor._probe_media().video_start_time > 0
+
+    planned = editor._plan_copy_cuts(SCENES)
+    assert len(planned) == len(SCENES)
+    if render_mode == 'segments':
+        assert editor._render_segments(planned, output)
+    else:
+        assert editor._render_single_pass(planned, output)
+
+    fps = editor.media.fps
+    expected = sum(end - start for start, end in planned)
+    frames = int(probe(output, '-select_streams', 'v:0', '-count_packets',
+                       '-show_entries', 'stream=nb_read_packets'))
+    # 流复制按解码时间戳判断结束位置，有 B 帧时每段末尾最多多出重排深度（2 帧）；
+    # 定位退到上一个 GOP 时每段会多出几十帧
+    assert 0 <= frames - expected * fps <= 2 * len(planned) + 0.5
+
+
+@pytest.mark.parametrize('target', [10, 15, 30])
+def test_segments_duration_on_mkv(target, make_input, tmp_path):
+    path = make_input(codec='libx264', duration=40, scene_len=4, container='mkv')
+    output = str(tmp_path / f'edited_{target}.mp4')
+    editor = VideoEditor(path, output, target_duration=target, render_mode='segments',
+                         use_scene_cache=False)
+    assert editor.process_video()
+    duration = float(probe(output, '-show_entries', 'format=duration'))
+    assert duration <= target + editor.selection_tolerance + 0.2
@@ -0,0 +1,19 @@
+import os
+
+from edit_plan import EditPlan
+from video_editor import VideoEditor
+
+
+def test_render_with_unusable_media_fails_cleanly(tmp_path):
+    source = tmp_path / 'in.mp4'
+    source.write_bytes(b'not really a video')
+    # 方案写好之后源文件被替换：大小一致，但流信息中已经没有视频流
+    plan = EditPlan(
+        source={'filename': 'in.mp4', 'size': os.path.getsize(source), 'sha256': None},
+        media={'format': {'duration': '10.0'}, 'streams': []},
+        variants=[{'name': 'default', 'target_duration': 5.0, 'scenes': [[0.0, 5.0]]}],
+        render={'render_mode': 'single'},
+    )
+    editor = VideoEditor(str(source), str(tmp_path / 'out.mp4'), use_scene_cache=False)
+    assert editor.render(plan, verify_source=False) is False
+    assert not os.path.exists(tmp_path / 'out.mp4')
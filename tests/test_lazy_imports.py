@@ -0,0 +1,28 @@
+import sys
+import subprocess
+
+from conftest import ROOT
+
+
+def imported_after(code):
+    """在新的解释器中执行 code，返回执行后已导入的模块名集合"""
+    script = f"import sys\n{code}\nprint(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+def test_numpy_engine_does_not_import_scenedetect():
+    modules = imported_after('import numpy_detector, hierarchical_detect')
+    assert 'scenedetect' not in modules
+    assert 'parallel_detect' not in modules
+
+
+def test_scenedetect_engine_does_not_import_numpy_detector():
+    modules = imported_after(
+        "from video_editor import VideoEditor\n"
+        "editor = VideoEditor('in.mp4', 'out.mp4', detector_engine='scenedetect')\n"
+        "editor._run_content_detector = lambda *args, **kwargs: [(0.0, 2.0)]\n"
+        "assert editor._detect_scenes() == [(0.0, 2.0)]"
+    )
+    assert 'numpy_detector' not in modules
@@ -0,0 +1,19 @@
+import sys
+
+from metrics import JobMetrics, run_command
+
+
+def test_stage_memory_is_per_stage_child_peak():
+    metrics = JobMetrics()
+    with metrics.stage('select'):
+        pass
+    with metrics.stage('render'):
+        run_command([sys.executable, '-c', 'pass'], metrics)
+
+    record = metrics.to_dict()
+    select, render = record['stages']
+    # 本进程的 ru_maxrss 只增不减，不按阶段记录
+    assert 'peak_rss_bytes' not in select
+    assert select['child_peak_rss_bytes'] == 0
+    assert render['child_peak_rss_bytes'] > 0
+    assert record['process_peak_rss_bytes'] > 0
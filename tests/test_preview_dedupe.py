@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import tempfile
+import importlib
+
+import pytest
+
+import scene_cache
+
+
+@pytest.fixture
+def web_app(tmp_path, monkeypatch):
+    """使用独立任务数据库、上传目录、场景缓存和一个工作线程的 web_app
+
+    重新导入一份新的模块，结束后 sys.modules 恢复为原来的 web_app。
+    """
+    monkeypatch.setenv('VIDEO_JOB_DB', str(tmp_path / 'jobs.sqlite3'))
+    monkeypatch.setenv('VIDEO_JOB_WORKERS', '1')
+    monkeypatch.delenv('VIDEO_JOB_START_AFTER_FORK', raising=False)
+    # 上传目录和编辑器临时目录都在 tempfile.gettempdir() 下
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    monkeypatch.setenv('VIDEO_EDITOR_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(scene_cache, 'DEFAULT_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.delitem(sys.modules, 'web_app', raising=False)
+    module = importlib.import_module('web_app')
+    assert module.UPLOAD_FOLDER.startswith(str(tmp_path))
+    yield module
+    module.job_queue.stop()
+
+
+def wait_done(client, job_id, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        if job['status'] in ('done', 'failed', 'cancelled'):
+            assert job['status'] == 'done', job
+            return job
+        time.sleep(0.2)
+    pytest.fail(f'任务 {job_id} 超时')
+
+
+def upload_preview(client, path):
+    with open(path, 'rb') as f:
+        response = client.post('/api/upload', data={'video': (f, 'input.mp4'), 'preview': '1'},
+                               content_type='multipart/form-data')
+    assert response.status_code in (200, 202), response.get_json()
+    return response.get_json()['job_id']
+
+
+def test_confirmed_preview_is_not_reused(web_app, make_input):
+    client = web_app.app.test_client()
+    path = make_input(duration=30, scene_len=3)
+
+    first = upload_preview(client, path)
+    wait_done(client, first)
+    confirm = client.post(f'/api/jobs/{first}/render')
+    assert confirm.status_code in (200, 202), confirm.get_json()
+    wait_done(client, confirm.get_json()['job_id'])
+
+    # 预览的输入文件已被确认取走：相同文件再次上传时必须生成新的预览，而不是返回无法确认的旧任务
+    second = upload_preview(client, path)
+    assert second != first
+    wait_done(client, second)
+    assert client.post(f'/api/jobs/{second}/render').status_code != 410
+
+
+def test_expired_preview_is_not_reused(web_app, make_input):
+    client = web_app.app.test_client()
+    path = make_input(duration=30, scene_len=3)
+
+    first = upload_preview(client, path)
+    wait_done(client, first)
+    preview_input = web_app.job_queue.get(first)['result']['preview_input']
+    os.remove(os.path.join(web_app.PREVIEW_INPUT_FOLDER, preview_input))
+
+    second = upload_preview(client, path)
+    assert second != first
@@ -0,0 +1,39 @@
+import audio_energy
+from scene_cache import SceneCache
+from video_editor import VideoEditor
+
+
+def analyze(path, cache_dir, audio_weight):
+    editor = VideoEditor(path, str(cache_dir / 'unused.mp4'), audio_weight=audio_weight,
+                         scene_cache=SceneCache(cache_dir=str(cache_dir)))
+    scenes = editor._analyze_scenes()
+    return editor, scenes
+
+
+def test_cache_hit_does_not_decode_audio(make_input, tmp_path, monkeypatch):
+    path = make_input(duration=30, scene_len=3)
+    first, scenes = analyze(path, tmp_path, audio_weight=1.0)
+    assert scenes and first.audio_envelope is not None
+
+    def fail(*args, **kwargs):
+        raise AssertionError('命中缓存时不应再解码音频')
+
+    monkeypatch.setattr(audio_energy, 'audio_envelope', fail)
+    second, cached_scenes = analyze(path, tmp_path, audio_weight=1.0)
+    assert cached_scenes == scenes
+    assert second.audio_envelope is not None
+    assert len(second.audio_envelope.loudness) == len(first.audio_envelope.loudness)
+    assert 'audio' not in [stage['stage'] for stage in second.metrics.to_dict()['stages']]
+
+
+def test_audio_is_opt_in(make_input, tmp_path, monkeypatch):
+    path = make_input(duration=30, scene_len=3)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('默认不应解码音频')
+
+    monkeypatch.setattr(audio_energy, 'audio_envelope', fail)
+    editor = VideoEditor(path, str(tmp_path / 'unused.mp4'),
+                         scene_cache=SceneCache(cache_dir=str(tmp_path)))
+    assert editor._analyze_scenes()
+    assert editor.audio_envelope is None
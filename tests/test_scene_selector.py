@@ -0,0 +1,33 @@
+import tracemalloc
+
+import numpy as np
+
+import scene_selector
+from scene_selector import select_subset
+
+
+def random_durations(count, seed=0):
+    return np.random.default_rng(seed).uniform(1, 8, count).round(3)
+
+
+def test_blocked_backtracking_matches_single_block(monkeypatch):
+    durations = random_durations(2000)
+    values = -np.random.default_rng(1).uniform(0.5, 1.5, len(durations))
+    expected = select_subset(durations, 120, values)
+    # 每块只容纳少量候选：回溯时逐块从检查点重算
+    monkeypatch.setattr(scene_selector, 'TAKE_BUDGET_BYTES', 4096)
+    assert select_subset(durations, 120, values) == expected
+    chosen, hit = expected
+    assert hit and 119.5 <= durations[chosen].sum() <= 120.05
+
+
+def test_long_target_memory_is_bounded():
+    durations = random_durations(100000)
+    tracemalloc.start()
+    try:
+        chosen, hit = select_subset(durations, 1200)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert hit
+    assert peak < scene_selector.TAKE_BUDGET_BYTES + 32 * 1024 * 1024
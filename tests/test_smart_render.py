@@ -0,0 +1,41 @@
+import subprocess
+
+import pytest
+
+from video_editor import VideoEditor
+
+# 起止点都不在关键帧上（测试视频每 48 帧一个关键帧），每段都有重新编码和直接复制的部分
+SCENES = [(1.3, 6.1), (13.45, 19.7), (30.2, 33.0)]
+
+
+def packets(path):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'warning', '-select_streams', 'v:0',
+         '-show_entries', 'packet=pts,dts', '-of', 'csv=p=0', path],
+        capture_output=True, text=True
+    )
+    return [tuple(int(v) for v in line.split(',')) for line in result.stdout.split()], result.stderr
+
+
+@pytest.mark.parametrize('codec, container', [
+    ('libx264', 'mp4'), ('libx265', 'mp4'), ('mpeg4', 'mp4'), ('libx264', 'mkv'), ('libx265', 'mkv'),
+])
+def test_smart_render_has_monotonic_dts(codec, container, make_input, tmp_path):
+    path = make_input(codec=codec, size='320x240', duration=40, scene_len=4, container=container)
+    output = str(tmp_path / 'smart.mp4')
+    editor = VideoEditor(path, output, render_mode='smart', use_scene_cache=False)
+    assert editor._render_smart(SCENES, output)
+
+    video, warnings = packets(output)
+    assert 'monoton' not in warnings.lower()
+    assert all(b[1] > a[1] for a, b in zip(video, video[1:])), '解码时间戳不是严格递增'
+    assert all(dts <= pts for pts, dts in video), '解码时间晚于显示时间'
+
+    fps = editor.media.fps
+    expected = sum(int(round(end * fps)) - int(round(start * fps)) for start, end in SCENES)
+    assert len(video) == expected
+
+    decode = subprocess.run(['ffmpeg', '-v', 'warning', '-i', output, '-f', 'null', '-'],
+                            capture_output=True, text=True)
+    assert decode.returncode == 0
+    assert 'monoton' not in decode.stderr.lower()
@@ -0,0 +1,21 @@
+import sys
+import subprocess
+
+from metrics import StderrTail
+
+# 先向 stderr 写 1 MB（远超管道缓冲区）再写 stdout：不同时读取 stderr 时两个进程互相等待
+CHATTY = "import sys; sys.stderr.write('x' * (1 << 20) + 'end'); sys.stderr.flush(); print('done')"
+
+
+def test_stderr_is_drained_while_reading_stdout():
+    process = subprocess.Popen([sys.executable, '-c', CHATTY],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    tail = StderrTail(process.stderr, limit=1024)
+    try:
+        assert process.stdout.read() == b'done\n'
+        stderr = tail.text()
+        assert process.wait(timeout=10) == 0
+    finally:
+        process.kill()
+    assert len(stderr) == 1024
+    assert stderr.endswith('end')
@@ -0,0 +1,70 @@
+import json
+import socket
+import threading
+
+import video_editor
+import warm_worker
+from cancellation import CancelToken
+
+
+class BlockingEditor:
+    """检测阶段一直不报告进度，直到任务被取消"""
+
+    instances = []
+
+    def __init__(self, input_path, output_path, **kwargs):
+        self.output_path = output_path
+        self.variant_outputs = []
+        self.cancel_token = CancelToken()
+        self.started = threading.Event()
+        self.instances.append(self)
+
+    def cancel(self, reason='任务已取消'):
+        self.cancel_token.cancel(reason)
+
+    def process_video(self, progress_callback=None, variants=None):
+        progress_callback(0)
+        self.started.set()
+        return not self.cancel_token.wait(timeout=10)
+
+
+def start_server(socket_path):
+    server = warm_worker.WorkerServer(socket_path, max_jobs=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_finished_job_is_not_cancelled(tmp_path, monkeypatch):
+    monkeypatch.setattr(BlockingEditor, 'process_video', lambda self, **kwargs: True)
+    monkeypatch.setattr(video_editor, 'VideoEditor', BlockingEditor)
+    socket_path = str(tmp_path / 'worker.sock')
+    server = start_server(socket_path)
+    try:
+        result = warm_worker.submit_job('/in.mp4', '/out.mp4', socket_path=socket_path)
+        assert result['ok']
+        assert not BlockingEditor.instances[-1].cancel_token.cancelled
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_disconnect_cancels_running_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_editor, 'VideoEditor', BlockingEditor)
+    socket_path = str(tmp_path / 'worker.sock')
+    server = start_server(socket_path)
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(socket_path)
+        request = {'op': 'edit', 'input_path': '/in.mp4', 'output_path': '/out.mp4'}
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        sock.recv(4096)  # 第一条进度
+        assert BlockingEditor.instances[-1].started.wait(timeout=5)
+        sock.close()
+
+        editor = BlockingEditor.instances[-1]
+        # 没有进度写入也能在断开后立即取消，而不是等到 10 秒后检测结束
+        assert editor.cancel_token.wait(timeout=2)
+        assert editor.cancel_token.reason == '调用方已断开连接'
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,29 +1,149 @@
 import os
+import time
 import random
-import subprocess
-import json
 import tempfile
-import numpy as np
-from scenedetect import detect, ContentDetector
+import importlib
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from scene_cache import SceneCache, hash_file
+from metrics import JobMetrics, run_command, append_record
+from cancellation import CancelToken, JobCancelled
+from media_info import probe_media, UnsupportedMediaError
+from keyframe_index import KeyframeIndex, probe_packets, closed_prefix
+from edit_plan import EditPlan, EditPlanError, RENDER_SETTINGS
+
+# 场景检测、场景选择和音频分析依赖 NumPy、OpenCV 和 PySceneDetect，导入一次要几百毫秒到数秒。
+# 这些模块在第一次用到时才导入：探测文件、提交任务到常驻进程的调用不需要等待它们
+HEAVY_MODULES = (
+    'numpy', 'cv2', 'scenedetect',
+    'numpy_detector', 'hierarchical_detect', 'parallel_detect', 'scene_selector', 'audio_energy',
+)
+
+
+def preload():
+    """提前导入全部重量级依赖（常驻进程和 gunicorn 主进程启动时调用），返回耗时（秒）"""
+    started = time.perf_counter()
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"预加载 {name} 失败: {str(e)}")
+    return time.perf_counter() - started
+
+# 智能剪切：源视频编码 → 重新编码关键帧之前那一小段时使用的编码器
+SMART_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265', 'mpeg4': 'mpeg4'}
+# 把参数集写入每个关键帧的码流过滤器，拼接后各片段用自己的参数集解码
+SMART_BITSTREAM_FILTERS = {'h264': 'h264_mp4toannexb', 'hevc': 'hevc_mp4toannexb',
+                           'mpeg4': 'dump_extra'}
+# 开放 GOP 的前导帧可以在复制时丢弃的编码：HEVC 规定关键帧之后的帧不参考 RASL 前导帧
+SMART_SKIP_LEADING = {'hevc'}
+# ffprobe 的编码档次名称 → 编码器的 -profile:v 参数
+SMART_PROFILES = {
+    'libx264': {
+        'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main',
+        'High': 'high', 'High 10': 'high10', 'High 4:2:2': 'high422',
+        'High 4:4:4 Predictive': 'high444',
+    },
+    'libx265': {'Main': 'main', 'Main 10': 'main10', 'Main Still Picture': 'mainstillpicture'},
+}
+
+# 流复制定位的余量（秒）：不能按显示时间定位的容器（MKV 等）中视频有 B 帧时，
+# ffmpeg 把输入端 -ss 提前 3/23 秒，定位在关键帧上会退到上一个 GOP
+SEEK_MARGIN = 3 / 23
+
+# 预览：输出高度、检测用的代理高度、视频质量和音频码率
+PREVIEW_HEIGHT = 360
+PREVIEW_ANALYSIS_HEIGHT = 180
+PREVIEW_CRF = 30
+PREVIEW_AUDIO_BITRATE = '64k'
+
+# 边渲染边播放：HLS 分片时长（秒，按关键帧切分）和播放列表文件名
+STREAM_SEGMENT_SECONDS = 2
+STREAM_PLAYLIST = 'playlist.m3u8'
 
 class VideoEditor:
-    def __init__(self, input_path, output_path, target_duration=25):
+    def __init__(self, input_path, output_path, target_duration=25,
+                 proxy_height=None, frame_stride=1,
+                 use_scene_cache=True, scene_cache=None, input_hash=None,
+                 render_mode='single', extract_workers=None, detect_workers=1,
+                 detector_engine='scenedetect', selection_tolerance=0.5, metrics=None,
+                 cancel_token=None, timeout=None, media_info=None, audio_weight=0.0,
+                 preview=False, preview_height=PREVIEW_HEIGHT, preview_audio=True,
+                 scene_plan=None, stream_dir=None):
         self.input_path = input_path
         self.output_path = output_path
         self.target_duration = target_duration
         self.temp_dir = tempfile.mkdtemp()
         self.progress_callback = None
+        self.source_duration = None  # 原视频时长（秒），探测后填入
+        # 输入文件的容器和流信息（MediaInfo），只探测一次，各阶段共用；
+        # 调用方已经探测过（例如上传时的检查）可以直接传入
+        self.media = media_info
+        # 场景检测参数
+        self.detect_threshold = 27
+        self.min_scene_len = 15
+        # 代理分析：proxy_height 为代理视频高度（None 表示直接分析原视频），
+        # frame_stride 为抽帧间隔（每 N 帧分析一帧）
+        self.proxy_height = proxy_height
+        self.frame_stride = max(1, int(frame_stride))
+        # 分块并行检测的进程数（1 表示串行）；结果与串行检测完全一致
+        self.detect_workers = max(1, int(detect_workers))
+        # 检测引擎：'scenedetect'（PySceneDetect）、'numpy'（ffmpeg 原始帧管道 + NumPy 批量计算）
+        # 或 'hierarchical'（先只解码关键帧找出候选区间，再用 NumPy 引擎逐帧分析这些区间）
+        self.detector_engine = detector_engine
+        # 选择场景时允许的总时长误差（秒）：在此范围内优先使用完整场景，不截断镜头
+        self.selection_tolerance = selection_tolerance
+        # 选择中间场景时音频响度的权重（默认 0，只按时长选择；大于 0 时才解码音频）；
+        # 响度包络与场景检测并发计算，结果保存在 self.audio_envelope
+        self.audio_weight = audio_weight
+        self.audio_envelope = None
+        # 场景检测缓存：以输入内容哈希 + 检测参数为键，命中时跳过检测
+        self.use_scene_cache = use_scene_cache
+        self.scene_cache = scene_cache
+        self.input_hash = input_hash
+        # 渲染方式：'single' 一次 ffmpeg 调用完成剪辑；'segments' 逐段提取后再合并；
+        # 'smart' 帧级精确剪切：只重新编码切点到下一个关键帧之间的片段，其余部分直接复制
+        self.render_mode = render_mode
+        # 并发提取片段的最大 ffmpeg 进程数
+        self.extract_workers = extract_workers or min(8, os.cpu_count() or 1)
+        # 关键帧索引（首次使用时由一次 ffprobe 建立）
+        self._keyframe_index = None
+        # 已提取的片段 (start, end) -> 文件路径：只在一次 _render_variants 调用中由多个输出版本共用，
+        # 调用结束后清空，不会在之后的调用中返回已经删除或过时的临时文件
+        self._segment_files = None
+        # 多版本输出时每个版本的结果
+        self.variant_outputs = []
+        # plan() 生成的剪辑方案（EditPlan）
+        self.edit_plan = None
+        # 分阶段的耗时、CPU、读写字节数和内存峰值记录
+        self.metrics = metrics or JobMetrics()
+        # 取消标记与截止时间（秒）：取消后立即终止正在运行的 ffmpeg 和检测，并清理临时文件
+        self.cancel_token = cancel_token or CancelToken()
+        self.timeout = timeout
+        # 预览模式：用低分辨率代理快速检测，选中的场景输出为低分辨率、低码率的草稿；
+        # 每个版本选中的场景记录在 variant_outputs 的 'scenes' 中
+        self.preview = preview
+        self.preview_height = preview_height
+        self.preview_audio = preview_audio
+        if preview:
+            # 预览只需尽快给出场景方案：默认引擎换成只逐帧分析候选区间的分层检测
+            if self.detector_engine == 'scenedetect':
+                self.detector_engine = 'hierarchical'
+            if self.proxy_height is None:
+                self.proxy_height = PREVIEW_ANALYSIS_HEIGHT
+        # 已确认的场景方案（例如预览时选中的场景）：直接渲染，不再检测和选择
+        self.scene_plan = scene_plan
+        # 边渲染边播放：输出 MP4 的同时，在 stream_dir 中写入 fMP4 分片和持续更新的 HLS 播放列表，
+        # 播放器拿到第一个分片就能开始播放。只有单次渲染按时间顺序读取场景，流式输出固定使用它
+        self.stream_dir = stream_dir
+        if stream_dir and not preview and self.render_mode != 'single':
+            print(f"流式输出使用单次渲染（忽略 render_mode='{self.render_mode}'）")
+            self.render_mode = 'single'
 
     def _run_ffmpeg(self, command):
         """运行 ffmpeg 命令"""
         try:
-            result = subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            result = run_command(command, self.metrics, cancel_token=self.cancel_token)
             if result.returncode != 0:
                 print(f"FFmpeg 错误: {result.stderr}")
                 return False
@@ -32,15 +152,68 @@ class VideoEditor:
             print(f"运行 FFmpeg 失败: {str(e)}")
             return False
 
+    def _probe_media(self):
+        """输入文件的 MediaInfo（只探测一次），不能处理时抛出 UnsupportedMediaError"""
+        if self.media is None:
+            self.media = probe_media(
+                self.input_path, metrics=self.metrics, cancel_token=self.cancel_token
+            )
+        return self.media
+
+    def _get_keyframe_index(self):
+        """输入视频的关键帧索引，读取失败时返回 None"""
+        if self._keyframe_index is None:
+            try:
+                self._keyframe_index = self._probe_media().keyframe_index(
+                    metrics=self.metrics, cancel_token=self.cancel_token
+                )
+            except Exception as e:
+                print(f"建立关键帧索引失败: {str(e)}")
+                return None
+        return self._keyframe_index or None
+
+    def _plan_copy_cuts(self, scenes):
+        """把场景起点对齐到关键帧，使流复制剪切的实际位置与计划一致"""
+        index = self._relative_keyframes(self._probe_media())
+        if not index:
+            return scenes
+        planned = []
+        for start, end in scenes:
+            snapped = index.snap_start(start, end)
+            # 对齐后太短的场景直接丢弃（与检测阶段的 1 秒下限一致）
+            if end - snapped >= 1.0:
+                planned.append((snapped, end))
+        return planned
+
     def _extract_video_segment(self, start, duration, output_path):
-        """提取视频片段（保留音频）"""
+        """提取视频片段（保留音频）
+
+        start 以视频流第一帧为零点；输入端 -ss 以容器起点为零点，两者相差
+        video_start_time - start_time（例如 MKV 中视频流从 0.021 秒开始）。
+        """
+        media = self._probe_media()
+        end = start + duration
+        margin = 0.0
+        index = self._relative_keyframes(media)
+        if index:
+            keyframe = index.at_or_before(start + 0.0005)
+            if keyframe is not None:
+                start = keyframe
+                # 定位到关键帧之后一点，向前查找时正好落在这个关键帧上：流复制会保留
+                # 定位点之前的整个 GOP，不能退到上一个关键帧
+                margin = SEEK_MARGIN + 0.5 / media.fps
+                following = index.at_or_after(start + 0.0005)
+                if following is not None:
+                    margin = min(margin, (following - start) / 2)
+        seek = start + media.video_start_time - media.start_time + margin
         command = [
             'ffmpeg', '-y',
+            '-ss', f"{seek:.6f}",  # 输入端定位，不再解码片段之前的内容
             '-i', self.input_path,
-            '-ss', str(start),
-            '-t', str(duration),
+            '-t', f"{end - start - margin:.6f}",  # 输出时长从定位点起算，关键帧在它之前 margin 秒
             '-c:v', 'copy',  # 直接复制视频流，不重新编码
             '-c:a', 'copy',  # 直接复制音频流，不重新编码
+            '-avoid_negative_ts', 'make_zero',
             output_path
         ]
         return self._run_ffmpeg(command)
@@ -62,16 +235,460 @@ class VideoEditor:
         ]
         return self._run_ffmpeg(command)
 
+    def _create_analysis_proxy(self):
+        """生成只用于场景检测的低分辨率代理视频（可抽帧）"""
+        proxy_path = os.path.join(self.temp_dir, 'analysis_proxy.mp4')
+        filters = []
+        if self.frame_stride > 1:
+            # framestep 每 N 帧保留一帧，并把帧率同步降为 1/N，
+            # 因此代理视频的时间轴与原视频一致
+            filters.append(f'framestep={self.frame_stride}')
+        filters.append(f'scale=-2:{int(self.proxy_height)}')
+        command = [
+            'ffmpeg', '-y',
+            '-i', self.input_path,
+            '-map', '0:v:0',
+            '-an', '-sn', '-dn',
+            '-vf', ','.join(filters),
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            '-crf', '18',
+            proxy_path
+        ]
+        if self._run_ffmpeg(command):
+            return proxy_path
+        return None
+
+    def _run_content_detector(self, video_path, min_scene_len, frame_skip=0):
+        """在指定视频上运行内容检测器，返回 [(开始秒, 结束秒), ...]"""
+        if self.detect_workers > 1 and frame_skip == 0:
+            from parallel_detect import detect_content_parallel
+            scenes = detect_content_parallel(
+                video_path, self.detect_threshold, min_scene_len, self.detect_workers,
+                cancel_token=self.cancel_token
+            )
+        else:
+            if self.detect_workers > 1:
+                print("跳帧检测不支持分块并行，改为串行检测")
+            from scenedetect import open_video, SceneManager, ContentDetector
+            video = open_video(video_path)
+            scene_manager = SceneManager()
+            scene_manager.add_detector(
+                ContentDetector(threshold=self.detect_threshold, min_scene_len=min_scene_len)
+            )
+            self.cancel_token.check()
+            # 取消时 SceneManager.stop() 让检测循环在下一帧退出
+            with self.cancel_token.on_cancel(scene_manager.stop):
+                scene_manager.detect_scenes(video=video, frame_skip=frame_skip)
+            self.cancel_token.check()
+            scenes = scene_manager.get_scene_list()
+        return [(start.get_seconds(), end.get_seconds()) for start, end in scenes]
+
+    @staticmethod
+    def _concat_quote(path):
+        """转义 concat 清单中的文件路径"""
+        return "'" + path.replace("'", "'\\''") + "'"
+
+    def _stream_output_args(self, stream_dir):
+        """同一次 ffmpeg 调用的第二个输出：stream_dir 中的 fMP4 分片和 HLS 播放列表
+
+        EVENT 类型的播放列表在每个分片写完后更新（先写临时文件再改名），
+        全部写完后加上 EXT-X-ENDLIST。
+        """
+        os.makedirs(stream_dir, exist_ok=True)
+        return [
+            '-map', '0',
+            '-c', 'copy',
+            '-f', 'hls',
+            '-hls_time', str(STREAM_SEGMENT_SECONDS),
+            '-hls_playlist_type', 'event',
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', 'init.mp4',
+            '-hls_flags', 'temp_file',
+            '-hls_segment_filename', os.path.join(stream_dir, 'segment_%05d.m4s'),
+            os.path.join(stream_dir, STREAM_PLAYLIST)
+        ]
+
+    def _render_single_pass(self, scenes, output_path, stream_dir=None):
+        """用 concat 分离器的 inpoint/outpoint 在一次 ffmpeg 调用中完成剪辑
+
+        指定 stream_dir 时同时输出 HLS 分片，读取一次输入写出两个输出。
+        """
+        list_file = os.path.join(self.temp_dir, 'edit_list.txt')
+        source = self._concat_quote(os.path.abspath(self.input_path))
+        # inpoint/outpoint 是文件中的原始时间戳，场景时间以视频流第一帧为零点
+        shift = self._probe_media().video_start_time
+        with open(list_file, 'w') as f:
+            for start, end in scenes:
+                f.write(f"file {source}\n")
+                f.write(f"inpoint {start + shift:.6f}\n")
+                f.write(f"outpoint {end + shift:.6f}\n")
+
+        command = [
+            'ffmpeg', '-y',
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', list_file,
+            '-c', 'copy',  # 直接复制，不重新编码
+            output_path
+        ]
+        if stream_dir:
+            command += self._stream_output_args(stream_dir)
+        return self._run_ffmpeg(command)
+
+    def _extract_segments(self, scenes):
+        """并发提取多个场景片段，返回按场景顺序排列的片段文件列表
+
+        每个片段是独立的 ffmpeg 进程，由有界线程池并发执行；
+        任一片段失败时取消尚未开始的任务并返回 None。
+        在 _render_variants 中调用时，本次已经提取过的片段（例如其他输出版本选中的相同场景）直接复用。
+        """
+        if not scenes:
+            return None
+        extracted = self._segment_files if self._segment_files is not None else {}
+        segment_files = []
+        missing = []
+        for i, scene in enumerate(scenes):
+            path = extracted.get(scene)
+            if path is None:
+                index = len(extracted) + len(missing)
+                path = os.path.join(self.temp_dir, f"segment_{index}.mp4")
+                missing.append(i)
+            segment_files.append(path)
+        if len(missing) < len(scenes):
+            print(f"复用已提取的片段 {len(scenes) - len(missing)} 个")
+        if not missing:
+            return segment_files
+
+        workers = max(1, min(self.extract_workers, len(missing)))
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(self._extract_video_segment, scenes[i][0], scenes[i][1] - scenes[i][0],
+                            segment_files[i]): i
+                for i in missing
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                start, end = scenes[i]
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    print(f"提取场景出错: {str(e)}")
+                    ok = False
+                if not ok:
+                    failed.append(i)
+                    print(f"提取场景失败: {start:.1f}s - {end:.1f}s")
+                    for pending in futures:
+                        pending.cancel()
+                    continue
+                extracted[scenes[i]] = segment_files[i]
+                print(f"提取场景: {start:.1f}s - {end:.1f}s {'(开头)' if i < 2 else '(结尾)' if i >= len(scenes)-2 else '(中间)'}")
+                if self.progress_callback:
+                    # 提取阶段占 60% - 80% 的进度
+                    self.progress_callback(60 + 20 * done / len(missing))
+
+        if failed:
+            return None
+        return segment_files
+
+    def _render_segments(self, scenes, output_path):
+        """逐段提取选中的场景（带音频），再合并为输出文件"""
+        print("提取选中的场景...")
+        with self._stage('extract'):
+            video_segments = self._extract_segments(scenes)
+        if not video_segments:
+            print("错误：无法提取有效场景")
+            return False
+
+        # 合并视频片段
+        print("合并场景...")
+        if self.progress_callback:
+            self.progress_callback(80)  # 80% 进度
+
+        with self._stage('concat'):
+            concatenated = self._concat_videos(video_segments, output_path)
+        if not concatenated:
+            print("错误：合并视频片段失败")
+            return False
+        return True
+
+    def _smart_encoder_args(self, media):
+        """重新编码片段时的编码参数：与源视频相同的编码、像素格式、档次和级别
+
+        片段与直接复制的部分拼接在同一条视频流中，参数不一致时部分播放器无法连续解码。
+        源视频编码不在 SMART_ENCODERS 中时返回 None。
+        """
+        encoder = SMART_ENCODERS.get(media.video_codec)
+        if encoder is None:
+            return None
+        args = ['-c:v', encoder]
+        if media.pix_fmt:
+            args += ['-pix_fmt', media.pix_fmt]
+        profile = SMART_PROFILES.get(encoder, {}).get(media.profile)
+        if profile:
+            args += ['-profile:v', profile]
+        if encoder == 'libx264':
+            args += ['-preset', 'fast', '-crf', '18', '-x264-params', 'repeat-headers=1']
+            if media.level and media.level > 0:
+                args += ['-level:v', f"{media.level / 10:g}"]
+        elif encoder == 'libx265':
+            # 保留 B 帧：重新编码片段的重排深度与直接复制的片段一致，拼接处推算出的解码时间戳才不会倒退
+            args += ['-preset', 'fast', '-crf', '20', '-x265-params', 'log-level=error:repeat-headers=1']
+        else:
+            args += ['-q:v', '2']
+        return args
+
+    def _relative_keyframes(self, media):
+        """以视频流第一帧为零点的关键帧索引，读取失败时返回 None"""
+        index = self._get_keyframe_index()
+        if not index:
+            return None
+        return KeyframeIndex([t - media.video_start_time for t in index.times])
+
+    def _plan_smart_pieces(self, scenes, media, keyframes):
+        """把每个场景拆成 (起始帧, 结束帧, 是否重新编码) 片段，帧号从视频流第一帧算起
+
+        场景起点到其后第一个关键帧之间重新编码；从关键帧开始按解码顺序能完整复制的
+        最长前缀直接复制；剩下的结尾几帧（B 帧重排造成）再重新编码。
+        场景内没有关键帧时整段重新编码。
+        """
+        fps = media.fps
+        pieces = []
+        for start, end in scenes:
+            first = int(round(start * fps))
+            last = int(round(end * fps))
+            if last <= first:
+                continue
+            keyframe = keyframes.at_or_after((first - 0.5) / fps)
+            copied = 0
+            if keyframe is not None and keyframe < (last - 0.5) / fps:
+                key_frame = int(round(keyframe * fps))
+                packets = probe_packets(
+                    self.input_path, keyframe + media.video_start_time,
+                    end + media.video_start_time + 1.0,
+                    metrics=self.metrics, cancel_token=self.cancel_token
+                )
+                copied = closed_prefix(
+                    [(pts - media.video_start_time, key) for pts, key in packets],
+                    keyframe, fps, last - key_frame,
+                    skip_leading=media.video_codec in SMART_SKIP_LEADING
+                )
+            if not copied:
+                pieces.append((first, last, True))
+                continue
+            if key_frame > first:
+                pieces.append((first, key_frame, True))
+            pieces.append((key_frame, key_frame + copied, False))
+            if key_frame + copied < last:
+                pieces.append((key_frame + copied, last, True))
+        return pieces
+
+    def _render_smart_piece(self, first, last, encode, encoder_args, media, keyframes,
+                            output_path):
+        """输出一个视频片段（Matroska，不含音频）：重新编码，或从关键帧开始直接复制
+
+        两种片段都按帧数截取；码流转换为带参数集的格式（H.264/HEVC 为 Annex B），
+        每个片段自带 SPS/PPS，合并后重新编码的片段和复制的片段都能正确解码。
+        """
+        fps = media.fps
+        # 相对视频流第一帧的时间 → ffmpeg -ss 使用的相对容器起点的时间
+        shift = media.video_start_time - media.start_time
+        if encode:
+            # 从起始帧前半帧开始精确定位（解码后丢弃之前的帧）
+            position = max(0.0, (first - 0.5) / fps + shift)
+            # 片段第一帧的时间戳从 0 开始，拼接时与前后片段首尾相接
+            codec = ['-vf', 'setpts=PTS-STARTPTS'] + encoder_args
+            seek = ['-ss', f"{position:.6f}", '-i', self.input_path]
+        else:
+            # 流复制按解码时间戳丢弃定位点之前的数据包，并从第一个关键帧开始输出。
+            # MKV 只能定位到索引中的关键帧，不一定是这一个；定位到它与前一个关键帧的中点，
+            # 前一个关键帧被丢弃，而它自己的解码时间戳（比显示时间早几帧）仍在定位点之后
+            previous = keyframes.at_or_before((first - 0.5) / fps)
+            if previous is None:
+                # 第一个关键帧：从头复制，不定位
+                seek = ['-i', self.input_path]
+            else:
+                position = (previous + first / fps) / 2 + shift
+                seek = ['-ss', f"{position:.6f}", '-i', self.input_path, '-ss', '0']
+            codec = ['-c:v', 'copy']
+        bsf = SMART_BITSTREAM_FILTERS[media.video_codec]
+        if not encode and media.video_codec in SMART_SKIP_LEADING:
+            # 丢弃显示时间早于关键帧的前导帧：它们参考上一个 GOP，这部分画面已由前一片段编码
+            bsf += r',noise=drop=lt(pts\,startpts)'
+        command = [
+            'ffmpeg', '-y',
+            *seek,
+            '-map', '0:v:0',
+            '-an', '-sn', '-dn',
+            '-frames:v', str(last - first),
+            *codec,
+            '-bsf:v', bsf,
+            '-f', 'matroska',
+            output_path
+        ]
+        return self._run_ffmpeg(command)
+
+    def _render_smart_audio(self, scenes, media, output_path):
+        """按场景精确截取音频并合并（音频重新编码的开销很小）
+
+        场景边界取整到视频帧，与视频片段的帧数一致，保证音画同步。
+        """
+        shift = media.video_start_time - media.start_time
+        parts = []
+        for i, (start, end) in enumerate(scenes):
+            first = round(start * media.fps) / media.fps
+            last = round(end * media.fps) / media.fps
+            parts.append(
+                f"[0:a:0]atrim=start={first + shift:.6f}:end={last + shift:.6f},"
+                f"asetpts=PTS-STARTPTS[a{i}]"
+            )
+        labels = ''.join(f"[a{i}]" for i in range(len(scenes)))
+        parts.append(f"{labels}concat=n={len(scenes)}:v=0:a=1[a]")
+        script = os.path.join(self.temp_dir, 'smart_audio_filter.txt')
+        with open(script, 'w') as f:
+            f.write(';\n'.join(parts))
+        command = [
+            'ffmpeg', '-y',
+            '-i', self.input_path,
+            '-vn',
+            '-filter_complex_script', script,
+            '-map', '[a]',
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            output_path
+        ]
+        return self._run_ffmpeg(command)
+
+    def _render_smart(self, scenes, output_path):
+        """智能剪切：帧级精确，只有切点附近不完整的 GOP 重新编码，其余部分直接复制
+
+        各视频片段并发输出，音频按场景精确截取后单独编码，
+        最后一次 ffmpeg 调用把视频片段和音频合并为输出文件（不再编码）。
+        """
+        media = self._probe_media()
+        encoder_args = self._smart_encoder_args(media)
+        if encoder_args is None:
+            print(f"智能剪切不支持 {media.video_codec} 编码")
+            return False
+        keyframes = self._relative_keyframes(media)
+        if not keyframes:
+            return False
+        pieces = self._plan_smart_pieces(scenes, media, keyframes)
+        if not pieces:
+            return False
+        encoded = sum(last - first for first, last, encode in pieces if encode)
+        total = sum(last - first for first, last, _ in pieces)
+        print(f"智能剪切：{len(pieces)} 个片段，重新编码 {encoded} / {total} 帧")
+
+        piece_files = [
+            os.path.join(self.temp_dir, f"smart_{i}.mkv") for i in range(len(pieces))
+        ]
+        audio_path = None
+        if media.has_audio:
+            audio_path = os.path.join(self.temp_dir, 'smart_audio.m4a')
+        workers = max(1, min(self.extract_workers, len(pieces)))
+        # 多留一个线程给音频：音频编码与视频片段同时进行
+        with ThreadPoolExecutor(max_workers=workers + 1) as pool:
+            audio_future = None
+            if audio_path:
+                audio_future = pool.submit(self._render_smart_audio, scenes, media, audio_path)
+            futures = [
+                pool.submit(self._render_smart_piece, first, last, encode, encoder_args, media,
+                            keyframes, path)
+                for (first, last, encode), path in zip(pieces, piece_files)
+            ]
+            ok = True
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    ok = future.result() and ok
+                except Exception as e:
+                    print(f"输出片段出错: {str(e)}")
+                    ok = False
+                if not ok:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                if self.progress_callback:
+                    # 片段输出占 60% - 90% 的进度
+                    self.progress_callback(60 + 30 * done / len(pieces))
+            if audio_future is not None:
+                try:
+                    ok = audio_future.result() and ok
+                except Exception as e:
+                    print(f"输出音频出错: {str(e)}")
+                    ok = False
+        if not ok:
+            return False
+
+        list_file = os.path.join(self.temp_dir, 'smart_list.txt')
+        with open(list_file, 'w') as f:
+            for (first, last, _), path in zip(pieces, piece_files):
+                # 按帧数写明时长，不依赖容器估算的时长（B 帧延迟会使其多出一帧）
+                f.write(f"file {self._concat_quote(path)}\n")
+                f.write(f"duration {(last - first) / media.fps:.6f}\n")
+        command = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_file]
+        if audio_path:
+            command += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0']
+        command += ['-c', 'copy', '-movflags', '+faststart', output_path]
+        return self._run_ffmpeg(command)
+
     def _detect_scenes(self):
         """使用 PySceneDetect 检测场景"""
         try:
-            # 使用内容检测器，降低阈值以获得更自然的场景分割
-            scenes = detect(self.input_path, ContentDetector(threshold=27, min_scene_len=15))
-            # 转换为时间戳列表
+            # 使用内容检测器，降低阈值以获得更自然的场景分割。
+            # 各引擎在自己的分支中导入，不为用不到的引擎导入 NumPy 或 OpenCV / PySceneDetect
+            if self.detector_engine == 'numpy':
+                # NumPy 引擎：ffmpeg 直接输出缩小后的原始帧，不需要代理文件
+                from numpy_detector import detect_scenes_numpy
+                media = self._probe_media()
+                scenes = detect_scenes_numpy(
+                    self.input_path, self.detect_threshold, self.min_scene_len,
+                    frame_stride=self.frame_stride, proxy_height=self.proxy_height,
+                    metrics=self.metrics, cancel_token=self.cancel_token,
+                    stream_info=(media.width, media.height, media.fps)
+                )
+            elif self.detector_engine == 'hierarchical':
+                # 分层检测：耗时与切点数量成正比，适合数小时的长视频；失败时改为全片扫描
+                media = self._probe_media()
+                from hierarchical_detect import detect_scenes_hierarchical
+                try:
+                    scenes = detect_scenes_hierarchical(
+                        self.input_path, self.detect_threshold, self.min_scene_len,
+                        proxy_height=self.proxy_height, media=media,
+                        metrics=self.metrics, cancel_token=self.cancel_token
+                    )
+                except RuntimeError as e:
+                    print(f"分层检测失败，改为全片扫描: {str(e)}")
+                    from numpy_detector import detect_scenes_numpy
+                    scenes = detect_scenes_numpy(
+                        self.input_path, self.detect_threshold, self.min_scene_len,
+                        proxy_height=self.proxy_height,
+                        metrics=self.metrics, cancel_token=self.cancel_token,
+                        stream_info=(media.width, media.height, media.fps)
+                    )
+            elif self.proxy_height:
+                # 代理模式：在低分辨率（可抽帧）代理视频上检测。
+                # 代理帧率为原视频的 1/frame_stride，最短场景长度按同样比例换算；
+                # 检测结果的秒数直接对应原视频时间轴
+                proxy_path = self._create_analysis_proxy()
+                if not proxy_path:
+                    print("代理视频生成失败，改为直接分析原视频")
+                    scenes = self._run_content_detector(self.input_path, self.min_scene_len)
+                else:
+                    min_scene_len = max(1, self.min_scene_len // self.frame_stride)
+                    scenes = self._run_content_detector(proxy_path, min_scene_len)
+                    os.remove(proxy_path)
+            else:
+                # 原视频模式：frame_stride > 1 时由 PySceneDetect 跳帧
+                scenes = self._run_content_detector(
+                    self.input_path, self.min_scene_len, frame_skip=self.frame_stride - 1
+                )
+            # 转换为时间戳列表（取整到毫秒，消除代理帧率换算带来的浮点误差）
             scene_list = []
-            for scene in scenes:
-                start_time = float(scene[0].get_seconds())
-                end_time = float(scene[1].get_seconds())
+            for start, end in scenes:
+                start_time = round(float(start), 3)
+                end_time = round(float(end), 3)
                 duration = end_time - start_time
                 # 过滤掉太短的场景（小于1秒）
                 if duration >= 1.0:
@@ -81,8 +698,118 @@ class VideoEditor:
             print(f"场景检测失败: {str(e)}")
             return None
 
-    def _select_scenes(self, scenes, total_duration):
-        """智能选择场景，保留开头和结尾"""
+    def _scene_detection_params(self):
+        """影响检测结果的全部参数，作为缓存键的一部分"""
+        return {
+            'detector': 'content',
+            'engine': self.detector_engine,
+            'threshold': self.detect_threshold,
+            'min_scene_len': self.min_scene_len,
+            'proxy_height': self.proxy_height,
+            'frame_stride': self.frame_stride,
+            'min_duration': 1.0,
+        }
+
+    def _get_input_hash(self):
+        """输入文件的内容哈希（只计算一次）"""
+        if not self.input_hash:
+            self.input_hash = hash_file(self.input_path)
+        return self.input_hash
+
+    def _scene_cache_key(self):
+        if not self.use_scene_cache:
+            return None
+        try:
+            if self.scene_cache is None:
+                self.scene_cache = SceneCache()
+            return self.scene_cache.make_key(self._get_input_hash(), self._scene_detection_params())
+        except Exception as e:
+            print(f"场景缓存不可用: {str(e)}")
+            return None
+
+    def _analyze_cached(self, executor):
+        """先查场景缓存，未命中的部分再分析并写回缓存，返回场景列表
+
+        缓存条目中保存场景和音频响度包络；命中时不再检测，包络也已缓存时不再解码音频。
+        需要分析时音频在后台线程中与场景检测同时进行，包络保存在 self.audio_envelope。
+        """
+        cache_key = self._scene_cache_key()
+        entry = self.scene_cache.get_entry(cache_key) if cache_key else None
+        scenes = entry['scenes'] if entry else None
+        cached_audio = entry.get('audio') if entry else None
+        envelope = self._cached_envelope(cached_audio)
+        audio_future = None if envelope is not None else self._start_audio_analysis(executor)
+
+        with self._stage('detect'):
+            if scenes:
+                print(f"命中场景缓存，共 {len(scenes)} 个场景")
+            else:
+                scenes = self._detect_scenes()
+        if audio_future is not None:
+            envelope = self._finish_audio_analysis(audio_future)
+        self.audio_envelope = envelope
+
+        # 新检测的场景，或缓存中还没有的包络，写回缓存
+        new_audio = audio_future is not None and envelope is not None
+        if scenes and cache_key and (entry is None or new_audio):
+            try:
+                self.scene_cache.put(cache_key, scenes,
+                                     audio=envelope.to_dict() if new_audio else cached_audio)
+            except Exception as e:
+                print(f"写入场景缓存失败: {str(e)}")
+        return scenes
+
+    def _cached_envelope(self, cached_audio):
+        """从缓存条目恢复响度包络；不需要音频或缓存中没有时返回 None"""
+        if not cached_audio or not self.audio_weight:
+            return None
+        from audio_energy import AudioEnvelope
+        try:
+            envelope = AudioEnvelope.from_dict(cached_audio)
+        except (KeyError, TypeError, ValueError):
+            return None
+        print("命中音频响度缓存")
+        return envelope
+
+    def _start_audio_analysis(self, executor):
+        """在后台线程中计算音频响度包络，与场景检测同时进行；不需要时返回 None"""
+        if not self.audio_weight or not self._probe_media().has_audio:
+            return None
+
+        def analyze():
+            from audio_energy import audio_envelope
+            with self.metrics.stage('audio'):
+                return audio_envelope(
+                    self.input_path, metrics=self.metrics, cancel_token=self.cancel_token
+                )
+        return executor.submit(analyze)
+
+    def _finish_audio_analysis(self, future):
+        """等待音频分析结束；失败时返回 None，选择场景时只按时长"""
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"音频分析失败，只按时长选择场景: {str(e)}")
+            return None
+
+    def _scene_values(self, scenes):
+        """选择场景时每个候选场景的价值，None 表示只按时长选择
+
+        默认每个场景价值为 -1（场景越少、越长越好）；有音频包络时加上
+        audio_weight × 相对响度 × 时长，总时长相同时优先选择响亮、有人声的片段。
+        """
+        if self.audio_envelope is None or not scenes:
+            return None
+        import numpy as np
+        energy = self.audio_envelope.scene_energy([(start, end) for _, start, end in scenes])
+        durations = np.array([duration for duration, _, _ in scenes])
+        return self.audio_weight * energy * durations - 1.0
+
+    def _select_scenes(self, scenes, total_duration, target_duration=None):
+        """智能选择场景，保留开头和结尾；target_duration 默认为 self.target_duration"""
+        target_duration = target_duration or self.target_duration
         if not scenes or len(scenes) < 4:  # 至少需要4个场景
             return scenes
 
@@ -101,7 +828,7 @@ class VideoEditor:
         middle_scenes = scene_durations[2:-2]
         
         # 计算中间部分需要的时长
-        target_middle_duration = self.target_duration - (start_duration + end_duration)
+        target_middle_duration = target_duration - (start_duration + end_duration)
         
         if target_middle_duration <= 0:
             # 如果开头和结尾已经超过目标时长，只保留它们的一部分
@@ -111,126 +838,255 @@ class VideoEditor:
             final_scenes = []
             for start, end in selected_scenes:
                 duration = end - start
-                if total_time + duration > self.target_duration:
+                if total_time + duration > target_duration:
                     # 如果加上这个场景会超时，就截断它
-                    end = start + (self.target_duration - total_time)
+                    end = start + (target_duration - total_time)
                     final_scenes.append((start, end))
                     break
                 final_scenes.append((start, end))
                 total_time += duration
             return final_scenes
         
-        # 随机选择中间场景，但优先选择较长的场景
-        selected_middle_scenes = []
-        current_duration = 0
-        
-        # 按时长排序中间场景，优先选择较长的场景
-        available_scenes = sorted(middle_scenes, key=lambda x: x[0], reverse=True)
-        while available_scenes and current_duration < target_middle_duration:
-            duration, start, end = available_scenes.pop(0)
-            
-            if current_duration + duration <= target_middle_duration:
-                selected_middle_scenes.append((start, end))
-                current_duration += duration
-            elif current_duration < target_middle_duration:
-                # 如果这个场景太长，截取需要的部分
-                needed_duration = target_middle_duration - current_duration
-                selected_middle_scenes.append((start, start + needed_duration))
-                current_duration = target_middle_duration
+        # 用背包动态规划选择中间场景：尽量用完整场景凑满目标时长，优先选择较长的场景
+        from scene_selector import select_scenes_optimal
+        selected_middle_scenes = select_scenes_optimal(
+            [(start, end) for _, start, end in middle_scenes],
+            target_middle_duration,
+            values=self._scene_values(middle_scenes),
+            tolerance=self.selection_tolerance
+        )
         
         # 按时间顺序合并所有选中的场景
         selected_scenes = (
             [(start, end) for _, start, end in start_scenes] +  # 开头场景
-            sorted(selected_middle_scenes) +                    # 中间场景（保持时间顺序）
+            selected_middle_scenes +                            # 中间场景（保持时间顺序）
             [(start, end) for _, start, end in end_scenes]     # 结尾场景
         )
         
         return selected_scenes
 
-    def process_video(self, progress_callback=None):
-        """处理视频的主要方法"""
+    def process_video(self, progress_callback=None, variants=None):
+        """处理视频的主要方法
+
+        variants 为多个输出版本时只探测和检测一次，按每个目标时长分别选择场景并渲染，
+        结果记录在 self.variant_outputs 中；全部版本都成功时返回 True。
+        每个版本可以是目标秒数，或 {'target_duration': 秒数, 'output_path': ..., 'name': ...}。
+        """
+        return self._run_job(lambda: self._run_pipeline(variants), progress_callback)
+
+    def plan(self, progress_callback=None, variants=None):
+        """只做分析（探测、检测和选择），返回可保存为 JSON 的 EditPlan；失败时返回 None
+
+        方案记录输入文件的身份、流信息、每个版本选中的场景和渲染参数，
+        之后用 render(plan) 输出，不再分析。
+        """
+        self.edit_plan = None
+        ok = self._run_job(lambda: self._run_planning(variants), progress_callback)
+        return self.edit_plan if ok else None
+
+    def render(self, plan, progress_callback=None, verify_source=True, **render_settings):
+        """按剪辑方案渲染，不再检测和选择场景；全部版本都成功时返回 True
+
+        render_settings 覆盖方案中的渲染参数（render_mode、preview 等），
+        可以换渲染方式重新输出。verify_source 为真时比较输入文件的内容哈希。
+        只有一个版本的方案输出到 self.output_path，多个版本按 process_video 的规则命名。
+        """
+        return self._run_job(lambda: self._run_render(plan, verify_source, render_settings),
+                             progress_callback)
+
+    def _run_job(self, job, progress_callback):
+        """执行 job 并统计资源占用：取消或超时后清理输出，结束后写入任务指标"""
         self.progress_callback = progress_callback
         try:
-            if self.progress_callback:
-                self.progress_callback(0)  # 开始处理
-                
-            print(f"正在加载视频: {self.input_path}")
-            
-            # 获取视频信息
-            probe_command = [
-                'ffprobe',
-                '-v', 'error',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=duration',
-                '-of', 'json',
-                self.input_path
-            ]
-            
-            result = subprocess.run(probe_command, capture_output=True, text=True)
-            video_info = json.loads(result.stdout)
-            total_duration = float(video_info['streams'][0]['duration'])
-            
-            print(f"视频总时长: {total_duration}秒")
-
-            if total_duration < self.target_duration:
-                print("错误：视频时长不足25秒")
-                return False
+            with self.cancel_token.deadline(self.timeout):
+                ok = job()
+        except JobCancelled as e:
+            print(f"处理已中止: {e}")
+            self._discard_outputs()
+            ok = False
+        self.metrics.finish(ok)
+        print("各阶段资源占用:\n" + self.metrics.summary())
+        try:
+            append_record(self.metrics.to_dict())
+        except OSError as e:
+            print(f"写入任务指标失败: {str(e)}")
+        return ok
 
-            # 检测场景
-            print("检测场景变化...")
-            if self.progress_callback:
-                self.progress_callback(20)  # 20% 进度
-            
-            scenes = self._detect_scenes()
-            if not scenes:
-                print("场景检测失败，使用备用方案...")
-                return False
+    def cancel(self, reason='任务已取消'):
+        """取消处理（可从其他线程调用）"""
+        self.cancel_token.cancel(reason)
 
-            # 选择场景
-            print("选择场景...")
-            if self.progress_callback:
-                self.progress_callback(40)  # 40% 进度
-                
-            selected_scenes = self._select_scenes(scenes, total_duration)
-            total_selected_duration = sum(end - start for start, end in selected_scenes)
-            print(f"选中场景总时长: {total_selected_duration:.1f}秒")
+    def _discard_outputs(self):
+        """中止后删除临时目录和未写完的输出文件"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        paths = {self.output_path} | {variant['output_path'] for variant in self.variant_outputs}
+        for variant in self.variant_outputs:
+            if variant.get('stream_dir'):
+                shutil.rmtree(variant['stream_dir'], ignore_errors=True)
+        for path in paths:
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"删除未完成的输出文件失败: {str(e)}")
 
-            # 提取选中的场景（带音频）
-            print("提取选中的场景...")
-            if self.progress_callback:
-                self.progress_callback(60)  # 60% 进度
-            video_segments = []
-            for i, (start, end) in enumerate(selected_scenes):
-                segment_file = os.path.join(self.temp_dir, f"segment_{i}.mp4")
-                if self._extract_video_segment(start, end - start, segment_file):
-                    video_segments.append(segment_file)
-                    print(f"提取场景: {start:.1f}s - {end:.1f}s {'(开头)' if i < 2 else '(结尾)' if i >= len(selected_scenes)-2 else '(中间)'}")
-
-            if not video_segments:
-                print("错误：无法提取有效场景")
-                return False
+    def _resolve_variants(self, variants):
+        """把输出版本规范化为 [{'name', 'target_duration', 'output_path'}, ...]
 
-            # 合并视频片段
-            print("合并场景...")
-            if self.progress_callback:
-                self.progress_callback(80)  # 80% 进度
+        未指定版本时只输出 self.output_path 一个版本；多个版本未指定输出路径时
+        在 self.output_path 的文件名后加上目标时长，例如 edited_a_15s.mp4。
+        """
+        # 确保输出路径有 .mp4 扩展名
+        if not self.output_path.lower().endswith('.mp4'):
+            self.output_path = f"{self.output_path}.mp4"
+        if not variants:
+            return [{
+                'name': f"{self.target_duration:g}s",
+                'target_duration': self.target_duration,
+                'output_path': self.output_path,
+                'scenes': self._plan_scenes(self.scene_plan),
+                'stream_dir': self._variant_stream_dir(),
+            }]
 
-            # 确保输出路径有 .mp4 扩展名
-            if not self.output_path.lower().endswith('.mp4'):
-                self.output_path = f"{self.output_path}.mp4"
+        base, ext = os.path.splitext(self.output_path)
+        resolved = []
+        for variant in variants:
+            if not isinstance(variant, dict):
+                variant = {'target_duration': variant}
+            target = float(variant['target_duration'])
+            name = variant.get('name') or f"{target:g}s"
+            output_path = variant.get('output_path') or f"{base}_{name}{ext}"
+            if not output_path.lower().endswith('.mp4'):
+                output_path = f"{output_path}.mp4"
+            resolved.append({'name': name, 'target_duration': target, 'output_path': output_path,
+                             'scenes': self._plan_scenes(variant.get('scenes')),
+                             'stream_dir': self._variant_stream_dir(name, len(variants) > 1)})
+        return resolved
 
-            if not self._concat_videos(video_segments, self.output_path):
-                print("错误：合并视频片段失败")
-                return False
+    def _variant_stream_dir(self, name=None, multiple=False):
+        """一个版本的流式输出目录：只有一个版本时就是 stream_dir，多个版本时按版本名分子目录"""
+        if not self.stream_dir or self.preview:
+            return None
+        return os.path.join(self.stream_dir, name) if multiple else self.stream_dir
 
-            # 清理临时文件
-            print("清理资源...")
-            shutil.rmtree(self.temp_dir)
-            
-            print(f"处理完成，输出文件：{self.output_path}")
-            if self.progress_callback:
-                self.progress_callback(100)  # 完成
-            return True
+    @staticmethod
+    def _plan_scenes(scenes):
+        """场景方案规范化为 [(开始秒, 结束秒), ...]（JSON 中读出的是列表）；没有时返回 None"""
+        if not scenes:
+            return None
+        return [(float(start), float(end)) for start, end in scenes]
+
+    def _render_preview(self, scenes, output_path):
+        """把选中的场景输出为低分辨率、低码率的预览草稿（一次 ffmpeg 调用）
+
+        每个场景单独在输入端定位，只解码选中的部分；缩小后用最快的预设编码。
+        """
+        media = self._probe_media()
+        with_audio = self.preview_audio and media.has_audio
+        command = ['ffmpeg', '-y']
+        for start, end in scenes:
+            # 草稿画质：解码时跳过环路滤波
+            command += ['-skip_loop_filter', 'all',
+                        '-ss', f"{start:.6f}", '-t', f"{end - start:.6f}", '-i', self.input_path]
+        parts = []
+        labels = ''
+        for i in range(len(scenes)):
+            parts.append(f"[{i}:v:0]scale=-2:{self.preview_height}:flags=fast_bilinear,setsar=1,"
+                         f"setpts=PTS-STARTPTS[v{i}]")
+            labels += f"[v{i}]"
+            if with_audio:
+                parts.append(f"[{i}:a:0]asetpts=PTS-STARTPTS[a{i}]")
+                labels += f"[a{i}]"
+        outputs = '[v][a]' if with_audio else '[v]'
+        parts.append(f"{labels}concat=n={len(scenes)}:v=1:a={int(with_audio)}{outputs}")
+        script = os.path.join(self.temp_dir, 'preview_filter.txt')
+        with open(script, 'w') as f:
+            f.write(';\n'.join(parts))
+        command += [
+            '-filter_complex_script', script,
+            '-map', '[v]',
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            '-crf', str(PREVIEW_CRF),
+            '-pix_fmt', 'yuv420p',
+        ]
+        if with_audio:
+            command += ['-map', '[a]', '-c:a', 'aac', '-ac', '1', '-b:a', PREVIEW_AUDIO_BITRATE]
+        command += ['-movflags', '+faststart', output_path]
+        return self._run_ffmpeg(command)
+
+    def _render_variant(self, selected_scenes, output_path, stream_dir=None):
+        """渲染一个输出版本：默认单次渲染，失败或 segments 模式时逐段提取再合并"""
+        rendered = False
+        if self.preview:
+            print("输出预览草稿...")
+            with self._stage('render'):
+                return self._render_preview(selected_scenes, output_path)
+        if self.render_mode == 'smart':
+            print("智能剪切选中的场景...")
+            with self._stage('render'):
+                rendered = self._render_smart(selected_scenes, output_path)
+            if not rendered:
+                print("智能剪切失败，改用逐段提取再合并的方式")
+        elif self.render_mode == 'single':
+            # 一次 ffmpeg 调用完成全部剪辑，不生成中间片段文件
+            print("单次渲染选中的场景...")
+            with self._stage('render'):
+                rendered = self._render_single_pass(selected_scenes, output_path, stream_dir)
+            if not rendered:
+                print("单次渲染失败，改用逐段提取再合并的方式")
+                if stream_dir:
+                    # 不完整的播放列表不再更新，删除后播放器改为等待完整的输出文件
+                    shutil.rmtree(stream_dir, ignore_errors=True)
+        if not rendered:
+            rendered = self._render_segments(selected_scenes, output_path)
+        return rendered
+
+    def _analyze_scenes(self):
+        """检测场景（与音频分析并发）并按渲染方式规划剪切点，失败时返回 None"""
+        print("检测场景变化...")
+        if self.progress_callback:
+            self.progress_callback(20)  # 20% 进度
+
+        # 音频响度分析在后台线程中与场景检测同时进行，不增加总耗时
+        audio_executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            scenes = self._analyze_cached(audio_executor)
+        finally:
+            audio_executor.shutdown(wait=False)
+        if not scenes:
+            return None
+        # 流复制只能从关键帧开始，按关键帧位置规划剪切点；
+        # 智能剪切会重新编码关键帧之前的部分，保留检测到的精确切点。
+        # 预览也按最终的渲染方式规划，确认后直接复用同一组场景
+        with self._stage('keyframes'):
+            if self.render_mode == 'smart':
+                self._get_keyframe_index()
+            else:
+                scenes = self._plan_copy_cuts(scenes)
+        return scenes
+
+    def _stage(self, name):
+        """进入下一个阶段前检查是否已取消，并统计该阶段的资源占用"""
+        self.cancel_token.check()
+        return self.metrics.stage(name)
+
+    def _run_pipeline(self, variants=None):
+        """依次执行探测、检测、选择和渲染，每个阶段单独统计资源占用
+
+        探测和检测只做一次，选择和渲染按输出版本分别进行。
+        """
+        try:
+            variants = self._resolve_variants(variants)
+            plans = self._select_variants(variants)
+            if not plans:
+                return False
+            # segments 模式下各版本共用本次提取的片段，渲染结束后清空，之后的调用重新提取
+            self._segment_files = {}
+            try:
+                return self._render_variants(variants, plans)
+            finally:
+                self._segment_files = None
 
         except Exception as e:
             print(f"处理失败: {str(e)}")
@@ -238,6 +1094,163 @@ class VideoEditor:
                 shutil.rmtree(self.temp_dir)
             return False
 
+    def _run_planning(self, variants=None):
+        """只执行探测、检测和选择，结果保存在 self.edit_plan"""
+        try:
+            variants = self._resolve_variants(variants)
+            plans = self._select_variants(variants)
+            if not plans:
+                return False
+            self.edit_plan = EditPlan.from_editor(self, plans)
+            print(f"剪辑方案：{len(plans)} 个版本，共 "
+                  f"{sum(len(scenes) for _, scenes in plans)} 个场景")
+            if self.progress_callback:
+                self.progress_callback(100)
+            return True
+        except Exception as e:
+            print(f"分析失败: {str(e)}")
+            return False
+        finally:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _run_render(self, plan, verify_source, render_settings):
+        """按剪辑方案渲染：用方案中的流信息代替探测，用选中的场景代替检测和选择"""
+        try:
+            plan.check_source(self.input_path,
+                              self._get_input_hash() if verify_source else None)
+        except (OSError, EditPlanError) as e:
+            print(f"无法按方案渲染: {str(e)}")
+            return False
+        settings = dict(plan.render, **render_settings)
+        for name in RENDER_SETTINGS:
+            if name in settings:
+                setattr(self, name, settings[name])
+        if self.stream_dir and not self.preview and self.render_mode != 'single':
+            print(f"流式输出使用单次渲染（忽略 render_mode='{self.render_mode}'）")
+            self.render_mode = 'single'
+        try:
+            self.media = plan.media_info(self.input_path)
+        except (UnsupportedMediaError, OSError) as e:
+            print(f"处理失败: {str(e)}")
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            return False
+        # 同一个编辑器先 plan() 再 render() 时临时目录已在分析结束后删除
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+        variants = [dict(variant) for variant in plan.variants]
+        # 智能剪切方案保留精确切点；改用流复制渲染时先对齐到关键帧
+        if plan.render.get('render_mode') == 'smart' and self.render_mode != 'smart' \
+                and not self.preview:
+            with self._stage('keyframes'):
+                for variant in variants:
+                    variant['scenes'] = self._plan_copy_cuts(self._plan_scenes(variant['scenes']))
+        if len(variants) == 1:
+            self.target_duration = variants[0]['target_duration']
+            self.scene_plan = variants[0]['scenes']
+            variants = None
+        return self._run_pipeline(variants)
+
+    def _select_variants(self, variants):
+        """探测、检测，并为每个可以生成的版本选择场景，返回 [(版本, 选中的场景), ...]
+
+        无法生成的版本记录在 self.variant_outputs 中；全部失败时返回 None。
+        """
+        self.variant_outputs = []
+        if self.progress_callback:
+            self.progress_callback(0)  # 开始处理
+
+        print(f"正在加载视频: {self.input_path}")
+
+        # 获取视频信息：一次 ffprobe 读取容器和全部流，在任何解码之前拒绝无法处理的输入
+        with self._stage('probe'):
+            try:
+                media = self._probe_media()
+            except UnsupportedMediaError as e:
+                print(f"不支持的输入文件: {str(e)}")
+                return None
+        total_duration = media.duration
+        self.source_duration = total_duration
+
+        print(f"视频总时长: {total_duration}秒 "
+              f"({media.video_codec} {media.width}x{media.height} @ {media.fps:.3f}fps)")
+
+        # 原视频比目标时长还短的版本无法生成
+        feasible = [v for v in variants if v['target_duration'] <= total_duration]
+        for variant in variants:
+            if variant not in feasible:
+                print(f"错误：视频时长不足{variant['target_duration']:g}秒")
+                self.variant_outputs.append(dict(
+                    variant, ok=False, selected_duration=0.0, error='视频时长不足'
+                ))
+        if not feasible:
+            return None
+
+        # 全部版本都有已确认的场景方案时，跳过检测和选择，直接渲染
+        planned = all(variant['scenes'] for variant in feasible)
+        if planned:
+            print("使用已确认的场景方案，跳过场景检测")
+        else:
+            scenes = self._analyze_scenes()
+            if not scenes:
+                print("场景检测失败，使用备用方案...")
+                return None
+
+        # 选择场景
+        print("选择场景...")
+        if self.progress_callback:
+            self.progress_callback(40)  # 40% 进度
+
+        plans = []
+        with self._stage('select'):
+            for variant in feasible:
+                selected_scenes = variant['scenes'] or self._select_scenes(
+                    scenes, total_duration, variant['target_duration']
+                )
+                plans.append((variant, selected_scenes))
+        for variant, selected_scenes in plans:
+            total_selected_duration = sum(end - start for start, end in selected_scenes)
+            print(f"[{variant['name']}] 选中场景总时长: {total_selected_duration:.1f}秒")
+
+        if self.progress_callback:
+            self.progress_callback(60)  # 60% 进度
+        return plans
+
+    def _render_variants(self, variants, plans):
+        """按 [(版本, 选中的场景), ...] 渲染各版本，结果记录在 self.variant_outputs 中"""
+        if self.render_mode == 'segments' and len(plans) > 1:
+            # 先一次性并发提取所有版本用到的场景（去重），各版本合并时直接复用
+            union = sorted({scene for _, selected_scenes in plans for scene in selected_scenes})
+            print(f"提取 {len(plans)} 个版本共用的 {len(union)} 个场景...")
+            with self._stage('extract'):
+                self._extract_segments(union)
+
+        all_ok = True
+        for variant, selected_scenes in plans:
+            ok = self._render_variant(selected_scenes, variant['output_path'],
+                                      variant['stream_dir'])
+            self.variant_outputs.append(dict(
+                variant, ok=ok, scenes=selected_scenes,
+                selected_duration=sum(end - start for start, end in selected_scenes)
+            ))
+            if ok:
+                print(f"[{variant['name']}] 输出文件：{variant['output_path']}")
+            all_ok = all_ok and ok
+        # 按请求的顺序排列各版本的结果
+        order = [variant['name'] for variant in variants]
+        self.variant_outputs.sort(key=lambda variant: order.index(variant['name']))
+        if not all_ok:
+            return False
+
+        # 清理临时文件
+        print("清理资源...")
+        shutil.rmtree(self.temp_dir)
+
+        outputs = [v['output_path'] for v in self.variant_outputs if v['ok']]
+        print(f"处理完成，输出文件：{', '.join(outputs)}")
+        if self.progress_callback:
+            self.progress_callback(100)  # 完成
+        return True
+
     def create_final_video(self):
         """为了保持兼容性的包装方法"""
         return self.process_video()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import threading
+import socketserver
+
+# 常驻剪辑进程：启动时导入全部重量级依赖，命令行和快捷操作通过本地 Unix socket 提交任务，
+# 每次调用不再重复导入 NumPy / OpenCV / PySceneDetect
+SOCKET_PATH = os.getenv(
+    'VIDEO_EDITOR_WORKER_SOCKET',
+    os.path.join(os.path.expanduser('~/.cache/video_editor'), 'worker.sock')
+)
+# 同时处理的任务数，超出的请求排队等待
+MAX_JOBS = int(os.getenv('VIDEO_EDITOR_WORKER_JOBS', 2))
+# 连接常驻进程的超时（秒）：没有常驻进程时应立即退回本进程处理
+CONNECT_TIMEOUT = 0.5
+
+
+def _connect(socket_path=SOCKET_PATH):
+    """连接常驻进程，没有运行时返回 None"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def _send(stream, message):
+    stream.write((json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+    stream.flush()
+
+
+def submit_job(input_path, output_path, target_duration=25, targets=None,
+               progress_callback=None, socket_path=SOCKET_PATH):
+    """把剪辑任务交给常驻进程并等待结果
+
+    返回 {'ok', 'output_path', 'variants', 'error'}；没有常驻进程时返回 None，
+    由调用方在本进程内处理。中途断开连接时常驻进程会取消任务。
+    """
+    sock = _connect(socket_path)
+    if sock is None:
+        return None
+    with sock, sock.makefile('rwb') as stream:
+        _send(stream, {
+            'op': 'edit',
+            # 常驻进程的工作目录与调用方不同，只传绝对路径
+            'input_path': os.path.abspath(input_path),
+            'output_path': os.path.abspath(output_path),
+            'target_duration': target_duration,
+            'targets': targets,
+        })
+        for line in stream:
+            message = json.loads(line)
+            if 'progress' in message:
+                if progress_callback:
+                    progress_callback(message['progress'])
+                continue
+            return message
+    return {'ok': False, 'error': '常驻进程意外断开连接'}
+
+
+def worker_status(socket_path=SOCKET_PATH):
+    """查询常驻进程状态，没有运行时返回 None"""
+    sock = _connect(socket_path)
+    if sock is None:
+        return None
+    with sock, sock.makefile('rwb') as stream:
+        _send(stream, {'op': 'ping'})
+        line = stream.readline()
+    return json.loads(line) if line else None
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """每个连接一个请求：ping 返回状态；edit 执行剪辑并逐行返回进度和结果"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except ValueError:
+            _send(self.wfile, {'ok': False, 'error': '无效的请求'})
+            return
+        if request.get('op') == 'ping':
+            _send(self.wfile, {
+                'ok': True,
+                'pid': os.getpid(),
+                'running_jobs': self.server.running_jobs,
+                'uptime': time.time() - self.server.started_at,
+                'preload_seconds': self.server.preload_seconds,
+            })
+        elif request.get('op') == 'edit':
+            self.run_edit(request)
+        else:
+            _send(self.wfile, {'ok': False, 'error': f"未知操作: {request.get('op')}"})
+
+    def _watch_disconnect(self, editor, finished):
+        """后台线程：调用方关闭连接（读到 EOF）时立即取消任务
+
+        调用方发出请求后不再发送数据，recv 一直阻塞到连接关闭；
+        任务结束后由 run_edit 关闭读方向唤醒本线程。
+        """
+        try:
+            while self.connection.recv(4096):
+                pass
+        except OSError:
+            pass
+        if not finished.is_set():
+            # 调用方已断开（例如按了 Ctrl+C），不再需要结果
+            editor.cancel('调用方已断开连接')
+
+    def run_edit(self, request):
+        from video_editor import VideoEditor
+
+        editor = VideoEditor(request['input_path'], request['output_path'],
+                             target_duration=request.get('target_duration') or 25)
+
+        def report_progress(value):
+            try:
+                _send(self.wfile, {'progress': value})
+            except OSError:
+                editor.cancel('调用方已断开连接')
+
+        # 进度只在阶段之间发送，检测或渲染期间的断开由后台线程发现
+        finished = threading.Event()
+        threading.Thread(target=self._watch_disconnect, args=(editor, finished),
+                         daemon=True).start()
+        try:
+            with self.server.job_slots:
+                with self.server.lock:
+                    self.server.running_jobs += 1
+                try:
+                    ok = editor.process_video(progress_callback=report_progress,
+                                              variants=request.get('targets'))
+                except Exception as e:
+                    print(f"处理失败：{str(e)}")
+                    ok = False
+                finally:
+                    with self.server.lock:
+                        self.server.running_jobs -= 1
+        finally:
+            finished.set()
+            try:
+                self.connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+        result = {
+            'ok': ok,
+            'output_path': editor.output_path,
+            'variants': editor.variant_outputs,
+        }
+        if not ok:
+            result['error'] = editor.cancel_token.reason or '处理失败'
+        try:
+            _send(self.wfile, result)
+        except OSError:
+            pass
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, max_jobs=MAX_JOBS):
+        self.job_slots = threading.BoundedSemaphore(max(1, max_jobs))
+        self.lock = threading.Lock()
+        self.running_jobs = 0
+        self.started_at = time.time()
+        self.preload_seconds = 0.0
+        super().__init__(socket_path, JobHandler)
+
+
+def serve(socket_path=SOCKET_PATH, max_jobs=MAX_JOBS):
+    """启动常驻进程：先导入全部依赖，再监听 socket_path"""
+    if worker_status(socket_path):
+        print(f"常驻进程已在运行: {socket_path}")
+        return False
+    # 上次异常退出留下的 socket 文件
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+
+    from video_editor import preload
+    preload_seconds = preload()
+    server = WorkerServer(socket_path, max_jobs)
+    server.preload_seconds = preload_seconds
+    os.chmod(socket_path, 0o600)  # 只允许当前用户提交任务
+    print(f"常驻进程已启动（依赖导入 {preload_seconds:.2f}s），监听 {socket_path}，并发数 {max_jobs}")
+    # launchd / systemd 用 SIGTERM 停止进程：正常退出并删除 socket 文件
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    return True
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'status':
+        status = worker_status()
+        if status is None:
+            print(f"常驻进程未运行: {SOCKET_PATH}")
+            sys.exit(1)
+        print(f"常驻进程 PID {status['pid']}，运行 {status['uptime']:.0f}s，"
+              f"正在处理 {status['running_jobs']} 个任务")
+    else:
+        serve()
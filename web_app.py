@@ -1,10 +1,19 @@
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Flask, request, jsonify, send_file, send_from_directory, render_template
 from flask_cors import CORS
 import os
-from video_editor import VideoEditor
+from video_editor import VideoEditor, STREAM_PLAYLIST
+from job_queue import JobQueue, QueueFullError
+from chunked_upload import ChunkedUploadStore, UploadError, OffsetMismatchError
+from metrics import JobMetrics, create_job_registry, observe_job
+from cancellation import JobCancelled
+from media_info import probe_media, UnsupportedMediaError
 import tempfile
 from werkzeug.utils import secure_filename
 import uuid
+import json
+import hashlib
+import time
+import shutil
 from dotenv import load_dotenv
 import logging
 
@@ -22,6 +31,32 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 限制上传文件大小为500MB
+# 前置 Apache/lighttpd 时可开启 X-Sendfile；前置 nginx 时设置内部 location 前缀使用 X-Accel-Redirect
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '0') == '1'
+X_ACCEL_PREFIX = os.getenv('VIDEO_X_ACCEL_PREFIX', '')
+# 输出文件名唯一且内容不再变化，允许客户端缓存
+OUTPUT_MAX_AGE = int(os.getenv('VIDEO_OUTPUT_MAX_AGE', 3600))
+
+# 预览任务完成后保留的输入文件，确认后用于输出完整版本；超过有效期（秒）未确认时删除
+PREVIEW_INPUT_FOLDER = os.path.join(UPLOAD_FOLDER, 'previews')
+os.makedirs(PREVIEW_INPUT_FOLDER, exist_ok=True)
+PREVIEW_INPUT_TTL = int(os.getenv('VIDEO_PREVIEW_TTL', 3600))
+
+# 边渲染边播放的 HLS 分片，每个任务一个目录；超过有效期（秒）后删除
+STREAM_FOLDER = os.path.join(UPLOAD_FOLDER, 'streams')
+os.makedirs(STREAM_FOLDER, exist_ok=True)
+STREAM_TTL = int(os.getenv('VIDEO_STREAM_TTL', 3600))
+STREAM_MIME_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+}
+
+# 分块上传的临时目录：数据直接按块写入磁盘，支持断点续传
+upload_store = ChunkedUploadStore(
+    os.path.join(UPLOAD_FOLDER, 'partial'),
+    max_size=app.config['MAX_CONTENT_LENGTH']
+)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'mp4', 'avi', 'mov', 'mkv'}
@@ -30,6 +65,167 @@ def allowed_file(filename):
 def index():
     return render_template('index.html')
 
+# 本进程执行的任务的分阶段指标，由 /metrics 输出
+metrics_registry = create_job_registry()
+# 单个任务的最长处理时间（秒），超时后终止 ffmpeg 并标记为失败；0 表示不限
+JOB_TIMEOUT = float(os.getenv('VIDEO_JOB_TIMEOUT', 0)) or None
+# Web 任务使用的剪辑参数。它们和输入内容哈希一起决定输出，是结果去重键的一部分；
+# 修改参数或剪辑逻辑时增大 RESULT_VERSION，旧的结果不再复用
+EDITOR_OPTIONS = {'target_duration': 25}
+RESULT_VERSION = 1
+
+def result_key(input_hash, targets=None, preview=False, scene_plan=None, stream=False):
+    """由输入内容哈希和剪辑参数生成结果去重键"""
+    payload = json.dumps({
+        'hash': input_hash,
+        'version': RESULT_VERSION,
+        'options': EDITOR_OPTIONS,
+        'targets': targets,
+        'preview': preview,
+        'scene_plan': scene_plan,
+        'stream': stream,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def result_files_exist(job):
+    """已完成任务的输出文件是否都还在（临时目录可能已被清理）"""
+    result = job.get('result') or {}
+    filenames = [result.get('filename')] + [
+        variant.get('filename') for variant in result.get('variants', []) if variant.get('filename')
+    ]
+    if job['params'].get('stream') and not os.path.isdir(os.path.join(STREAM_FOLDER, job['id'])):
+        return False
+    # 预览的输入文件已被确认取走或过期删除时，这个预览无法再确认，不能复用
+    if job['params'].get('preview'):
+        preview_input = result.get('preview_input')
+        if not preview_input or not os.path.isfile(os.path.join(PREVIEW_INPUT_FOLDER, preview_input)):
+            return False
+    return all(
+        name and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], name))
+        for name in filenames
+    )
+
+def stream_playlists(job_id, params):
+    """流式输出任务的 HLS 播放列表（相对 /api/jobs/<job_id>/stream/ 的路径），按版本顺序排列
+
+    多版本输出时每个版本一个子目录，目录名与 VideoEditor 的版本名一致（例如 15s）。
+    """
+    if not params.get('stream'):
+        return []
+    targets = params.get('targets')
+    if not targets:
+        return [STREAM_PLAYLIST]
+    durations = [
+        float(target['target_duration'] if isinstance(target, dict) else target)
+        for target in targets
+    ]
+    if len(durations) == 1:
+        return [STREAM_PLAYLIST]
+    return [f"{duration:g}s/{STREAM_PLAYLIST}" for duration in durations]
+
+def run_edit_job(job_id, params, report_progress, cancel_token=None):
+    """在工作线程中执行剪辑任务，返回任务结果"""
+    input_path = params['input_path']
+    output_filename = params['output_filename']
+    output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
+    job_metrics = JobMetrics(job_id)
+    try:
+        app.logger.info(f'开始处理任务 {job_id}...')
+        editor = VideoEditor(input_path, output_path, input_hash=params.get('input_hash'),
+                             metrics=job_metrics, cancel_token=cancel_token, timeout=JOB_TIMEOUT,
+                             preview=params.get('preview', False),
+                             scene_plan=params.get('scene_plan'),
+                             stream_dir=os.path.join(STREAM_FOLDER, job_id) if params.get('stream') else None,
+                             **EDITOR_OPTIONS)
+        targets = params.get('targets')
+        ok = editor.process_video(progress_callback=report_progress, variants=targets)
+        record = job_metrics.to_dict()
+        observe_job(metrics_registry, record)
+        app.logger.info(f'任务指标: {json.dumps(record, ensure_ascii=False)}')
+        if not ok:
+            if editor.cancel_token.cancelled:
+                raise JobCancelled(editor.cancel_token.reason)
+            raise RuntimeError('视频处理失败')
+
+        if targets:
+            # 多版本输出：第一个成功的版本作为默认结果
+            output_filename = next(
+                os.path.basename(v['output_path']) for v in editor.variant_outputs if v['ok']
+            )
+        # 检查带扩展名和不带扩展名的文件是否存在
+        elif os.path.exists(output_path):
+            pass
+        elif os.path.exists(output_path + '.mp4'):
+            output_filename = output_filename + '.mp4'
+        else:
+            raise RuntimeError('视频处理失败：输出文件不存在')
+
+        app.logger.info(f'任务 {job_id} 处理成功')
+        result = {'filename': output_filename, 'metrics': record}
+        if targets:
+            result['variants'] = [
+                {
+                    'name': variant['name'],
+                    'target_duration': variant['target_duration'],
+                    'filename': os.path.basename(variant['output_path']) if variant['ok'] else None,
+                    'error': variant.get('error'),
+                    'scenes': variant.get('scenes'),
+                }
+                for variant in editor.variant_outputs
+            ]
+        elif editor.variant_outputs:
+            result['scenes'] = editor.variant_outputs[0].get('scenes')
+        if params.get('preview'):
+            # 保留输入文件，确认后按同一组场景输出完整版本；超过有效期未确认时删除
+            preview_input = os.path.join(PREVIEW_INPUT_FOLDER, os.path.basename(input_path))
+            os.replace(input_path, preview_input)
+            os.utime(preview_input, None)
+            result['preview_input'] = os.path.basename(preview_input)
+        return result
+    finally:
+        # 清理临时文件
+        try:
+            if os.path.exists(input_path):
+                os.remove(input_path)
+                app.logger.info(f'已删除临时文件: {input_path}')
+        except Exception as e:
+            app.logger.error(f'删除临时文件失败: {str(e)}')
+
+
+# 持久化任务队列：上传请求只负责入队，剪辑在工作线程中完成
+job_queue = JobQueue(
+    os.getenv('VIDEO_JOB_DB', os.path.join(UPLOAD_FOLDER, 'jobs.sqlite3')),
+    handler=run_edit_job,
+    max_pending=int(os.getenv('VIDEO_JOB_MAX_PENDING', 20))
+)
+# VIDEO_JOB_WORKERS=0 时 Web 进程只负责入队，由单独运行的 worker.py 处理
+JOB_WORKERS = int(os.getenv('VIDEO_JOB_WORKERS', 2))
+# gunicorn --preload 时本模块在主进程中导入，线程不会随 fork 进入 worker 进程，
+# 由 gunicorn.conf.py 的 post_fork 在每个 worker 中启动
+if JOB_WORKERS > 0 and not os.getenv('VIDEO_JOB_START_AFTER_FORK'):
+    job_queue.start(workers=JOB_WORKERS)
+
+
+def job_response(job_id, job):
+    """任务状态的 JSON 表示"""
+    data = {
+        'job_id': job_id,
+        'status': job['status'],
+        'progress': job['progress'],
+        'status_url': f'/api/jobs/{job_id}',
+        'result_url': f'/api/jobs/{job_id}/result',
+    }
+    if job['status'] == 'queued':
+        data['queue_position'] = job_queue.queue_position(job_id)
+    if job['status'] in ('failed', 'cancelled'):
+        data['error'] = job['error']
+    playlists = stream_playlists(job_id, job['params'])
+    if playlists and job['status'] in ('running', 'done'):
+        # 第一个分片写完后播放列表出现，客户端此时就可以开始播放
+        data['stream_url'] = f'/api/jobs/{job_id}/stream/{playlists[0]}'
+        data['stream_ready'] = os.path.exists(os.path.join(STREAM_FOLDER, job_id, playlists[0]))
+    return data
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     try:
@@ -43,6 +239,11 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({'error': '不支持的文件格式'}), 400
 
+        try:
+            targets = parse_targets(request.form.get('targets'))
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': f'目标时长无效: {str(e)}'}), 400
+
         # 生成唯一的文件名
         filename = secure_filename(file.filename)
         file_ext = os.path.splitext(filename)[1].lower()  # 获取文件扩展名
@@ -52,70 +253,374 @@ def upload_file():
         # 确保上传目录存在
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
         
-        # 保存上传的文件
-        file.save(input_path)
+        # 保存上传的文件，同时计算内容哈希（用于结果去重和场景缓存，不再重新读取文件）
+        input_hash = save_with_hash(file, input_path)
         app.logger.info(f'文件已保存到: {input_path}')
+        cleanup_preview_inputs()
+        cleanup_streams()
         
-        # 设置输出文件路径，确保包含扩展名
-        output_filename = f"edited_{unique_filename}"  # 现在包含了原始文件的扩展名
-        output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
-        
-        try:
-            # 创建VideoEditor实例并处理视频
-            app.logger.info('开始处理视频...')
-            editor = VideoEditor(input_path, output_path)
-            success = editor.process_video()
-            
-            if success:
-                app.logger.info('视频处理成功')
-                # 检查带扩展名和不带扩展名的文件是否存在
-                if os.path.exists(output_path):
-                    actual_output_path = output_path
-                elif os.path.exists(output_path + '.mp4'):
-                    actual_output_path = output_path + '.mp4'
-                    output_filename = output_filename + '.mp4'
-                else:
-                    app.logger.error('输出文件不存在')
-                    return jsonify({'error': '视频处理失败：输出文件不存在'}), 500
-                
-                return jsonify({
-                    'message': '视频处理成功',
-                    'filename': output_filename
-                })
-            else:
-                app.logger.error('视频处理失败')
-                return jsonify({'error': '视频处理失败'}), 500
-                
-        except Exception as e:
-            app.logger.error(f'处理过程出错: {str(e)}')
-            return jsonify({'error': f'处理过程出错: {str(e)}'}), 500
-        finally:
-            # 清理临时文件
-            try:
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    app.logger.info(f'已删除临时文件: {input_path}')
-            except Exception as e:
-                app.logger.error(f'删除临时文件失败: {str(e)}')
+        return enqueue_edit_job(input_path, unique_filename, input_hash=input_hash,
+                                targets=targets, preview=parse_flag(request.form.get('preview')),
+                                stream=parse_flag(request.form.get('stream')))
     except Exception as e:
         app.logger.error(f'上传处理失败: {str(e)}')
         return jsonify({'error': f'上传处理失败: {str(e)}'}), 500
 
+def save_with_hash(file, path, chunk_size=1024 * 1024):
+    """分块保存上传的文件并计算 SHA-256"""
+    hasher = hashlib.sha256()
+    with open(path, 'wb') as f:
+        while True:
+            chunk = file.stream.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            f.write(chunk)
+    return hasher.hexdigest()
+
+def parse_flag(value):
+    """表单或 JSON 中的布尔开关："1"、"true"、"on" 或 true"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+def cleanup_preview_inputs():
+    """删除超过有效期仍未确认的预览输入文件"""
+    cutoff = time.time() - PREVIEW_INPUT_TTL
+    for name in os.listdir(PREVIEW_INPUT_FOLDER):
+        path = os.path.join(PREVIEW_INPUT_FOLDER, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            continue
+
+def cleanup_streams():
+    """删除超过有效期的流式输出目录"""
+    cutoff = time.time() - STREAM_TTL
+    for name in os.listdir(STREAM_FOLDER):
+        path = os.path.join(STREAM_FOLDER, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path)
+        except OSError:
+            continue
+
+MAX_VARIANTS = 5
+MAX_TARGET_DURATION = 600
+
+def parse_targets(value):
+    """解析多版本目标时长：列表或逗号分隔的字符串，例如 "15,25,60"；为空时返回 None"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = [item for item in value.split(',') if item.strip()]
+    targets = [float(item) for item in value]
+    if len(targets) > MAX_VARIANTS:
+        raise ValueError(f'最多支持 {MAX_VARIANTS} 个版本')
+    if any(not 1 <= target <= MAX_TARGET_DURATION for target in targets):
+        raise ValueError(f'目标时长必须在 1 到 {MAX_TARGET_DURATION} 秒之间')
+    return sorted(set(targets))
+
+def enqueue_edit_job(input_path, unique_filename, input_hash=None, targets=None, preview=False,
+                     scene_plan=None, stream=False):
+    """为已保存的输入文件创建剪辑任务；targets 为多个目标时长时一次分析输出多个版本
+
+    preview 为真时输出低分辨率预览草稿；scene_plan（或 targets 中各版本的 'scenes'）
+    为已确认的场景方案，直接渲染，不再检测。stream 为真时同时输出 HLS 分片，边渲染边播放。
+    """
+    # 预览草稿本身很小，不做流式输出
+    stream = stream and not preview
+    # 设置输出文件路径，确保包含扩展名
+    prefix = 'preview' if preview else 'edited'
+    output_filename = f"{prefix}_{unique_filename}"  # 现在包含了原始文件的扩展名
+
+    # 入队前只读文件头检查一次，无法处理的文件直接拒绝，不占用队列和解码资源
+    try:
+        probe_media(input_path)
+    except UnsupportedMediaError as e:
+        os.remove(input_path)
+        app.logger.warning(f'拒绝不支持的输入文件 {unique_filename}: {str(e)}')
+        return jsonify({'error': f'不支持的视频文件: {str(e)}'}), 415
+
+    params = {
+        'input_path': input_path,
+        'output_filename': output_filename,
+        'input_hash': input_hash,
+        'targets': targets,
+        'preview': preview,
+        'scene_plan': scene_plan,
+        'stream': stream,
+    }
+    try:
+        if input_hash:
+            # 相同内容、相同参数：复用已有结果，或加入正在处理的相同任务
+            job_id, created = job_queue.submit_unique(
+                params, result_key(input_hash, targets, preview, scene_plan, stream),
+                reusable=result_files_exist
+            )
+        else:
+            job_id, created = job_queue.submit(params), True
+    except QueueFullError as e:
+        os.remove(input_path)
+        app.logger.warning(str(e))
+        response = jsonify({'error': '服务器繁忙，请稍后重试'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    if not created:
+        os.remove(input_path)
+        job = job_queue.get(job_id)
+        app.logger.info(f'重复的任务，复用 {job_id}（{job["status"]}）')
+        data = dict(job_response(job_id, job), deduplicated=True)
+        return jsonify(data), 200 if job['status'] == 'done' else 202
+
+    app.logger.info(f'任务已入队: {job_id}')
+    return jsonify(job_response(job_id, job_queue.get(job_id))), 202
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """开始一个分块上传：{"filename": ..., "size": 总字节数}"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': '不支持的文件格式'}), 400
+    try:
+        upload_id = upload_store.create(secure_filename(filename), data.get('size', 0))
+    except (UploadError, ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    upload_store.cleanup_expired()
+    cleanup_preview_inputs()
+    cleanup_streams()
+    return jsonify({'upload_id': upload_id, 'offset': 0}), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """查询已确认的偏移量，客户端从这里续传"""
+    meta = upload_store.get(upload_id)
+    if meta is None:
+        return jsonify({'error': '上传不存在'}), 404
+    return jsonify({
+        'upload_id': upload_id,
+        'offset': meta['offset'],
+        'size': meta['total_size'],
+        'complete': meta['complete'],
+    })
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+def upload_chunk(upload_id):
+    """追加一个数据块，请求头 Upload-Offset 为该块在文件中的起始位置"""
+    offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+    if offset is None or not str(offset).isdigit():
+        return jsonify({'error': '缺少 Upload-Offset'}), 400
+    try:
+        # 直接读取原始请求流，不经过表单解析，也不整体缓存到内存
+        new_offset = upload_store.append(
+            upload_id, int(offset), request.stream, request.content_length
+        )
+    except OffsetMismatchError as e:
+        return jsonify({'error': str(e), 'offset': e.expected}), 409
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'upload_id': upload_id, 'offset': new_offset})
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """上传完成，创建剪辑任务"""
+    meta = upload_store.get(upload_id)
+    if meta is None:
+        return jsonify({'error': '上传不存在'}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        targets = parse_targets(data.get('targets'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'目标时长无效: {str(e)}'}), 400
+    file_ext = os.path.splitext(meta['filename'])[1].lower()
+    unique_filename = f"{str(uuid.uuid4())}{file_ext}"
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+    try:
+        input_hash = upload_store.finish(upload_id, input_path)
+    except UploadError as e:
+        return jsonify({'error': str(e), 'offset': meta['offset']}), 409
+    app.logger.info(f'分块上传完成: {input_path}')
+    return enqueue_edit_job(input_path, unique_filename, input_hash=input_hash, targets=targets,
+                            preview=parse_flag(data.get('preview')),
+                            stream=parse_flag(data.get('stream')))
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job_response(job_id, job))
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消任务；页面关闭时前端通过 navigator.sendBeacon 调用"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    if job_queue.cancel(job_id):
+        app.logger.info(f'任务已请求取消: {job_id}')
+    return jsonify(job_response(job_id, job_queue.get(job_id)))
+
+@app.route('/api/jobs/<job_id>/render', methods=['POST'])
+def confirm_preview(job_id):
+    """确认预览：复用预览任务的场景方案输出完整画质的版本，不再检测场景
+
+    请求体 {"stream": true} 时边渲染边播放。
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    if not job['params'].get('preview'):
+        return jsonify({'error': '不是预览任务'}), 400
+    if job['status'] != 'done':
+        return jsonify(job_response(job_id, job)), 409
+    result = job['result']
+    source = os.path.join(PREVIEW_INPUT_FOLDER, result.get('preview_input') or '')
+    file_ext = os.path.splitext(source)[1].lower()
+    unique_filename = f"{str(uuid.uuid4())}{file_ext}"
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+    try:
+        # 移出预览目录：同一个预览只能确认一次，也不会在排队期间被过期清理删除
+        os.replace(source, input_path)
+    except OSError:
+        return jsonify({'error': '预览已过期，请重新上传'}), 410
+
+    targets = job['params'].get('targets')
+    scene_plan = None
+    if targets:
+        targets = [
+            {'target_duration': variant['target_duration'], 'scenes': variant['scenes']}
+            for variant in result.get('variants', []) if variant.get('scenes')
+        ]
+    else:
+        scene_plan = result.get('scenes')
+    data = request.get_json(silent=True) or {}
+    return enqueue_edit_job(input_path, unique_filename, input_hash=job['params'].get('input_hash'),
+                            targets=targets, scene_plan=scene_plan,
+                            stream=parse_flag(data.get('stream')))
+
+@app.route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error'] or '视频处理失败'}), 500
+    if job['status'] == 'cancelled':
+        return jsonify({'error': '任务已取消'}), 410
+    if job['status'] != 'done':
+        return jsonify(job_response(job_id, job)), 409
+    filename = job['result']['filename']
+    data = {
+        'message': '视频处理成功',
+        'filename': filename,
+        'download_url': f'/api/download/{filename}',
+        'preview_url': f'/api/preview/{filename}',
+    }
+    if job['params'].get('preview'):
+        # 预览草稿：确认后按同一组场景输出完整版本
+        data['preview'] = True
+        data['render_url'] = f'/api/jobs/{job_id}/render'
+    if 'scenes' in job['result']:
+        data['scenes'] = job['result']['scenes']
+    playlists = stream_playlists(job_id, job['params'])
+    if playlists:
+        data['stream_url'] = f'/api/jobs/{job_id}/stream/{playlists[0]}'
+    if 'variants' in job['result']:
+        data['variants'] = [
+            dict(variant, download_url=f"/api/download/{variant['filename']}",
+                 preview_url=f"/api/preview/{variant['filename']}")
+            if variant['filename'] else variant
+            for variant in job['result']['variants']
+        ]
+        if len(playlists) == len(data['variants']):
+            for variant, playlist in zip(data['variants'], playlists):
+                variant['stream_url'] = f'/api/jobs/{job_id}/stream/{playlist}'
+    return jsonify(data)
+
+@app.route('/api/jobs/<job_id>/stream/<path:name>')
+def stream_file(job_id, name):
+    """边渲染边播放：HLS 播放列表和分片
+
+    任务运行中播放列表在每个分片写完后更新，不能缓存；分片写完后不再变化。
+    """
+    job = job_queue.get(job_id)
+    if job is None or not job['params'].get('stream'):
+        return jsonify({'error': '任务不存在'}), 404
+    mime_type = STREAM_MIME_TYPES.get(os.path.splitext(name)[1].lower())
+    if mime_type is None:
+        return jsonify({'error': '文件不存在'}), 404
+    playlist = name.endswith('.m3u8')
+    # send_from_directory 拒绝目录之外的路径；播放列表尚未生成时返回 404，客户端稍后重试
+    response = send_from_directory(
+        os.path.join(STREAM_FOLDER, job_id), name,
+        mimetype=mime_type,
+        conditional=True,
+        max_age=0 if playlist else OUTPUT_MAX_AGE
+    )
+    if playlist:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def send_output(filename, as_attachment):
+    """发送输出视频：支持 Range 分段请求、ETag/Last-Modified 条件请求和零拷贝发送"""
+    filename = secure_filename(filename)
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not filename or not os.path.isfile(file_path):
+        return jsonify({'error': '文件不存在'}), 404
+
+    # 获取文件扩展名
+    _, ext = os.path.splitext(filename)
+    # 设置正确的 MIME 类型
+    mime_type = 'video/mp4' if ext.lower() == '.mp4' else 'video/quicktime'
+    download_name = f"edited_video{ext}"  # 确保下载时有正确的扩展名
+
+    if X_ACCEL_PREFIX:
+        # 由前置 nginx 直接发送文件（内部 location 自行处理 Range 和 sendfile）
+        response = app.response_class(mimetype=mime_type)
+        response.headers['X-Accel-Redirect'] = f"{X_ACCEL_PREFIX.rstrip('/')}/{filename}"
+        disposition = 'attachment' if as_attachment else 'inline'
+        response.headers['Content-Disposition'] = f'{disposition}; filename="{download_name}"'
+        return response
+
+    # conditional=True 时 Werkzeug 处理 Range/If-Range/If-None-Match/If-Modified-Since；
+    # 完整响应通过 wsgi.file_wrapper 交给 gunicorn 使用 sendfile 发送
+    return send_file(
+        file_path,
+        mimetype=mime_type,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=True,
+        last_modified=os.path.getmtime(file_path),
+        max_age=OUTPUT_MAX_AGE
+    )
+
 @app.route('/api/download/<filename>')
 def download_file(filename):
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if os.path.exists(file_path):
-        # 获取文件扩展名
-        _, ext = os.path.splitext(filename)
-        # 设置正确的 MIME 类型
-        mime_type = 'video/mp4' if ext.lower() == '.mp4' else 'video/quicktime'
-        return send_file(
-            file_path,
-            mimetype=mime_type,
-            as_attachment=True,
-            download_name=f"edited_video{ext}"  # 确保下载时有正确的扩展名
-        )
-    return jsonify({'error': '文件不存在'}), 404
+    return send_output(filename, as_attachment=True)
+
+@app.route('/api/preview/<filename>')
+def preview_file(filename):
+    """在浏览器中直接播放，播放器可以按 Range 拖动进度"""
+    return send_output(filename, as_attachment=False)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 文本格式的指标"""
+    try:
+        counts = job_queue.status_counts()
+    except Exception as e:
+        app.logger.error(f'读取任务状态失败: {str(e)}')
+        counts = {}
+    for status in ('queued', 'running', 'cancelling', 'done', 'failed', 'cancelled'):
+        metrics_registry.set('video_editor_jobs', counts.get(status, 0), status=status)
+    return app.response_class(metrics_registry.render(),
+                              content_type='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 8080))
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import os
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 独立的任务执行进程：与 Web 进程共享同一个 SQLite 队列和上传目录
+os.environ.setdefault('VIDEO_JOB_WORKERS', '0')
+from web_app import job_queue, metrics_registry
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """只提供 /metrics：本进程执行的任务指标"""
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics_registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port):
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+def main():
+    """主函数"""
+    workers = int(os.getenv('VIDEO_WORKER_CONCURRENCY', 2))
+    print(f"任务处理进程已启动，并发数: {workers}")
+    job_queue.start(workers=workers)
+    # 任务在本进程执行，Web 进程的 /metrics 看不到这些指标，需要单独抓取
+    metrics_port = int(os.getenv('VIDEO_WORKER_METRICS_PORT', 0))
+    if metrics_port:
+        start_metrics_server(metrics_port)
+        print(f"指标地址: http://0.0.0.0:{metrics_port}/metrics")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        job_queue.stop()
+
+if __name__ == "__main__":
+    main()